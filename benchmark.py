@@ -0,0 +1,277 @@
+# --- START OF FILE benchmark.py ---
+
+# benchmark.py
+"""
+Бенчмарк полного конвейера движка (поиск шаблонов, OCR цены, решение о покупке)
+на записанном сеансе (frame_recorder.py или папка кадров, см. frame_sources.py):
+
+    python benchmark.py --recording recordings/20250101_120000 --items market_items.json --output result.json
+
+Кадры воспроизводятся без пауз (каждый захват - следующий кадр), клики не
+выполняются (источник "replay" неинтерактивный), паузы цикла, режим простоя,
+обновление списка и запись отключены, калибровка пишется во временный файл.
+Цели покупки не ограничивают прогон: он идет до конца записи.
+
+Отчет (JSON): кадров/с, перцентили времени этапов (grab, match, ocr, frame),
+вызовы OCR на кадр и, если есть разметка, точность поиска и цены.
+Разметка - файл labels.jsonl в папке записи (или --labels), строка на кадр:
+    {"i": 12, "items": {"Товар A": 15000, "Товар B": null}}
+- товары, видимые на кадре i, и их цены (null - цена не размечена).
+Кадры без строки разметки в точности не учитываются.
+--baseline - отчет предыдущего прогона: в отчет добавляется относительное изменение.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import startup_profiler
+
+if __name__ == "__main__":
+    startup_profiler.enable_from_argv() # До импорта engine: замер всех импортов
+
+import engine
+import performance
+from constants import ITEM_DATA_FILE, TEMPLATE_CACHE_ENABLED, TEMPLATE_CACHE_FILE, TEMPLATE_CACHE_PYRAMID_LEVELS, TEMPLATE_FOLDER
+from engine import BASE_DIR, load_ocr_reader
+from frame_sources import REPLAY_SPEED_MAX, ReplayFrameSource
+from headless import _setup_logging, apply_config, load_items, run_headless
+from template_cache import TemplateCache
+
+logger = logging.getLogger("logic.benchmark")
+
+LABELS_FILE = "labels.jsonl"
+
+# Переопределения констант движка на время прогона: измеряется только обработка кадров
+BENCHMARK_OVERRIDES = {
+    "WORKER_LOOP_PAUSE": 0.0,
+    "POST_ACTION_PAUSE": 0.0,
+    "IDLE_BACKOFF_ENABLED": False,
+    "REFRESH_BUTTON_X": None,
+    "REFRESH_BUTTON_Y": None,
+    "RECORDER_ENABLED": False,
+    "DEBUG_SAVE_PRICE_ROI": False,
+    "SCAN_AREA_AUTO_CALIBRATION": False,
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Перцентиль по ближайшему рангу (values не пустой)."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize_times(values: list) -> dict:
+    """Сводка времен этапа в миллисекундах."""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(max(values) * 1000, 3),
+    }
+
+
+def load_labels(path: str) -> dict:
+    """Разметка: номер кадра -> {товар: цена или None}. Пустой словарь, если файла нет."""
+    labels = {}
+    if not path or not os.path.exists(path):
+        return labels
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                labels[int(record["i"])] = dict(record.get("items", {}))
+    logger.info(f"Разметка '{path}': {len(labels)} кадров.")
+    return labels
+
+
+class MetricsCollector:
+    """
+    Обработчик измерений движка (on_metric): времена этапов и проверки товаров
+    с номером кадра записи (source.position на момент проверки).
+    """
+
+    def __init__(self, source: ReplayFrameSource):
+        self.source = source
+        self.times = {} # этап -> [секунды]
+        self.checks = [] # (кадр, товар, найден, цена)
+        self.actions = 0
+        self.ocr_cache_hits = 0
+
+    def __call__(self, name: str, *args):
+        if name == "stage_time":
+            stage, seconds = args
+            self.times.setdefault(stage, []).append(seconds)
+        elif name == "item_checked":
+            item_name, _score, found, price = args
+            self.checks.append((self.source.position, item_name, found, price))
+        elif name == "ocr_cache_hit":
+            self.ocr_cache_hits += 1
+
+    def on_event(self, event: str, *args):
+        if event == "action_performed":
+            self.actions += 1
+
+    def accuracy(self, labels: dict) -> dict | None:
+        """Точность поиска (по проверкам на размеченных кадрах) и распознавания цены."""
+        if not labels:
+            return None
+        tp = fp = fn = tn = 0
+        price_checked = price_correct = 0
+        price_errors = []
+        for frame, name, found, price in self.checks:
+            truth = labels.get(frame)
+            if truth is None:
+                continue
+            present = name in truth
+            if found and present:
+                tp += 1
+                expected = truth[name]
+                if expected is not None:
+                    price_checked += 1
+                    if price == expected:
+                        price_correct += 1
+                    elif len(price_errors) < 20:
+                        price_errors.append({"frame": frame, "item": name, "expected": expected, "read": price})
+            elif found:
+                fp += 1
+            elif present:
+                fn += 1
+            else:
+                tn += 1
+        return {
+            "checks": tp + fp + fn + tn,
+            "true_positive": tp,
+            "false_positive": fp,
+            "false_negative": fn,
+            "true_negative": tn,
+            "detection_precision": round(tp / (tp + fp), 4) if tp + fp else None,
+            "detection_recall": round(tp / (tp + fn), 4) if tp + fn else None,
+            "price_checked": price_checked,
+            "price_accuracy": round(price_correct / price_checked, 4) if price_checked else None,
+            "price_errors": price_errors,
+        }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Относительное изменение ключевых показателей относительно baseline (+0.10 = на 10% больше)."""
+    def change(new, old):
+        return round((new - old) / old, 4) if new is not None and old else None
+
+    result = {"frames_per_second": change(report.get("frames_per_second"), baseline.get("frames_per_second"))}
+    for stage, stats in report.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage, {})
+        result[f"{stage}_p50_ms"] = change(stats.get("p50_ms"), old.get("p50_ms"))
+        result[f"{stage}_p90_ms"] = change(stats.get("p90_ms"), old.get("p90_ms"))
+    result["ocr_calls_per_frame"] = change(report.get("ocr_calls_per_frame"), baseline.get("ocr_calls_per_frame"))
+    return result
+
+
+def run_benchmark(recording: str, items: list, labels: dict, reader=None, template_cache=None) -> dict:
+    """Прогоняет запись через движок и возвращает отчет."""
+    source = ReplayFrameSource(recording, REPLAY_SPEED_MAX)
+    source.open()
+
+    for name, value in BENCHMARK_OVERRIDES.items():
+        setattr(engine, name, value)
+    engine.SCAN_AREA = dict(source.area) # Область записи - вся "виртуальная" область источника
+    # Калибровка прогона не должна попадать в файл калибровки приложения
+    calibration_dir = tempfile.mkdtemp(prefix="benchmark_")
+    engine.ABS_CALIBRATION_DATA_FILE = os.path.join(calibration_dir, "calibration.json")
+    # Цели покупки не должны завершать прогон раньше конца записи
+    items = [dict(item, quantity=10 ** 9, bought_count=0) for item in items]
+
+    collector = MetricsCollector(source)
+    start_time = time.perf_counter()
+    run_headless(items, collector.on_event, reader=reader, template_cache=template_cache,
+                 frame_source=source, on_metric=collector)
+    wall_time = time.perf_counter() - start_time
+
+    frames = len(collector.times.get("frame", []))
+    frame_time = sum(collector.times.get("frame", []))
+    report = {
+        "recording": recording,
+        "recording_frames": len(source.frames),
+        "frames": frames,
+        "items": len(items),
+        "wall_time_s": round(wall_time, 3),
+        # Кадры/с по времени обработки кадров (без загрузки шаблонов и запуска потока)
+        "frames_per_second": round(frames / frame_time, 3) if frame_time else None,
+        "stages": {stage: summarize_times(values) for stage, values in sorted(collector.times.items())},
+        "ocr_calls_per_frame": round(len(collector.times.get("ocr", [])) / frames, 4) if frames else None,
+        "ocr_cache_hits": collector.ocr_cache_hits,
+        "match_calls_per_frame": round(len(collector.times.get("match", [])) / frames, 4) if frames else None,
+        "simulated_actions": collector.actions,
+        "accuracy": collector.accuracy(labels),
+        "environment": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "performance_profile": engine.PERFORMANCE_PROFILE,
+            "ocr_backend": engine.OCR_BACKEND,
+        },
+    }
+    return report
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк движка поиска на записанном сеансе.")
+    parser.add_argument("--recording", required=True, help="Папка записи кадров")
+    parser.add_argument("--items", default=os.path.join(BASE_DIR, ITEM_DATA_FILE), help="Файл товаров (JSON)")
+    parser.add_argument("--labels", help=f"Разметка (по умолчанию {LABELS_FILE} в папке записи)")
+    parser.add_argument("--config", help="JSON с переопределением констант движка")
+    parser.add_argument("--baseline", help="Отчет предыдущего прогона для сравнения")
+    parser.add_argument("--output", help="Файл отчета JSON (по умолчанию stdout)")
+    parser.add_argument("--log-file", help="Файл лога (по умолчанию stderr)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument(startup_profiler.PROFILE_FLAG, action="store_true", help="Профиль импортов и этапов запуска")
+    args = parser.parse_args(argv)
+
+    _setup_logging(args.log_file, args.log_level)
+    if args.config:
+        apply_config(args.config)
+    profile = performance.get_profile(engine.PERFORMANCE_PROFILES, engine.PERFORMANCE_PROFILE)
+    performance.apply_environment(profile)
+
+    items = load_items(args.items)
+    if not items:
+        logger.error("Нет включенных товаров с шаблонами. Завершение.")
+        return 2
+    labels = load_labels(args.labels or os.path.join(args.recording, LABELS_FILE))
+
+    reader = load_ocr_reader(profile)
+    template_cache = (
+        TemplateCache(os.path.join(BASE_DIR, TEMPLATE_FOLDER, TEMPLATE_CACHE_FILE), TEMPLATE_CACHE_PYRAMID_LEVELS)
+        if TEMPLATE_CACHE_ENABLED else None
+    )
+    report = run_benchmark(args.recording, items, labels, reader, template_cache)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["change_vs_baseline"] = compare(report, json.load(f))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        temp_path = args.output + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        os.replace(temp_path, args.output)
+    else:
+        sys.stdout.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE benchmark.py ---
@@ -0,0 +1,285 @@
+# --- START OF FILE calibration.py ---
+
+# calibration.py
+"""
+Данные автокалибровки, накапливаемые Worker'ом во время поиска.
+Хранятся в отдельном JSON файле рядом с market_items.json.
+Модуль не зависит от PyQt, OpenCV и OCR.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.calibration")
+
+
+class CalibrationStore:
+    """
+    Файл калибровочных данных.
+    Формат: {"version": 1, "items": {<имя товара>: {...}},
+             "scan_area": {"base": <SCAN_AREA>, "area": <суженная область>}}.
+    Секции товаров - обычные словари, которые изменяются на месте
+    вспомогательными классами (например, LocationHeatmap).
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {"version": self.VERSION, "items": {}}
+
+    def load(self) -> bool:
+        """
+        Загружает данные из файла. Отсутствующий файл - не ошибка.
+        Возвращает True, если данные прочитаны из файла.
+        """
+        if not os.path.exists(self.path):
+            logger.info(f"Файл калибровки не найден, будет создан: {self.path}")
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or not isinstance(data.get("items"), dict):
+                raise TypeError("Некорректный формат файла калибровки.")
+            if data.get("version") != self.VERSION:
+                raise TypeError(f"Неподдерживаемая версия файла калибровки: {data.get('version')}")
+            self.data = data
+            logger.info(f"Калибровочные данные загружены: {len(data['items'])} товаров из '{self.path}'.")
+            return True
+        except Exception as e:
+            # Калибровка восстанавливается сама, поэтому просто начинаем с нуля
+            logger.warning(f"Не удалось загрузить файл калибровки '{self.path}': {e}. Данные будут собраны заново.")
+            self.data = {"version": self.VERSION, "items": {}}
+            return False
+
+    def save(self) -> bool:
+        """Сохраняет данные через временный файл (атомарная замена)."""
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
+            logger.info(f"Калибровочные данные сохранены в '{self.path}'.")
+            return True
+        except Exception:
+            logger.exception(f"Ошибка сохранения файла калибровки '{self.path}':")
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def item_section(self, name: str) -> dict:
+        """Возвращает (создавая при необходимости) секцию данных товара."""
+        return self.data["items"].setdefault(name, {})
+
+    def drop_item(self, name: str) -> bool:
+        """Удаляет данные товара. Возвращает True, если данные были."""
+        return self.data["items"].pop(name, None) is not None
+
+    def get_scan_area(self, base_area: dict) -> dict | None:
+        """
+        Возвращает суженную область сканирования, откалиброванную для base_area,
+        или None, если калибровки нет или она сделана для другой области.
+        """
+        entry = self.data.get("scan_area")
+        if not isinstance(entry, dict) or entry.get("base") != base_area:
+            return None
+        area = entry.get("area")
+        required_keys = ("left", "top", "width", "height")
+        if not isinstance(area, dict) or not all(isinstance(area.get(k), int) for k in required_keys):
+            return None
+        return dict(area)
+
+    def set_scan_area(self, base_area: dict, area: dict):
+        """Запоминает суженную область сканирования для base_area."""
+        self.data["scan_area"] = {"base": dict(base_area), "area": dict(area)}
+
+    def heatmap(self, name: str, cell_size: int) -> "LocationHeatmap":
+        """Возвращает тепловую карту совпадений товара, привязанную к секции товара."""
+        section = self.item_section(name)
+        heatmap_data = section.get("heatmap")
+        if not isinstance(heatmap_data, dict) or heatmap_data.get("cell") != cell_size:
+            # Нет данных или изменился размер ячейки - начинаем заново
+            heatmap_data = {"cell": cell_size, "counts": {}}
+            section["heatmap"] = heatmap_data
+        return LocationHeatmap(heatmap_data)
+
+    def price_area(self, name: str, template_w: int, template_h: int) -> "PriceAreaCalibrator":
+        """Возвращает калибровку области цены товара для шаблона заданного размера."""
+        section = self.item_section(name)
+        area_data = section.get("price_area")
+        if not isinstance(area_data, dict) or area_data.get("template") != [template_w, template_h]:
+            # Нет данных или изменился размер шаблона - начинаем заново
+            area_data = {"template": [template_w, template_h], "samples": 0, "bounds": None}
+            section["price_area"] = area_data
+        return PriceAreaCalibrator(area_data)
+
+
+class LocationHeatmap:
+    """
+    Тепловая карта мест, где был найден шаблон товара.
+    Считает совпадения верхнего левого угла шаблона в ячейках сетки
+    в ГЛОБАЛЬНЫХ координатах экрана, поэтому не зависит от области сканирования.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data # {"cell": int, "counts": {"cx,cy": int}}
+        self.cell = int(data["cell"])
+        self.counts = data.setdefault("counts", {})
+
+    @property
+    def total(self) -> int:
+        """Общее количество учтенных совпадений."""
+        return sum(self.counts.values())
+
+    def add(self, x_global: int, y_global: int, max_total: int = 0):
+        """
+        Учитывает совпадение в точке (x, y). Если задан max_total и сумма
+        его превысила, все счетчики делятся пополам (старые данные "стареют").
+        """
+        key = f"{int(x_global) // self.cell},{int(y_global) // self.cell}"
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if max_total and self.total > max_total:
+            for cell_key in list(self.counts):
+                halved = self.counts[cell_key] // 2
+                if halved:
+                    self.counts[cell_key] = halved
+                else:
+                    del self.counts[cell_key]
+
+    def region(self, template_w: int, template_h: int, margin: int) -> tuple[int, int, int, int] | None:
+        """
+        Возвращает область (left, top, right, bottom) в глобальных координатах,
+        в которой шаблон размера template_w x template_h находился до сих пор,
+        расширенную на margin пикселей. None, если данных нет.
+        """
+        if not self.counts:
+            return None
+        cells = [tuple(map(int, key.split(","))) for key in self.counts]
+        min_cx = min(c[0] for c in cells)
+        max_cx = max(c[0] for c in cells)
+        min_cy = min(c[1] for c in cells)
+        max_cy = max(c[1] for c in cells)
+        left = min_cx * self.cell - margin
+        top = min_cy * self.cell - margin
+        right = (max_cx + 1) * self.cell + template_w + margin
+        bottom = (max_cy + 1) * self.cell + template_h + margin
+        return left, top, right, bottom
+
+
+class PriceAreaCalibrator:
+    """
+    Границы принятых блоков цены относительно верхнего левого угла шаблона.
+    По ним вычисляется минимальная область OCR вместо PRICE_SEARCH_RELATIVE_AREA.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data # {"template": [w, h], "samples": int, "bounds": [x0, y0, x1, y1] | None}
+
+    @property
+    def samples(self) -> int:
+        """Количество учтенных блоков цены."""
+        return int(self.data.get("samples", 0))
+
+    def add(self, x0: int, y0: int, x1: int, y1: int):
+        """Учитывает принятый блок цены (координаты относительно шаблона)."""
+        if x1 <= x0 or y1 <= y0:
+            return
+        bounds = self.data.get("bounds")
+        if not bounds:
+            self.data["bounds"] = [int(x0), int(y0), int(x1), int(y1)]
+        else:
+            self.data["bounds"] = [
+                min(bounds[0], int(x0)), min(bounds[1], int(y0)),
+                max(bounds[2], int(x1)), max(bounds[3], int(y1)),
+            ]
+        self.data["samples"] = self.samples + 1
+
+    def area(self, full_area: tuple[int, int, int, int], min_samples: int, margin: int) -> tuple[int, int, int, int] | None:
+        """
+        Возвращает суженную область (X, Y, ШИРИНА, ВЫСОТА) в формате
+        PRICE_SEARCH_RELATIVE_AREA, не выходящую за full_area.
+        None, если данных недостаточно или сужать нечего.
+        """
+        bounds = self.data.get("bounds")
+        if not bounds or self.samples < min_samples:
+            return None
+        full_x, full_y, full_w, full_h = full_area
+        x0 = max(full_x, bounds[0] - margin)
+        y0 = max(full_y, bounds[1] - margin)
+        x1 = min(full_x + full_w, bounds[2] + margin)
+        y1 = min(full_y + full_h, bounds[3] + margin)
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) >= full_w * full_h:
+            return None
+        return x0, y0, x1 - x0, y1 - y0
+
+
+class ScanAreaCalibrator:
+    """
+    Накапливает границы "полезной" части области сканирования: где находились
+    шаблоны (вместе с областью цены) и где менялось изображение. После заданного
+    числа циклов обновления списка выдает суженную область в глобальных координатах.
+    """
+
+    def __init__(self, base_area: dict, refresh_cycles: int, margin: int):
+        self.base_area = dict(base_area)
+        self.cycles_left = max(1, int(refresh_cycles))
+        self.margin = int(margin)
+        self.bounds = None # [x0, y0, x1, y1] в координатах base_area
+
+    def add_rect(self, x0: int, y0: int, x1: int, y1: int):
+        """Добавляет прямоугольник (координаты base_area) к накопленным границам."""
+        if x1 <= x0 or y1 <= y0:
+            return
+        if self.bounds is None:
+            self.bounds = [int(x0), int(y0), int(x1), int(y1)]
+        else:
+            self.bounds[0] = min(self.bounds[0], int(x0))
+            self.bounds[1] = min(self.bounds[1], int(y0))
+            self.bounds[2] = max(self.bounds[2], int(x1))
+            self.bounds[3] = max(self.bounds[3], int(y1))
+
+    def add_change_mask(self, changed: np.ndarray, step: int):
+        """
+        Добавляет границы изменившихся пикселей. changed - булева маска
+        прореженного кадра (каждый step-й пиксель области сканирования).
+        """
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        if rows.size == 0 or cols.size == 0:
+            return
+        self.add_rect(cols[0] * step, rows[0] * step, (cols[-1] + 1) * step, (rows[-1] + 1) * step)
+
+    def on_refresh(self) -> bool:
+        """Учитывает цикл обновления списка. Возвращает True, когда калибровка завершена."""
+        self.cycles_left -= 1
+        return self.cycles_left <= 0
+
+    def result(self) -> dict | None:
+        """
+        Возвращает суженную область в глобальных координатах (формат SCAN_AREA)
+        или None, если данных нет или сужать нечего.
+        """
+        if self.bounds is None:
+            return None
+        base_w, base_h = self.base_area["width"], self.base_area["height"]
+        x0 = max(0, self.bounds[0] - self.margin)
+        y0 = max(0, self.bounds[1] - self.margin)
+        x1 = min(base_w, self.bounds[2] + self.margin)
+        y1 = min(base_h, self.bounds[3] + self.margin)
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) >= base_w * base_h:
+            return None
+        return {
+            "left": self.base_area["left"] + x0,
+            "top": self.base_area["top"] + y0,
+            "width": x1 - x0,
+            "height": y1 - y0,
+        }
+
+# --- END OF FILE calibration.py ---
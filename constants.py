@@ -7,6 +7,9 @@ import os
 # --- Настройки главного окна ---
 MAIN_WINDOW_WIDTH = 450  # Немного расширено
 MAIN_WINDOW_HEIGHT = 300 # Увеличено для списка
+# Панель производительности (FPS, задержка захват -> клик, доли этапов, кэш OCR, CPU)
+PERF_PANEL_ENABLED = True
+PERF_PANEL_UPDATE_MS = 1000 # Период обновления панели (значения - за этот период)
 
 # --- Настройки авто-поиска ---
 # !!! ОБЯЗАТЕЛЬНО УСТАНОВИТЕ ЭТУ ОБЛАСТЬ !!!
@@ -16,6 +19,45 @@ MAIN_WINDOW_HEIGHT = 300 # Увеличено для списка
 # Пример: SCAN_AREA = {'top': 150, 'left': 50, 'width': 1200, 'height': 700}
 SCAN_AREA = {"left": 609, "top": 210, "width": 1679, "height": 1024} # Установите свои значения или оставьте 0 для автоопределения
 
+# --- Автокалибровка области сканирования ---
+# Если включено, Worker несколько циклов обновления списка наблюдает за SCAN_AREA,
+# запоминает, где находились шаблоны (вместе с областью цены) и где менялись строки,
+# и дальше захватывает только этот прямоугольник. Результат сохраняется в
+# CALIBRATION_DATA_FILE и используется, пока не изменится SCAN_AREA.
+# Чтобы откалибровать заново, удалите ключ "scan_area" из файла калибровки.
+SCAN_AREA_AUTO_CALIBRATION = False
+# Сколько циклов обновления списка наблюдать перед сужением области
+SCAN_AREA_CALIBRATION_REFRESH_CYCLES = 3
+# Запас вокруг найденной области (пиксели)
+SCAN_AREA_CALIBRATION_MARGIN = 16
+
+# --- Источник кадров (см. frame_sources.py) ---
+# "mss" - захват экрана (обычная работа);
+# "replay" - записанные кадры из FRAME_REPLAY_PATH (бенчмарки, разбор пропусков);
+# "synthetic" - сгенерированный список из шаблонов товаров со случайными ценами.
+# С источниками "replay" и "synthetic" клики не выполняются, действия только имитируются.
+FRAME_SOURCE = "mss"
+FRAME_REPLAY_PATH = "recordings/session"
+# "original" - исходная скорость записи, число - ускорение (2.0 = вдвое быстрее),
+# "max" - кадры подряд без пауз
+FRAME_REPLAY_SPEED = "original"
+FRAME_REPLAY_LOOP = False # По окончании записи начинать сначала
+FRAME_SYNTHETIC_SIZE = (1280, 720) # Ширина и высота синтетического кадра
+FRAME_SYNTHETIC_SEED = 0 # None - случайные кадры при каждом запуске
+
+# --- Запись кадров (см. frame_recorder.py) ---
+# Кадры области сканирования, обработанные Worker'ом, записываются (сжатие без потерь,
+# XOR с предыдущим кадром) в RECORDER_FOLDER/<дата_время> для разбора пропусков.
+# Запись воспроизводится источником "replay" (FRAME_REPLAY_PATH = папка записи).
+# Сжатие выполняется в отдельном потоке; если он не успевает, кадры пропускаются.
+RECORDER_ENABLED = False
+RECORDER_FOLDER = "recordings"
+RECORDER_KEYFRAME_INTERVAL = 30 # Полный кадр каждые N кадров (остальные - разница)
+RECORDER_COMPRESSION_LEVEL = 1 # zlib: 1 - быстрее всего, 9 - компактнее
+RECORDER_QUEUE_SIZE = 8 # Кадров в очереди записи
+RECORDER_MAX_MB = 500 # Предел размера одной записи (0 - без предела)
+RECORDER_KEEP_SESSIONS = 5 # Сколько последних записей хранить (0 - все)
+
 # Пауза между сканированиями, ЕСЛИ НИЧЕГО НЕ НАЙДЕНО И НЕ БЫЛО ОБНОВЛЕНИЯ
 SCAN_INTERVAL_WHEN_NOT_FOUND = 0.15 # Немного увеличено для снижения нагрузки
 
@@ -26,6 +68,18 @@ TEMPLATE_MATCH_THRESHOLD = 0.75 # Увеличено для точности
 # Имя папки для сохранения шаблонов (изображений названий).
 TEMPLATE_FOLDER = "item_templates"
 
+# Кэш подготовленных шаблонов (серые массивы, статистика) в папке шаблонов:
+# файл .npy (memory-map) и индекс .json с тем же именем. Неизмененные шаблоны
+# (время изменения/размер, затем SHA-1) загружаются без декодирования PNG.
+TEMPLATE_CACHE_ENABLED = True
+TEMPLATE_CACHE_FILE = "_template_cache.npy"
+# Уровни пирамиды (cv2.pyrDown), сохраняемые в кэше. Поиск шаблонов их пока
+# не использует, поэтому по умолчанию 0.
+TEMPLATE_CACHE_PYRAMID_LEVELS = 0
+# Шаблоны с меньшим стандартным отклонением яркости (однотонные) пропускаются:
+# для них TM_CCOEFF_NORMED не дает осмысленного результата.
+TEMPLATE_MIN_STDDEV = 1.0
+
 # --- Прочее ---
 # Пауза в главном цикле Worker'а для снижения нагрузки на CPU (мгновенная пауза при действии/обновлении)
 WORKER_LOOP_PAUSE = 0.02 # Очень короткая пауза, основная пауза после действия
@@ -33,6 +87,60 @@ WORKER_LOOP_PAUSE = 0.02 # Очень короткая пауза, основн
 # Пауза ПОСЛЕ выполнения действия (Клик+ESC) перед следующим сканированием
 POST_ACTION_PAUSE = 1.0 # Увеличено для стабильности после клика/ESC
 
+# --- Ограничение времени этапов Worker'а (см. stages.py) ---
+# Поиск шаблона и OCR цены выполняются в отдельном потоке-исполнителе с предельным
+# временем (секунды). Остановка прерывает ожидание сразу, а этап, не уложившийся
+# в срок, отбрасывается (товар пропускается в этом кадре) с записью в лог и статус.
+STAGE_DEADLINES = {
+    "match": 1.0, # cv2.matchTemplate одного шаблона
+    "ocr": 5.0, # reader.readtext области цены
+}
+# Интервал проверки флага остановки во время ожидания этапа (секунды)
+STAGE_CANCEL_POLL_INTERVAL = 0.05
+# Гарантированное время остановки постоянного потока Worker'а при выходе (мс)
+WORKER_STOP_BUDGET_MS = 2000
+
+# --- Сторож этапов Worker'а (см. stage_watchdog.py) ---
+# Отдельный поток следит за длительностью этапов и при зависании пишет в лог
+# событие со стеком зависшего потока и показывает предупреждение в статусе.
+WATCHDOG_ENABLED = True
+# Лимиты этапов (секунды). Лимиты "match"/"ocr" относятся к выполнению в потоке-исполнителе
+# и должны быть больше STAGE_DEADLINES: сторож сообщает о действительно зависших вызовах.
+WATCHDOG_STAGE_DEADLINES = {
+    "grab": 3.0, # Захват экрана MSS
+    "match": 5.0, # cv2.matchTemplate
+    "ocr": 20.0, # reader.readtext
+    "action": 5.0, # Клик по товару + Esc (pyautogui)
+    "refresh": 5.0, # Клик по кнопке "Обновить" (pyautogui)
+}
+WATCHDOG_CHECK_INTERVAL = 0.5 # Период проверки (секунды)
+# Перезапускать Worker при зависании: зависший поток бросается (он завершится сам,
+# если вызов когда-нибудь вернется), поиск продолжается в новом потоке Worker'а.
+WATCHDOG_AUTO_RESTART = False
+
+# --- Режим простоя (экспоненциальное увеличение паузы) ---
+# Если несколько кадров подряд не дают ни одного совпадения шаблона, пауза
+# цикла Worker'а постепенно растет: WORKER_LOOP_PAUSE * IDLE_BACKOFF_FACTOR^n,
+# но не больше IDLE_MAX_LOOP_PAUSE. Во время длинной паузы Worker делает
+# пробу: захватывает всю область сканирования (захват не дешевле обычного),
+# но сравнивает только прореженную копию - без поиска шаблонов и OCR -
+# и при изменении экрана сразу возвращается к полной частоте.
+IDLE_BACKOFF_ENABLED = True
+# Сколько пустых кадров подряд допускается до начала увеличения паузы
+IDLE_BACKOFF_AFTER_EMPTY_FRAMES = 5
+# Множитель паузы на каждый следующий пустой кадр
+IDLE_BACKOFF_FACTOR = 2.0
+# Максимальная пауза цикла в режиме простоя (секунды)
+IDLE_MAX_LOOP_PAUSE = 1.0
+# Как часто выполняется проба изменения экрана во время длинной паузы (секунды)
+IDLE_PROBE_INTERVAL = 0.1
+# Шаг прореживания захваченного кадра для сравнения в пробе (каждый N-й пиксель по X и Y)
+IDLE_PROBE_STEP = 8
+# Минимальное изменение яркости пикселя пробы (0-255), считающееся изменением
+IDLE_PROBE_PIXEL_DELTA = 25
+# Доля измененных пикселей пробы, при которой Worker "просыпается"
+IDLE_PROBE_CHANGED_FRACTION = 0.002
+
 # --- Настройки области поиска цены и OCR ---
 # !!! КРИТИЧЕСКИ ВАЖНО НАСТРОИТЬ ПРАВИЛЬНО !!!
 # Прямоугольная область, в которой будет выполняться поиск текста цены,
@@ -73,6 +181,20 @@ PRICE_MIN_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM = 0 # Уменьшено - ТРЕ
 # Был 40. Оставим пока так.
 PRICE_MAX_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM = 40 # ТРЕБУЕТ НАСТРОЙКИ!
 
+# --- Автокалибровка области поиска цены ---
+# Worker запоминает, где относительно шаблона находились принятые блоки цены
+# (отдельно для каждого товара и размера шаблона, в CALIBRATION_DATA_FILE),
+# и выполняет OCR только на минимальной области вокруг них внутри
+# PRICE_SEARCH_RELATIVE_AREA. Если в суженной области цена не найдена или блок
+# цены касается ее края, OCR повторяется на полной области.
+PRICE_AREA_AUTO_CALIBRATION = True
+# Сколько принятых блоков цены нужно, прежде чем сужать область
+PRICE_AREA_CALIBRATION_MIN_SAMPLES = 5
+# Запас вокруг найденных блоков цены (пиксели)
+PRICE_AREA_CALIBRATION_MARGIN = 8
+# Блок ближе этого расстояния к краю суженной области считается обрезанным (пиксели)
+PRICE_AREA_EDGE_GUARD = 2
+
 
 # Название окна игры (пока не используется активно).
 TARGET_WINDOW_TITLE = "Grand Theft Auto V"
@@ -85,6 +207,57 @@ OCR_LANGUAGES = ["en", "ru"]
 # Добавлена запятая как возможный разделитель тысяч.
 OCR_PRICE_ALLOWLIST = "0123456789$ ,"
 
+# Бэкенд модели распознавания (см. ocr_backends.py):
+# "torch" - исходная fp32 модель; "int8" - динамическое квантование (быстрее на CPU);
+# "onnx" - выполнение через onnxruntime (нужен pip install onnxruntime).
+# При недоступности бэкенда или недостаточной точности используется "torch".
+# "int8"/"onnx" включаются вручную: они меняют модель распознавания цены, а проверка
+# точности (OCR_BACKEND_ACCURACY_CHECK) добавляет распознавания при загрузке OCR.
+OCR_BACKEND = "torch"
+# Проверять точность бэкенда относительно fp32 модели при загрузке
+OCR_BACKEND_ACCURACY_CHECK = True
+# Минимальная доля совпадающих (по цифрам) результатов, 0..1
+OCR_BACKEND_MIN_AGREEMENT = 1.0
+# Файл кэша ONNX модели (относительно BASE_DIR), {langs} - языки OCR через "_"
+OCR_ONNX_MODEL_FILE = "ocr_recognizer_{langs}.onnx"
+# Кэш результатов OCR цены: сколько последних областей (по хэшу пикселей) помнить.
+# Та же строка списка на неизменном экране дает побайтно ту же область - OCR не нужен.
+# Цена из кэша участвует в решении о покупке без повторного распознавания,
+# поэтому кэш по умолчанию отключен.
+# 0 - кэш отключен.
+OCR_RESULT_CACHE_SIZE = 0
+
+# --- Профиль производительности (потоки и ядра CPU) ---
+# torch и OpenCV по умолчанию создают пулы потоков на все ядра и конкурируют
+# друг с другом и с потоком Qt. При запуске нескольких экземпляров на одной
+# машине выберите "multi_instance" и задайте каждому экземпляру свои ядра.
+# Ключи профиля (None - не менять):
+#   torch_intra_op_threads - потоков внутри операции torch (OCR);
+#   torch_inter_op_threads - потоков между операциями torch;
+#   opencv_threads - потоков OpenCV (0 - без собственного пула);
+#   worker_cpu_affinity - список номеров ядер для потока Worker'а, например [2, 3].
+PERFORMANCE_PROFILES = {
+    "default": {
+        "torch_intra_op_threads": None,
+        "torch_inter_op_threads": None,
+        "opencv_threads": None,
+        "worker_cpu_affinity": None,
+    },
+    "balanced": {
+        "torch_intra_op_threads": max(1, (os.cpu_count() or 2) // 2),
+        "torch_inter_op_threads": 1,
+        "opencv_threads": 2,
+        "worker_cpu_affinity": None,
+    },
+    "multi_instance": {
+        "torch_intra_op_threads": 2,
+        "torch_inter_op_threads": 1,
+        "opencv_threads": 1,
+        "worker_cpu_affinity": None,
+    },
+}
+PERFORMANCE_PROFILE = "default"
+
 # --- Горячие клавиши ---
 # Используются библиотекой 'keyboard'.
 # Список названий клавиш: https://github.com/sentientmatter/py-simple-keyboard/blob/master/keyboard/__init__.py
@@ -92,9 +265,13 @@ OCR_PRICE_ALLOWLIST = "0123456789$ ,"
 # Для Numpad клавиши обычно именуются как есть, например '+', '-', '*'
 ADD_ITEM_HOTKEY = "-" # Numpad '-'
 STOP_MONITORING_HOTKEY = "*" # Numpad '*'
+TRACE_DUMP_HOTKEY = "/" # Numpad '/': сохранить трассировку Worker'а (при TRACE_ENABLED)
+PROFILER_HOTKEY = "+" # Numpad '+': запуск/остановка профилировщика Worker'а ("" - отключен)
 
 # --- Файл данных ---
 ITEM_DATA_FILE = "market_items.json"
+# Файл автокалибровки (обученные области поиска и т.п.), хранится рядом с ITEM_DATA_FILE
+CALIBRATION_DATA_FILE = "market_calibration.json"
 
 # --- Настройки авто-обновления ---
 # Координаты кнопки "Обновить список" или аналогичного действия.
@@ -110,6 +287,50 @@ MIN_REFRESH_INTERVAL = 7.0 # Увеличено для снижения бесп
 DEFAULT_ITEM_ENABLED = True
 DEFAULT_ITEM_QUANTITY = 1
 DEFAULT_ITEM_MAX_PRICE = 0 # 0 означает без лимита
+DEFAULT_ITEM_PRIORITY = "normal"
+DEFAULT_ITEM_SCAN_EVERY_N_FRAMES = 0 # 0 означает "по приоритету"
+
+# --- Приоритеты и частота сканирования товаров ---
+# Товары с более высоким приоритетом проверяются первыми в каждом кадре.
+# Значение - как часто проверять шаблон товара: каждый N-й кадр.
+# Поле товара 'scan_every_n_frames' (> 0) переопределяет значение приоритета.
+# Проверки товаров с одинаковой частотой распределяются по разным кадрам,
+# чтобы нагрузка на кадр оставалась ровной при росте каталога.
+ITEM_PRIORITY_SCAN_EVERY_N_FRAMES = {
+    "high": 1,
+    "normal": 1,
+    "low": 4,
+}
+# Отображаемые названия приоритетов (в порядке убывания приоритета)
+ITEM_PRIORITY_LABELS = {
+    "high": "Высокий",
+    "normal": "Обычный",
+    "low": "Низкий",
+}
+# Максимально допустимое значение 'scan_every_n_frames'
+MAX_ITEM_SCAN_EVERY_N_FRAMES = 100
+
+# Внутри одного приоритета Worker упорядочивает шаблоны по статистике:
+# сначала товары, которые чаще находятся (скользящее среднее частоты совпадений),
+# при равенстве - те, что обычно находятся выше в списке.
+# Коэффициент сглаживания скользящего среднего (0..1, больше - быстрее реагирует).
+MATCH_STATS_EMA_ALPHA = 0.1
+
+# --- Обучаемые области поиска товаров ---
+# Worker запоминает, где на экране находился шаблон каждого товара (тепловая карта
+# в CALIBRATION_DATA_FILE), и ищет шаблон только в этой области. Периодически
+# выполняется поиск по всей области сканирования, чтобы область могла расшириться.
+SEARCH_REGION_LEARNING_ENABLED = True
+# Размер ячейки тепловой карты (пиксели)
+SEARCH_REGION_CELL_SIZE = 16
+# Сколько совпадений нужно накопить, прежде чем сужать поиск
+SEARCH_REGION_MIN_HITS = 5
+# Запас вокруг обученной области (пиксели)
+SEARCH_REGION_MARGIN = 24
+# Каждая N-я проверка товара выполняется по всей области сканирования
+SEARCH_REGION_EXPLORE_EVERY_N_SCANS = 20
+# При превышении этого числа совпадений счетчики карты делятся пополам (адаптация)
+SEARCH_REGION_MAX_HITS = 500
 
 # --- Отладка ---
 # --- ОТЛАДКА: Сохранять изображение ОБЛАСТИ ПОИСКА цены? ---
@@ -120,6 +341,36 @@ DEBUG_SAVE_PRICE_ROI = True
 # Путь для сохранения отладочного ROI цены (относительно BASE_DIR)
 DEBUG_PRICE_ROI_PATH = "_debug_price_roi.png"
 
+# --- Корпус областей цены (см. price_corpus.py и ocr_harness.py) ---
+# Сохранять каждую область OCR цены с результатом распознавания в PRICE_CORPUS_FOLDER
+# (относительно BASE_DIR) для проверки точности и скорости бэкендов OCR.
+PRICE_CORPUS_ENABLED = False
+PRICE_CORPUS_FOLDER = "price_corpus"
+PRICE_CORPUS_MAX_SAMPLES = 5000 # После этого сбор останавливается
+
+# --- Метрики Worker'а (см. metrics_exporter.py) ---
+# Метрики собираются всегда (панель производительности главного окна), а
+# HTTP адрес со счетчиками и гистограммами в формате Prometheus: http://127.0.0.1:METRICS_PORT/metrics
+# При нескольких экземплярах на одной машине задайте каждому свой порт.
+METRICS_ENABLED = False
+METRICS_HOST = "127.0.0.1" # Только локальный доступ
+METRICS_PORT = 9108
+
+# --- Трассировка итераций Worker'а (см. tracing.py) ---
+# Отрезки этапов (захват, конвертация, поиск каждого шаблона, OCR, действие, пауза)
+# копятся в кольцевом буфере; по TRACE_DUMP_HOTKEY буфер сохраняется в TRACE_FOLDER
+# (относительно BASE_DIR) для chrome://tracing или https://ui.perfetto.dev.
+TRACE_ENABLED = False
+TRACE_BUFFER_EVENTS = 50000 # Последние N отрезков (порядка нескольких минут работы)
+TRACE_FOLDER = "traces"
+
+# --- Профилировщик потоков Worker'а (см. sampling_profiler.py) ---
+# PROFILER_HOTKEY запускает и останавливает выборочный профилировщик потоков Worker'а
+# (цикл поиска и исполнитель этапов). Профиль сохраняется рядом с файлом лога:
+# profile_*.collapsed (для flamegraph / speedscope) и profile_*.txt (самые затратные функции).
+PROFILER_SAMPLE_INTERVAL = 0.005 # Секунды между выборками стеков
+PROFILER_TOP_FUNCTIONS = 40 # Строк в сводке
+
 # --- Имя файла лога ---
 LOG_FILE_NAME = "market_helper.log"
 
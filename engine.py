@@ -0,0 +1,2090 @@
+# --- START OF FILE engine.py ---
+
+# engine.py
+"""
+Движок поиска без Qt: захват экрана, поиск шаблонов, OCR цены и действия.
+ScanEngine не импортирует PyQt и не требует QApplication: его использует
+Qt-обертка Worker (logic.py), консольный запуск headless.py и бенчмарки.
+События движка передаются функцией on_event(имя, *аргументы), см. ScanEngine.EVENTS,
+измерения (время этапов, результаты проверок) - функцией on_metric, см. ScanEngine.METRICS.
+"""
+import collections
+import contextlib
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from lazy_import import lazy_import, preload
+
+if TYPE_CHECKING:
+    import cv2
+    import easyocr
+    import pyautogui
+
+    from template_cache import TemplateCache
+
+cv2 = lazy_import("cv2")
+easyocr = lazy_import("easyocr")
+pyautogui = lazy_import("pyautogui")
+
+import ocr_backends
+import performance
+import startup_profiler
+from calibration import CalibrationStore, ScanAreaCalibrator
+from constants import (
+    CALIBRATION_DATA_FILE,
+    DEBUG_PRICE_ROI_PATH,
+    DEBUG_SAVE_PRICE_ROI,
+    DEFAULT_ITEM_MAX_PRICE,
+    DEFAULT_ITEM_PRIORITY,
+    DEFAULT_ITEM_QUANTITY,
+    DEFAULT_ITEM_SCAN_EVERY_N_FRAMES,
+    FRAME_REPLAY_LOOP,
+    FRAME_REPLAY_PATH,
+    FRAME_REPLAY_SPEED,
+    FRAME_SOURCE,
+    FRAME_SYNTHETIC_SEED,
+    FRAME_SYNTHETIC_SIZE,
+    IDLE_BACKOFF_AFTER_EMPTY_FRAMES,
+    IDLE_BACKOFF_ENABLED,
+    IDLE_BACKOFF_FACTOR,
+    IDLE_MAX_LOOP_PAUSE,
+    IDLE_PROBE_CHANGED_FRACTION,
+    IDLE_PROBE_INTERVAL,
+    IDLE_PROBE_PIXEL_DELTA,
+    IDLE_PROBE_STEP,
+    ITEM_PRIORITY_LABELS,
+    ITEM_PRIORITY_SCAN_EVERY_N_FRAMES,
+    MATCH_STATS_EMA_ALPHA,
+    MAX_ITEM_SCAN_EVERY_N_FRAMES,
+    MIN_REFRESH_INTERVAL,
+    OCR_BACKEND,
+    OCR_BACKEND_ACCURACY_CHECK,
+    OCR_BACKEND_MIN_AGREEMENT,
+    OCR_LANGUAGES,
+    OCR_ONNX_MODEL_FILE,
+    OCR_PRICE_ALLOWLIST,
+    OCR_RESULT_CACHE_SIZE,
+    PERFORMANCE_PROFILE,
+    PERFORMANCE_PROFILES,
+    POST_ACTION_PAUSE,
+    PRICE_AREA_AUTO_CALIBRATION,
+    PRICE_AREA_CALIBRATION_MARGIN,
+    PRICE_AREA_CALIBRATION_MIN_SAMPLES,
+    PRICE_AREA_EDGE_GUARD,
+    PRICE_CORPUS_ENABLED,
+    PRICE_CORPUS_FOLDER,
+    PRICE_CORPUS_MAX_SAMPLES,
+    PRICE_MAX_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM,
+    PRICE_MIN_HORIZONTAL_OFFSET_FROM_TEMPLATE_LEFT,
+    PRICE_MIN_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM,
+    PRICE_OCR_CONFIDENCE_THRESHOLD,
+    PRICE_SEARCH_RELATIVE_AREA,
+    RECORDER_COMPRESSION_LEVEL,
+    RECORDER_ENABLED,
+    RECORDER_FOLDER,
+    RECORDER_KEEP_SESSIONS,
+    RECORDER_KEYFRAME_INTERVAL,
+    RECORDER_MAX_MB,
+    RECORDER_QUEUE_SIZE,
+    REFRESH_BUTTON_X,
+    REFRESH_BUTTON_Y,
+    REFRESH_PAUSE,
+    SCAN_AREA,
+    SCAN_AREA_AUTO_CALIBRATION,
+    SCAN_AREA_CALIBRATION_MARGIN,
+    SCAN_AREA_CALIBRATION_REFRESH_CYCLES,
+    SEARCH_REGION_CELL_SIZE,
+    SEARCH_REGION_EXPLORE_EVERY_N_SCANS,
+    SEARCH_REGION_LEARNING_ENABLED,
+    SEARCH_REGION_MARGIN,
+    SEARCH_REGION_MAX_HITS,
+    SEARCH_REGION_MIN_HITS,
+    STAGE_CANCEL_POLL_INTERVAL,
+    STAGE_DEADLINES,
+    TEMPLATE_MATCH_THRESHOLD,
+    TEMPLATE_MIN_STDDEV,
+    WATCHDOG_CHECK_INTERVAL,
+    WATCHDOG_ENABLED,
+    WATCHDOG_STAGE_DEADLINES,
+    WORKER_LOOP_PAUSE,
+)
+import frame_recorder
+from frame_sources import SOURCE_REPLAY, FrameSource, FrameSourceError, FrameSourceExhausted, create_frame_source
+from price_corpus import PriceCorpusWriter
+from stage_watchdog import StageWatchdog
+from stages import StageCancelled, StageDeadlineExceeded, StageRunner
+from tracing import TraceBuffer
+
+# --- Базовая директория и пути (как в logic.py, без зависимости от Qt) ---
+try:
+    if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
+        BASE_DIR = os.path.dirname(sys.executable)
+    else:
+        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+except Exception:
+    BASE_DIR = os.getcwd()
+
+ABS_CALIBRATION_DATA_FILE = os.path.join(BASE_DIR, CALIBRATION_DATA_FILE)
+ABS_DEBUG_PRICE_ROI_PATH = os.path.join(BASE_DIR, DEBUG_PRICE_ROI_PATH)
+ABS_OCR_ONNX_MODEL_FILE = os.path.join(BASE_DIR, OCR_ONNX_MODEL_FILE.format(langs="_".join(OCR_LANGUAGES)))
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.engine")
+
+# --- Глобальная блокировка для pyautogui ---
+# Это необходимо, чтобы избежать одновременных вызовов pyautogui из разных потоков,
+# что может привести к непредсказуемому поведению или ошибкам.
+input_lock = threading.RLock()
+
+# --- Глобальная блокировка для EasyOCR Reader ---
+# Reader один на процесс и не рассчитан на одновременные вызовы. После перезапуска
+# зависшего Worker'а брошенный поток этапов может еще выполнять readtext, пока
+# новый Worker вызывает readtext того же Reader'а: вызовы идут по очереди.
+ocr_lock = threading.Lock()
+
+
+def get_item_scan_cadence(item_data: dict) -> tuple[str, int]:
+    """
+    Возвращает (приоритет, частота) для товара: нормализованный ключ приоритета
+    и "проверять каждый N-й кадр". Некорректные значения заменяются значениями
+    по умолчанию, чтобы старые записи market_items.json работали как раньше.
+    """
+    priority = item_data.get("priority", DEFAULT_ITEM_PRIORITY)
+    if priority not in ITEM_PRIORITY_SCAN_EVERY_N_FRAMES:
+        priority = DEFAULT_ITEM_PRIORITY
+
+    every_n = item_data.get("scan_every_n_frames", DEFAULT_ITEM_SCAN_EVERY_N_FRAMES)
+    if not isinstance(every_n, int) or isinstance(every_n, bool) or every_n <= 0:
+        # 0 или некорректное значение - частота берется из приоритета
+        every_n = ITEM_PRIORITY_SCAN_EVERY_N_FRAMES.get(priority, 1)
+    return priority, max(1, min(every_n, MAX_ITEM_SCAN_EVERY_N_FRAMES))
+
+
+def load_ocr_reader(perf_profile: dict, progress=None) -> "easyocr.Reader":
+    """
+    Импортирует тяжелые библиотеки, применяет профиль производительности,
+    создает EasyOCR Reader, выполняет прогрев и подключает OCR_BACKEND.
+    progress(текст) - необязательный обработчик этапов загрузки.
+    Ошибки создания модели пробрасываются вызывающему.
+    """
+    progress = progress or (lambda text: None)
+    start_time = time.monotonic()
+
+    # Импорт заранее, чтобы первый скан и первый клик Worker'а не ждали импорта
+    progress("Загрузка библиотек...")
+    with startup_profiler.section("Импорт cv2, pyautogui, easyocr"):
+        preload(cv2, pyautogui, easyocr)
+
+    # Потоки torch/OpenCV - до создания модели и первой операции torch
+    torch_module = sys.modules.get("torch")
+    performance.apply_libraries(perf_profile, torch_module, cv2)
+    logger.info(
+        f"Профиль производительности '{PERFORMANCE_PROFILE}': "
+        f"{performance.describe_effective(torch_module, cv2)}"
+    )
+
+    progress(f"Загрузка OCR ({', '.join(OCR_LANGUAGES)})...")
+    logger.info(f"Попытка инициализации EasyOCR с языками: {OCR_LANGUAGES}, gpu=False")
+    with startup_profiler.section("Создание easyocr.Reader"):
+        reader = easyocr.Reader(OCR_LANGUAGES, gpu=False)
+    logger.info(f"EasyOCR инициализирован за {time.monotonic() - start_time:.2f}с.")
+
+    # Прогрев OCR: выполняем тестовое распознавание на пустом изображении
+    # Это может помочь загрузить модели и ускорить первое реальное распознавание.
+    progress("Прогрев OCR...")
+    logger.info("Прогрев OCR...")
+    try:
+        # Создаем маленькое пустое изображение
+        dummy_img = np.zeros((50, 200, 3), dtype=np.uint8)
+        with startup_profiler.section("Прогрев OCR"):
+            _ = reader.readtext(dummy_img, detail=0)
+        logger.info("Прогрев OCR завершен успешно.")
+    except Exception as warm_e:
+        logger.warning(f"Ошибка при прогреве OCR: {warm_e}")
+
+    # Ускоренный бэкенд модели распознавания (после прогрева, чтобы
+    # замер скорости fp32 модели в проверке точности был честным)
+    if OCR_BACKEND != ocr_backends.BACKEND_TORCH:
+        progress(f"Подготовка OCR бэкенда '{OCR_BACKEND}'...")
+        with startup_profiler.section(f"OCR бэкенд {OCR_BACKEND}"):
+            backend = ocr_backends.apply_ocr_backend(
+                reader,
+                OCR_BACKEND,
+                ABS_OCR_ONNX_MODEL_FILE,
+                OCR_PRICE_ALLOWLIST,
+                check_accuracy=OCR_BACKEND_ACCURACY_CHECK,
+                min_agreement=OCR_BACKEND_MIN_AGREEMENT,
+                extra_sample_paths=[ABS_DEBUG_PRICE_ROI_PATH],
+            )
+        logger.info(f"OCR бэкенд распознавания: '{backend}' (запрошен '{OCR_BACKEND}').")
+    return reader
+
+
+def _match_template(image: np.ndarray, template: np.ndarray) -> tuple:
+    """Этап "match": cv2.matchTemplate + cv2.minMaxLoc (результат minMaxLoc)."""
+    return cv2.minMaxLoc(cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED))
+
+
+def extract_price_digits(text: str) -> str:
+    """
+    Очищает строку от разрешенных нецифровых символов ($, пробелы, запятые)
+    и возвращает строку цифр, только если после чистки остаются ТОЛЬКО цифры.
+    Возвращает пустую строку, если есть другие символы.
+    """
+    if not isinstance(text, str):
+        return ""
+
+    # Удаляем только разрешенные нецифровые символы
+    cleaned_text = text.strip().replace("$", "").replace(" ", "").replace(",", "")
+
+    # Проверяем, что после удаления разрешенных символов осталась строка, состоящая ТОЛЬКО из цифр
+    if cleaned_text.isdigit():
+        return cleaned_text
+    else:
+        return "" # Возвращаем пустую строку, если были другие символы или пусто
+
+
+def select_price_candidate(
+    ocr_results: list,
+    roi_origin: tuple[int, int],
+    template_box: tuple[int, int, int, int],
+) -> tuple[tuple | None, dict]:
+    """
+    Выбирает блок цены среди результатов OCR (EasyOCR detail=1: [(bbox, текст, уверенность)]).
+    roi_origin - левый верхний угол области OCR, template_box - (x, y, w, h) найденного
+    названия, оба в одних координатах (области сканирования или самой области OCR).
+    Возвращает (кандидат (цифры, уверенность, bbox) или None, причины отказа {причина: блоков}):
+    "confidence" - низкая уверенность, "text" - не только цифры, "position" - не на строке цены.
+    Не зависит от состояния движка: используется и в ocr_harness.py.
+    """
+    roi_left, roi_top = roi_origin
+    template_x, template_y, _template_w, template_h = template_box
+    rejected = {}
+
+    # Итерируем в обратном порядке, чтобы найти цену, которая обычно справа
+    # Сортируем блоки по координате X верхнего левого угла (по убыванию)
+    # Это позволяет обрабатывать блоки справа налево
+    sorted_ocr_results = sorted(ocr_results, key=lambda x: x[0][0][0], reverse=True)
+
+    for (bbox_in_search_roi, text, confidence) in sorted_ocr_results:
+        # Проверяем уверенность OCR для этого блока
+        if confidence < PRICE_OCR_CONFIDENCE_THRESHOLD:
+            rejected["confidence"] = rejected.get("confidence", 0) + 1
+            continue # Пропускаем блоки с низкой уверенностью
+
+        # Проверяем, похож ли текст блока на цену (содержит цифры и разрешенные символы)
+        cleaned_text = extract_price_digits(text)
+        if not cleaned_text:
+            rejected["text"] = rejected.get("text", 0) + 1
+            continue # Пропускаем блоки, которые не являются чистыми числами
+
+        # !!! Дополнительная проверка положения блока ОТНОСИТЕЛЬНО НАЙДЕННОГО НАЗВАНИЯ !!!
+        # Координаты верхнего левого угла блока в координатах названия
+        block_x = roi_left + int(bbox_in_search_roi[0][0])
+        block_y = roi_top + int(bbox_in_search_roi[0][1])
+
+        # Проверяем горизонтальное положение: Левый край блока цены должен быть правее
+        # левого края названия + минимальный отступ.
+        # Проверяем вертикальное положение: Верхний край блока цены должен находиться
+        # в заданном диапазоне относительно НИЖНЕГО края названия.
+        template_bottom_y = template_y + template_h
+        if (
+            block_x < template_x + PRICE_MIN_HORIZONTAL_OFFSET_FROM_TEMPLATE_LEFT
+            or not (
+                template_bottom_y + PRICE_MIN_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM
+                <= block_y
+                <= template_bottom_y + PRICE_MAX_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM
+            )
+        ):
+            rejected["position"] = rejected.get("position", 0) + 1
+            continue # Блок не на ожидаемой строке цены
+
+        # Если блок прошел все проверки (уверенность, текст, положение)
+        # Считаем его валидным кандидатом. Так как мы итерируем справа налево,
+        # первый найденный валидный блок, вероятно, и есть цена.
+        return (cleaned_text, confidence, bbox_in_search_roi), rejected
+
+    return None, rejected
+
+
+class ScanEngine:
+    """
+    Выполняет поиск и действия в отдельном потоке.
+    Логирование в файл. Усиленная проверка остановки.
+
+    События передаются через on_event(имя, *аргументы), см. EVENTS.
+    Движок живет все время работы приложения в своем потоке (метод serve())
+    и принимает команды через очередь (post_command): "start" - сеанс поиска
+    (run()), "update" - новый список товаров, "shutdown" - завершение потока.
+    Остановка сеанса - request_stop(), вызывается из любого потока.
+    Источник кадров, шаблоны и калибровка остаются загруженными между сеансами.
+    Изменения отдельных товаров во время поиска передаются через
+    post_item_delta() и применяются в начале следующего кадра.
+    """
+
+    CMD_START = "start"
+    CMD_UPDATE = "update"
+    CMD_SHUTDOWN = "shutdown"
+
+    # Изменения товаров во время поиска (см. post_item_delta())
+    DELTA_UPSERT = "upsert" # Добавить товар или обновить его параметры
+    DELTA_REMOVE = "remove" # Удалить товар (выгрузить шаблон)
+    # Параметры товара, которые можно менять без перезагрузки шаблона
+    LIVE_ITEM_FIELDS = ("enabled", "max_price", "quantity", "priority", "scan_every_n_frames")
+
+    # События движка (имя -> аргументы), передаются в on_event
+    EVENTS = {
+        "finished": "(bool, object) сеанс завершен; True - по достижению всех целей; id сеанса из post_command",
+        "error": "(str) ошибка, не критическая для краха потока",
+        "action_performed": "(str, int, int) товар, цена, всего куплено",
+        "first_scan_completed": "() первый кадр полностью обработан",
+        "service_stopped": "() цикл команд serve() завершен (после CMD_SHUTDOWN)",
+        "stage_overrun": "(str, float) этап превысил лимит STAGE_DEADLINES: этап, время",
+        "stage_stalled": "(dict) сторож обнаружил зависание этапа (см. stage_watchdog.py)",
+    }
+
+    # Измерения движка (имя -> аргументы), передаются в on_metric (бенчмарки, диагностика)
+    METRICS = {
+        "stage_time": "(str, float) этап ('grab', 'convert', 'match', 'ocr', 'action', 'refresh', 'frame') и его время, с",
+        "item_checked": "(str, float, bool, int | None) товар, уверенность шаблона, найден ли он, распознанная цена",
+        "frame_skipped": "(str) кадр пропущен: 'no_area', 'capture_error' или 'empty'",
+        "ocr_cache_hit": "() результат OCR цены взят из кэша (OCR_RESULT_CACHE_SIZE)",
+        "worker_state": "(str) состояние сеанса: 'running', 'idle' (режим простоя) или 'stopped'",
+        "action_latency": "(float) время от начала захвата кадра до клика по товару, с",
+    }
+
+    def __init__(
+        self,
+        items_to_search: list,
+        ocr_reader: "easyocr.Reader",
+        template_cache: "TemplateCache | None" = None,
+        on_event=None,
+        extra_stop_check=None,
+        frame_source: FrameSource | None = None,
+        on_metric=None,
+        tracer: TraceBuffer | None = None,
+    ):
+        # Имя потока для логирования устанавливается в serve(),
+        # т.к. поток создается и запускается извне.
+        self.on_event = on_event # on_event(имя, *аргументы), вызывается в потоке движка
+        self.on_metric = on_metric # on_metric(имя, *аргументы), см. METRICS; None - измерения не собираются
+        self.extra_stop_check = extra_stop_check # Дополнительная проверка остановки (напр., прерывание QThread)
+        self.tracer = tracer # Буфер трассировки этапов (tracing.py); None - трассировка отключена
+        self.worker_id = "Worker"
+
+        logger.info("Инициализация Worker...")
+        # Копируем данные, чтобы Worker работал с собственной копией
+        self.items_data = [item.copy() for item in items_to_search]
+        self.ocr_reader = ocr_reader # Reader передается из основного потока
+        self.template_cache = template_cache # Кэш подготовленных шаблонов (общий с BotLogic)
+        self.templates = {} # Загруженные шаблоны OpenCV
+        self.item_progress = {} # Словарь для отслеживания купленного кол-ва
+        self.item_schedule = {} # Расписание проверки: имя -> {"rank", "every", "phase"}
+        self.item_stats = {} # Статистика совпадений: имя -> {"scans", "hits", "hit_rate", "mean_y"}
+        self.item_heatmaps = {} # Тепловые карты совпадений: имя -> LocationHeatmap
+        self.price_areas = {} # Калибровка области цены: имя -> PriceAreaCalibrator
+        # Калибровочные данные (обученные области поиска), сохраняются при завершении Worker'а
+        self.calibration = CalibrationStore(ABS_CALIBRATION_DATA_FILE)
+        # Сбор областей цены для ocr_harness.py (PRICE_CORPUS_ENABLED)
+        self.price_corpus = (
+            PriceCorpusWriter(os.path.join(BASE_DIR, PRICE_CORPUS_FOLDER), PRICE_CORPUS_MAX_SAMPLES)
+            if PRICE_CORPUS_ENABLED else None
+        )
+        self.calibration.load()
+        # Кэш результатов OCR цены: хэш области -> результаты readtext (см. OCR_RESULT_CACHE_SIZE)
+        self.ocr_cache = collections.OrderedDict()
+        self.scan_area_calibrator = None # Активна, пока идет автокалибровка SCAN_AREA
+        self._frame_index = 0 # Номер текущего кадра (для расписания проверки товаров)
+        self._frame_start_time = None # time.perf_counter() начала захвата текущего кадра
+        self._first_scan_reported = False # Отправлен ли сигнал first_scan_completed
+        self._stop_event = threading.Event() # Событие для надежной остановки Worker'а
+        # Сторож зависаний этапов (захват, поиск, OCR, клики)
+        self.watchdog = None
+        if WATCHDOG_ENABLED:
+            self.watchdog = StageWatchdog(
+                WATCHDOG_STAGE_DEADLINES, WATCHDOG_CHECK_INTERVAL,
+                on_stall=lambda event: self._emit("stage_stalled", event), name=f"WorkerWatchdog_{id(self)}",
+            )
+        # Исполнитель этапов (поиск шаблона, OCR) с ограничением времени и отменой по _stop_event
+        self.stage_runner = StageRunner(
+            f"WorkerStages_{id(self)}", self._stop_event,
+            poll_interval=STAGE_CANCEL_POLL_INTERVAL,
+            on_overrun=lambda stage, elapsed: self._emit("stage_overrun", stage, elapsed),
+            watchdog=self.watchdog,
+            # Поиск шаблона и OCR выполняются здесь: привязка из профиля нужна и этому потоку
+            cpus=performance.get_profile(PERFORMANCE_PROFILES, PERFORMANCE_PROFILE).get("worker_cpu_affinity"),
+        )
+        self.scan_area_coords = None # Координаты области сканирования
+        # Источник кадров (frame_sources.py). None - создается по FRAME_SOURCE при первом запуске
+        self.frame_source = frame_source
+        self.recorder = None # frame_recorder.FrameRecorder текущего сеанса (RECORDER_ENABLED)
+        self.last_refresh_time = 0 # Время последнего обновления списка в игре
+        self.all_targets_reached = False # Флаг, были ли достигнуты все цели
+
+        # Очередь команд постоянного потока (см. serve())
+        self._commands = collections.deque() # (команда, данные, id сеанса)
+        self._commands_cond = threading.Condition()
+        self.session_active = False # Идет сеанс поиска (run())
+        self.session_id = None # Id текущего (последнего) сеанса из post_command(CMD_START, ..., session_id)
+        self._item_deltas = collections.deque() # (вид, данные) - изменения товаров (под _commands_cond)
+
+        # Состояние режима простоя (см. IDLE_* в constants.py)
+        self._empty_frames_in_row = 0 # Сколько кадров подряд не дали ни одного совпадения
+        self._last_probe = None # Прореженная серая копия последнего обработанного кадра
+        self._last_logged_pause = WORKER_LOOP_PAUSE # Для логирования только смены паузы
+
+        # Постоянный Worker создается без товаров (список приходит с командой запуска)
+        if not items_to_search:
+            logger.info("[Worker] Worker создан без товаров, ожидание команд.")
+            return
+
+        # Загрузка шаблонов и инициализация прогресса происходит в __init__
+        # для проверки данных до запуска потока.
+        try:
+            self._load_templates()
+        except Exception:
+            # Если загрузка шаблонов не удалась, логируем и обнуляем список
+            logger.exception(
+                f"[Worker] Критическая ошибка при загрузке шаблонов:"
+            )
+            self.items_data = [] # Очищаем список товаров для поиска
+
+        # Проверка, есть ли вообще что искать после загрузки шаблонов
+        if not self.items_data:
+            logger.warning(
+                f"[Worker] Нет валидных товаров для поиска после загрузки шаблонов."
+            )
+        else:
+             logger.info(f"[Worker] Worker инициализирован с {len(self.items_data)} товарами.")
+
+    # --- Постоянный поток: очередь команд ---
+
+    def post_command(self, command: str, payload=None, session_id=None):
+        """
+        Ставит команду в очередь постоянного потока. Потокобезопасно.
+        session_id (для CMD_START) возвращается в событии finished этого сеанса:
+        по нему вызывающий отличает конец старого сеанса от конца нового.
+        """
+        with self._commands_cond:
+            self._commands.append((command, payload, session_id))
+            self._commands_cond.notify()
+
+    def request_stop(self) -> bool:
+        """
+        Останавливает текущий сеанс поиска и отменяет еще не начатые запуски.
+        Потокобезопасно, не ждет очереди событий Qt.
+        Возвращает True, если сеанс идет и будет завершен сигналом finished.
+        """
+        with self._commands_cond:
+            pending = [cmd for cmd in self._commands if cmd[0] != self.CMD_START]
+            dropped = len(self._commands) - len(pending)
+            self._commands = collections.deque(pending)
+            self._stop_event.set()
+            active = self.session_active
+        if dropped:
+            logger.info(f"[{threading.current_thread().name}] Отменено ожидающих запусков поиска: {dropped}.")
+        return active
+
+    def set_items(self, items_to_search: list):
+        """Заменяет список товаров и перезагружает шаблоны (из кэша - мгновенно)."""
+        self.items_data = [item.copy() for item in items_to_search]
+        # Калибровка могла измениться (например, удален товар) - перечитываем
+        self.calibration.load()
+        try:
+            self._load_templates()
+        except Exception:
+            logger.exception(f"[Worker] Критическая ошибка при загрузке шаблонов:")
+            self.items_data = []
+
+    def post_item_delta(self, kind: str, data):
+        """
+        Передает изменение одного товара: DELTA_UPSERT (data - словарь товара)
+        или DELTA_REMOVE (data - имя товара). Потокобезопасно.
+        Изменение применяется потоком Worker'а в начале следующего кадра.
+        """
+        with self._commands_cond:
+            self._item_deltas.append((kind, data.copy() if isinstance(data, dict) else data))
+
+    def _apply_pending_item_deltas(self):
+        """Применяет накопленные изменения товаров (вызывается в потоке Worker'а)."""
+        with self._commands_cond:
+            if not self._item_deltas:
+                return
+            deltas = list(self._item_deltas)
+            self._item_deltas.clear()
+
+        schedule_changed = False
+        for kind, data in deltas:
+            try:
+                if kind == self.DELTA_REMOVE:
+                    schedule_changed |= self._unload_item(data)
+                elif kind == self.DELTA_UPSERT:
+                    schedule_changed |= self._upsert_item(data)
+                else:
+                    logger.warning(f"[{self.worker_id}] Неизвестное изменение товара: {kind}")
+            except Exception:
+                logger.exception(f"[{self.worker_id}] Ошибка применения изменения товара ({kind}):")
+        if schedule_changed:
+            self._build_item_schedule()
+
+    def _upsert_item(self, item_data: dict) -> bool:
+        """
+        Обновляет параметры загруженного товара (прогресс покупок сохраняется)
+        или загружает шаблон нового включенного товара.
+        Возвращает True, если нужно перестроить расписание проверки.
+        """
+        name = item_data.get("name")
+        current = next((item for item in self.items_data if item.get("name") == name), None)
+
+        if current is None:
+            if not item_data.get("enabled", False):
+                return False # Выключенный товар не загружаем, пока его не включат
+            if not self._load_item_template(item_data):
+                return False
+            self.items_data.append(item_data)
+            if self.template_cache is not None:
+                self.template_cache.flush()
+            logger.info(f"[{self.worker_id}] Товар '{name}' добавлен в поиск без перезапуска.")
+            return True
+
+        changes = {
+            key: item_data[key] for key in self.LIVE_ITEM_FIELDS
+            if key in item_data and current.get(key) != item_data[key]
+        }
+        if not changes:
+            return False
+        current.update(changes)
+        progress = self.item_progress.get(name)
+        if "quantity" in changes and progress is not None:
+            progress["target"] = max(1, changes["quantity"])
+        logger.info(f"[{self.worker_id}] Параметры товара '{name}' обновлены без перезапуска: {changes}")
+        return "priority" in changes or "scan_every_n_frames" in changes
+
+    def _unload_item(self, name: str) -> bool:
+        """Удаляет товар из поиска. Возвращает True, если товар был загружен."""
+        before = len(self.items_data)
+        self.items_data = [item for item in self.items_data if item.get("name") != name]
+        for table in (self.templates, self.item_progress, self.item_stats,
+                      self.item_heatmaps, self.price_areas, self.item_schedule):
+            table.pop(name, None)
+        # Иначе калибровка удаленного товара вернется в файл при сохранении в конце сеанса
+        self.calibration.drop_item(name)
+        if len(self.items_data) == before:
+            return False
+        logger.info(f"[{self.worker_id}] Товар '{name}' удален из поиска без перезапуска.")
+        return True
+
+    def serve(self):
+        """
+        Цикл команд постоянного потока Worker'а. Выполняется в отдельном потоке
+        (QThread в приложении, threading.Thread в headless.py) до команды CMD_SHUTDOWN.
+        """
+        threading.current_thread().name = f"WorkerThread_{id(self)}"
+        self.worker_id = threading.current_thread().name
+        logger.info(f"[{self.worker_id}] Постоянный поток Worker'а запущен, ожидание команд.")
+        if self.watchdog is not None:
+            self.watchdog.start()
+
+        while True:
+            with self._commands_cond:
+                while not self._commands:
+                    self._commands_cond.wait()
+                command, payload, session_id = self._commands.popleft()
+                if command == self.CMD_START:
+                    # Флаг под блокировкой: request_stop() видит либо команду в очереди,
+                    # либо активный сеанс
+                    self._stop_event.clear()
+                    self.session_active = True
+                    self.session_id = session_id
+                elif command == self.CMD_UPDATE:
+                    self._stop_event.clear()
+
+            if command == self.CMD_SHUTDOWN:
+                break
+            try:
+                if command == self.CMD_START:
+                    if payload is not None:
+                        self.set_items(payload)
+                    self.run()
+                elif command == self.CMD_UPDATE:
+                    self.set_items(payload or [])
+                    logger.info(f"[{self.worker_id}] Список товаров обновлен: {len(self.items_data)} товаров.")
+                else:
+                    logger.warning(f"[{self.worker_id}] Неизвестная команда Worker'а: {command}")
+            except Exception:
+                logger.exception(f"[{self.worker_id}] Ошибка выполнения команды '{command}':")
+            finally:
+                self.session_active = False
+
+        self._close_resources()
+        logger.info(f"[{self.worker_id}] Постоянный поток Worker'а завершен.")
+        self._emit("service_stopped")
+
+    @contextlib.contextmanager
+    def _track(self, stage: str, trace_args: dict | None = None):
+        """Контекст этапа: отметка для сторожа зависаний, измерение времени и отрезок трассировки (если заданы)."""
+        start_time = time.perf_counter()
+        with self.watchdog.track(stage) if self.watchdog is not None else contextlib.nullcontext():
+            yield
+        elapsed = time.perf_counter() - start_time
+        self._metric("stage_time", stage, elapsed)
+        self._trace(stage, start_time, elapsed, trace_args)
+
+    def _run_stage(self, stage: str, func, *args, trace_args: dict | None = None, **kwargs):
+        """Этап в исполнителе с лимитом STAGE_DEADLINES[stage] (см. stages.py) и измерением времени."""
+        start_time = time.perf_counter()
+        try:
+            return self.stage_runner.run(stage, STAGE_DEADLINES[stage], func, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self._metric("stage_time", stage, elapsed)
+            self._trace(stage, start_time, elapsed, trace_args)
+
+    def _trace(self, name: str, start_time: float, elapsed: float, args: dict | None = None):
+        """Добавляет отрезок в буфер трассировки (если он задан)."""
+        if self.tracer is not None:
+            self.tracer.add(name, start_time, elapsed, args)
+
+    def _close_resources(self):
+        """Освобождает ресурсы, которые держатся между сеансами (источник кадров, исполнитель этапов, сторож)."""
+        self.stage_runner.shutdown()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self.frame_source is not None:
+            try:
+                self.frame_source.close()
+            except Exception as e:
+                logger.error(f"[{self.worker_id}] Ошибка при закрытии источника кадров: {e}")
+        # easyocr reader передается извне, его здесь не удаляем/закрываем.
+        self.ocr_reader = None # Очищаем ссылку
+
+    @property
+    def _input_enabled(self) -> bool:
+        """Выполнять ли клики: для записанных/синтетических кадров действия только имитируются."""
+        return self.frame_source is None or self.frame_source.interactive
+
+    @property
+    def _is_running(self) -> bool:
+        """
+        Проверяет, был ли запрошен останов.
+        Комбинирует проверку threading.Event и дополнительной проверки
+        (в приложении - флаг прерывания потока Qt).
+        """
+        # Проверка флага из threading.Event
+        if self._stop_event.is_set():
+            return False
+
+        if self.extra_stop_check is not None and self.extra_stop_check():
+            # Устанавливаем и наше событие для синхронизации
+            # и более быстрого выхода из блокирующих sleep
+            self._stop_event.set()
+            return False
+
+        return True # Если ни один флаг не установлен, значит поток должен работать
+
+    def _metric(self, name: str, *args):
+        """Передает измерение обработчику on_metric (если он задан)."""
+        if self.on_metric is None:
+            return
+        try:
+            self.on_metric(name, *args)
+        except Exception:
+            logger.exception(f"[{self.worker_id}] Ошибка обработчика измерения '{name}':")
+
+    def _emit(self, event: str, *args):
+        """Передает событие движка обработчику on_event (если он задан)."""
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event, *args)
+        except Exception:
+            logger.exception(f"[{self.worker_id}] Ошибка обработчика события '{event}':")
+
+    def _load_templates(self):
+        """
+        Загружает шаблоны OpenCV из файлов и инициализирует item_progress.
+        Вызывается в __init__ Worker'а.
+        """
+        logger.info(f"[Worker] Загрузка шаблонов...")
+        load_start_time = time.perf_counter()
+        valid_items_temp = [] # Временный список для валидных товаров
+        self.templates.clear() # Очищаем предыдущие шаблоны
+        self.item_progress.clear() # Очищаем предыдущий прогресс
+        self.item_stats.clear() # Очищаем статистику совпадений
+        self.item_heatmaps.clear()
+        self.price_areas.clear()
+
+        for item_data in self.items_data:
+            # Проверка остановки во время загрузки шаблонов (хотя обычно быстро)
+            if not self._is_running:
+                logger.warning("[Worker] Загрузка шаблонов прервана.")
+                break # Прерываем цикл, если запрошена остановка
+            if self._load_item_template(item_data):
+                # Добавляем товар во временный список валидных
+                valid_items_temp.append(item_data)
+
+        # Обновляем основной список товаров Worker'а только валидными товарами
+        self.items_data = valid_items_temp
+        num_valid = len(self.items_data)
+        self._build_item_schedule()
+
+        if self.template_cache is not None:
+            self.template_cache.flush()
+            logger.info(
+                f"[Worker] Шаблоны загружены за {(time.perf_counter() - load_start_time) * 1000:.1f} мс "
+                f"(кэш: {self.template_cache.stats})."
+            )
+
+        if num_valid > 0:
+            logger.info(
+                f"[Worker] Загрузка шаблонов завершена. Обрабатывается {num_valid} валидных товаров."
+            )
+        else:
+            logger.warning(
+                f"[Worker] Загрузка шаблонов завершена. Не найдено ни одного "
+                f"валидного шаблона для поиска."
+            )
+
+    def _load_item_template(self, item_data: dict) -> bool:
+        """
+        Загружает шаблон одного товара и инициализирует его прогресс,
+        статистику и калибровку. Возвращает True, если товар можно искать.
+        """
+
+        item_name = item_data.get("name")
+        template_path = item_data.get("template_path")
+        target_qty = item_data.get("quantity", DEFAULT_ITEM_QUANTITY) # Целевое количество
+
+        # Базовая проверка данных
+        if not item_name or not isinstance(item_name, str):
+            logger.warning(f"[Worker] Пропущен товар с некорректным именем: {item_name}")
+            return False
+        if item_name in self.templates:
+            logger.warning(f"[Worker] Пропущен дубликат товара в списке: '{item_name}'")
+            return False
+        if not template_path or not isinstance(template_path, str):
+             logger.warning(f"[Worker] Пропущен товар '{item_name}': отсутствует путь к шаблону.")
+             return False
+        if not os.path.isabs(template_path):
+             # Конвертируем относительный путь в абсолютный, если необходимо
+             # (Хотя логика сохранения в BotLogic должна сохранять абсолютные)
+             abs_path = os.path.abspath(os.path.join(BASE_DIR, template_path))
+             logger.warning(f"[Worker] Конвертация относительного пути для '{item_name}': {template_path} -> {abs_path}")
+             template_path = abs_path
+
+        if not os.path.exists(template_path):
+            logger.error(
+                f"[Worker] Шаблон НЕ НАЙДЕН для '{item_name}' "
+                f"по пути '{template_path}'. Пропуск."
+            )
+            return False # Пропускаем этот товар
+
+        try:
+            # Загружаем изображение шаблона в оттенках серого (из кэша, если он есть)
+            template_stddev = None
+            if self.template_cache is not None:
+                cached = self.template_cache.get(template_path)
+                template_img = cached["gray"] if cached is not None else None
+                template_stddev = cached["std"] if cached is not None else None
+            else:
+                template_img = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+            if template_img is None:
+                raise ValueError(
+                    f"OpenCV не смог загрузить изображение из: {template_path}"
+                )
+            if template_stddev is None:
+                # Без кэша шаблонов статистика яркости не посчитана заранее
+                template_stddev = float(cv2.meanStdDev(template_img)[1][0][0])
+
+            # Проверяем размер шаблона (должен быть больше 3x3 пикселей)
+            h, w = template_img.shape[:2]
+            if w < 3 or h < 3:
+                logger.warning(
+                    f"[Worker] Шаблон '{item_name}' слишком мал "
+                    f"({w}x{h}px). Пропуск."
+                )
+                return False # Пропускаем слишком маленькие шаблоны
+
+            if template_stddev is not None and template_stddev < TEMPLATE_MIN_STDDEV:
+                logger.warning(
+                    f"[Worker] Шаблон '{item_name}' однотонный "
+                    f"(стандартное отклонение {template_stddev:.2f}). Пропуск."
+                )
+                return False # Однотонный шаблон совпадает с чем угодно
+
+            # Если все проверки пройдены, добавляем шаблон и инициализируем прогресс
+            self.templates[item_name] = template_img
+            self.item_progress[item_name] = {
+                "bought": 0, # Сбрасываем счетчик при каждом запуске Worker'а
+                "target": max(1, target_qty), # Цель должна быть минимум 1
+            }
+            self.item_stats[item_name] = {
+                "scans": 0, # Сколько раз шаблон проверялся
+                "hits": 0, # Сколько раз шаблон найден
+                "hit_rate": 0.0, # Скользящее среднее частоты совпадений
+                "mean_y": None, # Скользящее среднее Y найденного шаблона (в области сканирования)
+            }
+            if SEARCH_REGION_LEARNING_ENABLED:
+                self.item_heatmaps[item_name] = self.calibration.heatmap(item_name, SEARCH_REGION_CELL_SIZE)
+            if PRICE_AREA_AUTO_CALIBRATION:
+                self.price_areas[item_name] = self.calibration.price_area(item_name, w, h)
+            return True
+
+        except Exception:
+            # Логируем любую другую ошибку при загрузке конкретного шаблона
+            logger.exception(
+                f"[Worker] Ошибка при загрузке и проверке шаблона "
+                f"'{item_name}' по пути '{template_path}':"
+            )
+            return False # Пропускаем этот товар
+
+    def _build_item_schedule(self):
+        """
+        Строит расписание проверки товаров по приоритету и частоте.
+        Товары с одинаковой частотой получают разные фазы, поэтому
+        редко проверяемые шаблоны распределяются по кадрам равномерно.
+        """
+        self.item_schedule.clear()
+        priority_order = list(ITEM_PRIORITY_LABELS) # Порядок ключей = порядок убывания приоритета
+        next_phase_by_cadence = {} # частота -> следующая свободная фаза
+
+        for item_data in self.items_data:
+            name = item_data.get("name")
+            priority, every_n = get_item_scan_cadence(item_data)
+            phase = next_phase_by_cadence.get(every_n, 0)
+            next_phase_by_cadence[every_n] = (phase + 1) % every_n
+            rank = priority_order.index(priority) if priority in priority_order else len(priority_order)
+            self.item_schedule[name] = {"rank": rank, "every": every_n, "phase": phase}
+            if every_n > 1:
+                logger.info(f"[Worker] Товар '{name}': приоритет '{priority}', проверка каждый {every_n}-й кадр (фаза {phase}).")
+
+    def _item_order_key(self, item_data: dict) -> tuple:
+        """
+        Ключ сортировки товаров в кадре: приоритет, затем частота совпадений
+        (чаще находимые - раньше), затем средняя позиция (выше в списке - раньше).
+        """
+        name = item_data["name"]
+        rank = self.item_schedule.get(name, {}).get("rank", 0)
+        stats = self.item_stats.get(name)
+        if not stats:
+            return (rank, 0.0, float("inf"))
+        mean_y = stats["mean_y"] if stats["mean_y"] is not None else float("inf")
+        return (rank, -stats["hit_rate"], mean_y)
+
+    def _record_match_stat(self, name: str, found: bool, y_in_scan: int | None = None):
+        """Обновляет статистику совпадений товара после проверки его шаблона."""
+        stats = self.item_stats.get(name)
+        if stats is None:
+            return
+        stats["scans"] += 1
+        stats["hit_rate"] += MATCH_STATS_EMA_ALPHA * ((1.0 if found else 0.0) - stats["hit_rate"])
+        if found:
+            stats["hits"] += 1
+            if stats["mean_y"] is None:
+                stats["mean_y"] = float(y_in_scan)
+            else:
+                stats["mean_y"] += MATCH_STATS_EMA_ALPHA * (y_in_scan - stats["mean_y"])
+
+    def _get_learned_search_region(
+        self, name: str, tmpl_w: int, tmpl_h: int, scan_w: int, scan_h: int
+    ) -> tuple[int, int, int, int] | None:
+        """
+        Возвращает обученную область поиска товара (x0, y0, x1, y1) в координатах
+        области сканирования или None, если нужно искать по всей области
+        (мало данных, плановая "разведка" или область почти не меньше полной).
+        """
+        heatmap = self.item_heatmaps.get(name)
+        if heatmap is None or heatmap.total < SEARCH_REGION_MIN_HITS:
+            return None
+        stats = self.item_stats.get(name)
+        if stats and stats["scans"] % SEARCH_REGION_EXPLORE_EVERY_N_SCANS == 0:
+            return None # Периодический поиск по всей области, чтобы область могла расшириться
+
+        region = heatmap.region(tmpl_w, tmpl_h, SEARCH_REGION_MARGIN)
+        if region is None:
+            return None
+        left, top, right, bottom = region
+        x0 = max(0, left - self.scan_area_coords["left"])
+        y0 = max(0, top - self.scan_area_coords["top"])
+        x1 = min(scan_w, right - self.scan_area_coords["left"])
+        y1 = min(scan_h, bottom - self.scan_area_coords["top"])
+        if x1 - x0 < tmpl_w or y1 - y0 < tmpl_h:
+            return None # Область вне текущей области сканирования или меньше шаблона
+        if (x1 - x0) * (y1 - y0) >= 0.9 * scan_w * scan_h:
+            return None # Выигрыша почти нет
+        return x0, y0, x1, y1
+
+    def _is_item_scheduled(self, name: str) -> bool:
+        """Проверяет, нужно ли проверять шаблон товара в текущем кадре."""
+        schedule = self.item_schedule.get(name)
+        if schedule is None:
+            return True
+        return (self._frame_index + schedule["phase"]) % schedule["every"] == 0
+
+    def _get_screen_area_for_scan(self) -> bool:
+        """
+        Определяет координаты области экрана для сканирования.
+        Приоритет: SCAN_AREA из констант, затем основной монитор MSS.
+        Возвращает True, если область успешно определена, False иначе.
+        """
+        logger.info(f"[Worker] Определение области сканирования...")
+        coords_ok = False
+        required_keys = ["left", "top", "width", "height"] # Ключи, необходимые для dict области
+
+        # Убедимся, что источник кадров создан
+        if self.frame_source is None:
+            logger.error(f"[Worker] Источник кадров не инициализирован!")
+            return False
+
+        # 1. Проверка SCAN_AREA из constants.py
+        if (
+            SCAN_AREA
+            and isinstance(SCAN_AREA, dict)
+            and all(k in SCAN_AREA for k in required_keys)
+        ):
+            try:
+                sa = SCAN_AREA
+                # Проверяем, что все значения - int и размеры положительные
+                is_valid = (
+                    all(isinstance(sa.get(k), int) for k in required_keys)
+                    and sa.get("width", 0) > 0
+                    and sa.get("height", 0) > 0
+                )
+                if is_valid:
+                    # Получаем размеры всего виртуального экрана для проверки границ
+                    # Используем geometry монитора 0 в MSS, которая представляет весь виртуальный рабочий стол
+                    monitors = self.frame_source.monitors
+                    if len(monitors) > 0:
+                         virtual_screen = monitors[0] # Индекс 0 - это весь виртуальный экран
+                         w_scr, h_scr = virtual_screen["width"], virtual_screen["height"]
+                         # Проверяем, что область не выходит за границы виртуального экрана
+                         is_within_bounds = (
+                             sa["left"] >= virtual_screen["left"]
+                             and sa["top"] >= virtual_screen["top"]
+                             and sa["left"] + sa["width"] <= virtual_screen["left"] + w_scr
+                             and sa["top"] + sa["height"] <= virtual_screen["top"] + h_scr
+                         )
+
+                         if is_within_bounds:
+                            self.scan_area_coords = sa.copy()
+                            coords_ok = True
+                            logger.info(
+                                f"[Worker] Используется SCAN_AREA из констант: "
+                                f"{self.scan_area_coords}"
+                            )
+                         else:
+                            logger.error(
+                                f"[Worker] SCAN_AREA {sa} выходит за границы виртуального экрана ({virtual_screen}). Игнорируется."
+                            )
+                    else:
+                         logger.error("[Worker] Источник кадров не вернул ни одного монитора, невозможно проверить SCAN_AREA.")
+
+
+                else:
+                    logger.error(
+                        f"[Worker] SCAN_AREA невалидна (не int или нулевые размеры): {sa}. Игнорируется."
+                    )
+            except Exception:
+                logger.exception(
+                    f"[Worker] Ошибка валидации или получения размеров виртуального экрана для SCAN_AREA:"
+                )
+
+        # 2. Если SCAN_AREA невалидна или не задана, используем основной монитор MSS
+        if not coords_ok:
+            try:
+                monitors = self.frame_source.monitors # monitors[0] - виртуальный десктоп, monitors[1+] - физ.мониторы
+                if len(monitors) > 1:
+                    # MSS часто имеет монитор 1 как основной физический
+                    info = monitors[1]
+                    logger.info(
+                        f"[Worker] SCAN_AREA не задана/невалидна. Используется основной физический монитор: {info}"
+                    )
+                elif len(monitors) == 1:
+                    # Если только один монитор, он может быть как monitors[0] (виртуальный == физический)
+                    # или как monitors[1] с monitors[0] как псевдо-виртуальным
+                    # Проверим monitors[0] как возможный единственный физический
+                    info = monitors[0]
+                    logger.info(
+                        f"[Worker] SCAN_AREA не задана/невалидна. Используется единственный монитор (monitors[0]): {info}"
+                    )
+                else:
+                    logger.error(
+                        f"[Worker] Источник кадров не вернул мониторов! Невозможно определить область сканирования."
+                    )
+                    return False # Не удалось определить область
+
+                # Удаляем ненужные ключи типа 'scale', 'retina'
+                info.pop("scale", None)
+                info.pop("retina", None)
+                self.scan_area_coords = info.copy()
+                coords_ok = True
+                logger.info(f"[Worker] Область сканирования определена как: {self.scan_area_coords}")
+
+            except Exception:
+                logger.exception(f"[Worker] КРИТИЧЕСКАЯ ошибка при попытке получить информацию о мониторах из MSS:")
+                coords_ok = False # Снова ошибка
+
+        if not coords_ok:
+            logger.error(
+                f"[Worker] Не удалось определить область сканирования!"
+                f" Проверьте SCAN_AREA в constants.py или настройки мониторов."
+            )
+        return coords_ok
+
+    def _prepare_scan_area_calibration(self):
+        """
+        Если включена автокалибровка SCAN_AREA: применяет сохраненную суженную
+        область для текущей области сканирования или начинает калибровку.
+        """
+        self.scan_area_calibrator = None
+        if not SCAN_AREA_AUTO_CALIBRATION or self.scan_area_coords is None:
+            return
+
+        base_area = {k: self.scan_area_coords[k] for k in ("left", "top", "width", "height")}
+        stored_area = self.calibration.get_scan_area(base_area)
+        if stored_area is not None:
+            self.scan_area_coords = stored_area
+            logger.info(f"[{self.worker_id}] Используется откалиброванная область сканирования: {stored_area} (исходная {base_area}).")
+            return
+
+        self.scan_area_calibrator = ScanAreaCalibrator(
+            base_area, SCAN_AREA_CALIBRATION_REFRESH_CYCLES, SCAN_AREA_CALIBRATION_MARGIN
+        )
+        logger.info(
+            f"[{self.worker_id}] Автокалибровка области сканирования: наблюдение "
+            f"{SCAN_AREA_CALIBRATION_REFRESH_CYCLES} циклов обновления списка."
+        )
+
+    def _finish_scan_area_calibration(self):
+        """Применяет результат автокалибровки SCAN_AREA и сохраняет его."""
+        calibrator = self.scan_area_calibrator
+        self.scan_area_calibrator = None
+        new_area = calibrator.result()
+        if new_area is None:
+            logger.warning(f"[{self.worker_id}] Автокалибровка области сканирования: недостаточно данных или сужать нечего. Используется исходная область.")
+            return
+
+        base_area = calibrator.base_area
+        ratio = (new_area["width"] * new_area["height"]) / (base_area["width"] * base_area["height"])
+        logger.info(
+            f"[{self.worker_id}] Автокалибровка завершена. Область сканирования сужена до {new_area} "
+            f"({ratio:.0%} от исходной {base_area})."
+        )
+        self.scan_area_coords = new_area
+        self._last_probe = None # Размер кадра изменился - эталон пробы больше не годится
+        self.calibration.set_scan_area(base_area, new_area)
+        self.calibration.save()
+
+    def run(self):
+        """
+        Основной цикл работы Worker'а.
+        Захват экрана, поиск шаблонов, проверка цен, выполнение действий.
+        Выполняется в потоке движка (см. serve()).
+        """
+        self.worker_id = threading.current_thread().name
+
+        # Привязка потока Worker'а к ядрам CPU из профиля производительности
+        perf_profile = performance.get_profile(PERFORMANCE_PROFILES, PERFORMANCE_PROFILE)
+        worker_cpus = perf_profile.get("worker_cpu_affinity")
+        if worker_cpus and performance.apply_thread_affinity(worker_cpus):
+            logger.info(f"[{self.worker_id}] Поток Worker'а привязан к ядрам CPU: {worker_cpus}.")
+        logger.info(
+            f"[{self.worker_id}] Профиль производительности '{PERFORMANCE_PROFILE}': "
+            f"{performance.describe_effective(sys.modules.get('torch'), cv2)}"
+        )
+
+        # Флаг остановки сбрасывается в serve() при получении команды запуска:
+        # остановка, запрошенная во время загрузки шаблонов, не должна теряться
+        self.all_targets_reached = False # Сбрасываем флаг достижения цели
+        self._first_scan_reported = False # Время до первого скана замеряется в каждом сеансе
+        logger.info(f"[{self.worker_id}] >>> Worker запущен. Начало основного цикла поиска.")
+
+        # Проверка наличия товаров для поиска
+        if not self.items_data:
+            logger.warning(f"[{self.worker_id}] Нет товаров для поиска. Завершение Worker.")
+            self._emit("finished", False, self.session_id) # Завершаем без достижения цели
+            return
+
+        # Инициализация источника кадров (один раз: экземпляр сохраняется между сеансами)
+        try:
+            if not self._is_running:
+                raise SystemExit("Остановка до инициализации источника кадров")
+            if self.frame_source is None:
+                self.frame_source = create_frame_source(
+                    FRAME_SOURCE, self.items_data,
+                    replay_path=os.path.join(BASE_DIR, FRAME_REPLAY_PATH), replay_speed=FRAME_REPLAY_SPEED,
+                    replay_loop=FRAME_REPLAY_LOOP, synthetic_size=FRAME_SYNTHETIC_SIZE, synthetic_seed=FRAME_SYNTHETIC_SEED,
+                )
+            self.frame_source.open()
+            logger.info(f"[{self.worker_id}] Источник кадров '{self.frame_source.name}' готов.")
+            if not self.frame_source.interactive:
+                logger.warning(f"[{self.worker_id}] Источник кадров '{self.frame_source.name}': действия только имитируются (без кликов).")
+            if not self._is_running:
+                raise SystemExit("Остановка после инициализации источника кадров")
+        except Exception:
+            logger.exception(f"[{self.worker_id}] КРИТИЧЕСКАЯ ошибка инициализации источника кадров:")
+            self._emit("error", "Ошибка инициализации захвата экрана.")
+            self._emit("finished", False, self.session_id) # Завершаем с ошибкой
+            return
+
+        # Определение области сканирования
+        if not self._get_screen_area_for_scan():
+            logger.error(f"[{self.worker_id}] Не удалось определить область сканирования. Завершение Worker.")
+            self._emit("error", "Не удалось определить область сканирования.")
+            self._emit("finished", False, self.session_id) # Завершаем с ошибкой
+            return
+
+        # Суженная область сканирования из калибровки или запуск автокалибровки
+        self._prepare_scan_area_calibration()
+
+        # Инициализация времени последнего обновления
+        self.last_refresh_time = time.monotonic()
+        # Сброс состояния режима простоя
+        self._empty_frames_in_row = 0
+        self._last_probe = None
+        self._last_logged_pause = WORKER_LOOP_PAUSE
+        # Запись кадров сеанса (воспроизводимую запись повторно не пишем)
+        if RECORDER_ENABLED and self.frame_source.name != SOURCE_REPLAY:
+            self._start_recorder()
+        logger.info(f"[{self.worker_id}] Основной цикл поиска запущен.")
+        self._metric("worker_state", "running")
+
+        try:
+            # --- ОСНОВНОЙ ЦИКЛ ПОИСКА ---
+            while self._is_running:
+                # Очень частая проверка флага остановки в начале каждой итерации
+                if not self._is_running:
+                    break
+
+                action_taken_this_loop = False # Флаг, было ли выполнено действие в этой итерации
+                match_found_this_loop = False # Флаг, был ли найден хотя бы один шаблон в этой итерации
+                items_processed_this_loop = set() # Множество имен товаров, которые уже обработали в этом скане
+
+                try:
+                    # Изменения товаров из интерфейса применяются между кадрами
+                    self._apply_pending_item_deltas()
+
+                    # --- 1. Захват экрана ---
+                    if not self._is_running:
+                        break
+                    # Время обработки кадра (измерение "frame") и начало отсчета захват -> клик
+                    frame_start_time = self._frame_start_time = time.perf_counter()
+                    # Убедимся, что источник кадров не None перед использованием
+                    if self.frame_source is None or self.scan_area_coords is None:
+                         logger.error(f"[{self.worker_id}] Ресурсы захвата экрана недоступны в цикле.")
+                         self._metric("frame_skipped", "no_area")
+                         if not self._sleep_interruptible(1.0):
+                             break # Пауза перед повторной попыткой
+                         continue # Пропускаем текущую итерацию
+                    try:
+                        with self._track("grab"):
+                            img_bgra = self.frame_source.grab(self.scan_area_coords)
+                        if not self._is_running:
+                            break
+                    except FrameSourceExhausted as e:
+                        logger.info(f"[{self.worker_id}] {e} Завершение сеанса.")
+                        break
+                    except FrameSourceError as e:
+                        logger.warning(f"[{self.worker_id}] Ошибка захвата экрана: {e}. Пауза 1с.")
+                        self._metric("frame_skipped", "capture_error")
+                        if not self._sleep_interruptible(1.0):
+                            break
+                        continue # Пропускаем текущую итерацию при ошибке захвата
+                    except Exception as e:
+                        logger.exception(f"[{self.worker_id}] Неожиданная ошибка при захвате экрана:")
+                        self._metric("frame_skipped", "capture_error")
+                        if not self._sleep_interruptible(1.0):
+                            break
+                        continue
+
+                    if self.recorder is not None:
+                        self.recorder.add(img_bgra, self.scan_area_coords)
+
+                    # Проверка на пустой кадр
+                    if img_bgra.size == 0:
+                        logger.warning(f"[{self.worker_id}] Захвачен пустой кадр ({self.scan_area_coords}). Пауза 0.5с.")
+                        self._metric("frame_skipped", "empty")
+                        if not self._sleep_interruptible(0.5):
+                            break
+                        continue # Пропускаем текущую итерацию
+
+                    # Конвертация для OpenCV и OCR
+                    with self._track("convert"):
+                        gray = cv2.cvtColor(img_bgra, cv2.COLOR_BGRA2GRAY)
+                        bgr = cv2.cvtColor(img_bgra, cv2.COLOR_BGRA2BGR) # BGR для сохранения ROI
+                    # Прореженная копия кадра - эталон для пробы в режиме простоя
+                    probe = gray[::IDLE_PROBE_STEP, ::IDLE_PROBE_STEP].copy()
+                    if (
+                        self.scan_area_calibrator is not None
+                        and self._last_probe is not None
+                        and self._last_probe.shape == probe.shape
+                    ):
+                        # Автокалибровка SCAN_AREA: запоминаем, где менялось изображение
+                        changed = cv2.absdiff(probe, self._last_probe) > IDLE_PROBE_PIXEL_DELTA
+                        self.scan_area_calibrator.add_change_mask(changed, IDLE_PROBE_STEP)
+                    self._last_probe = probe
+
+                    # --- 2. Итерация по активным товарам ---
+                    # Фильтруем только те товары, которые включены и еще не достигли цели
+                    active_items = [
+                        item for item in self.items_data
+                        if item.get("name") in self.item_progress # Проверка наличия в прогрессе
+                        and item.get("enabled", False) # Проверка, что товар включен
+                        and self.item_progress[item["name"]]["bought"]
+                        < self.item_progress[item["name"]]["target"] # Проверка, что цель не достигнута
+                    ]
+
+                    if not active_items and self.item_progress:
+                         # Если нет активных товаров, но есть товары в списке, возможно,
+                         # все цели достигнуты или все отключены.
+                         # Проверим, все ли цели достигнуты.
+                         all_done_check = all(
+                             p["bought"] >= p["target"]
+                             for p in self.item_progress.values()
+                         )
+                         if all_done_check and self.item_progress:
+                              logger.info(f"[{self.worker_id}] Все цели достигнуты. Завершение Worker.")
+                              self.all_targets_reached = True
+                              self.stop()
+                              break # Устанавливаем флаг и останавливаем
+
+                         # Если не все цели достигнуты (значит, часть отключена или нет шаблона),
+                         # просто продолжаем цикл (возможно, пользователь включит товар позже)
+                         # Если нет активных, просто ждем следующей итерации или обновления
+
+                    # Товары проверяются по расписанию (см. ITEM_PRIORITY_SCAN_EVERY_N_FRAMES):
+                    # в этом кадре - только те, чья очередь пришла, от высокого приоритета к низкому,
+                    # а внутри приоритета - сначала те, что чаще находятся
+                    scheduled_items = [
+                        item for item in active_items
+                        if self._is_item_scheduled(item["name"])
+                    ]
+                    scheduled_items.sort(key=self._item_order_key)
+                    pass_cut_short = False # Проход прерван действием: кадр устарел
+
+                    for item_data in scheduled_items:
+                        if not self._is_running:
+                            break # Проверка остановки перед обработкой каждого товара
+
+                        name = item_data.get("name")
+                        tmpl = self.templates.get(name) # Получаем шаблон из загруженных
+                        target_price = item_data.get("max_price", DEFAULT_ITEM_MAX_PRICE) # Макс. цена из данных
+                        current_progress = self.item_progress.get(name) # Прогресс по этому товару
+
+                        # Проверки на корректность данных товара и шаблона
+                        if tmpl is None or current_progress is None or name in items_processed_this_loop:
+                            continue # Пропускаем, если нет шаблона/прогресса или уже обработали в этом скане
+
+                        h, w = tmpl.shape[:2]
+                        if w == 0 or h == 0:
+                            logger.warning(f"[{self.worker_id}] Шаблон '{name}' имеет нулевые размеры. Пропуск.")
+                            continue
+
+                        # --- 3. Поиск шаблона ---
+                        if not self._is_running:
+                            break
+                        try:
+                            # Выполняем поиск шаблона по серому изображению области сканирования
+                            # (или только по обученной области товара, если она известна)
+                            search_region = self._get_learned_search_region(
+                                name, w, h, gray.shape[1], gray.shape[0]
+                            )
+                            if search_region is not None:
+                                rx0, ry0, rx1, ry1 = search_region
+                                search_img = gray[ry0:ry1, rx0:rx1]
+                            else:
+                                rx0, ry0 = 0, 0
+                                search_img = gray
+                            # Поиск и выбор лучшего совпадения - один этап с ограничением времени
+                            _, max_val, _, max_loc = self._run_stage(
+                                "match", _match_template, search_img, tmpl, trace_args={"item": name}
+                            )
+                            # Лучшее совпадение в координатах области сканирования
+                            max_loc = (max_loc[0] + rx0, max_loc[1] + ry0)
+                            if not self._is_running:
+                                break
+
+                        except StageCancelled:
+                            break # Остановка во время поиска шаблона
+                        except StageDeadlineExceeded as e:
+                            logger.warning(f"[{self.worker_id}] {e}. Товар '{name}' пропущен в этом кадре.")
+                            continue
+                        except cv2.error as e:
+                            logger.error(f"[{self.worker_id}] Ошибка cv2.matchTemplate для '{name}': {e}")
+                            continue # Пропускаем товар при ошибке CV
+                        except Exception:
+                            logger.exception(f"[{self.worker_id}] Неожиданная ошибка при поиске шаблона для '{name}':")
+                            continue
+
+                        # --- 4. Обработка найденного совпадения ---
+                        self._record_match_stat(name, max_val >= TEMPLATE_MATCH_THRESHOLD, max_loc[1])
+                        if max_val < TEMPLATE_MATCH_THRESHOLD:
+                            self._metric("item_checked", name, float(max_val), False, None)
+                        else:
+                            # Шаблон найден с достаточной уверенностью
+                            logger.info(f"[{self.worker_id}] Шаблон '{name}' найден с уверенностью {max_val:.2f} на {max_loc}.")
+                            match_found_this_loop = True
+
+                            # Координаты верхнего левого угла НАЙДЕННОГО шаблона на СКРИНШОТЕ области сканирования
+                            template_x_in_scan = max_loc[0]
+                            template_y_in_scan = max_loc[1]
+                            template_w_in_scan = w
+                            template_h_in_scan = h
+
+
+                            # Координаты верхнего левого угла НАЙДЕННОГО шаблона на ВСЕМ ЭКРАНЕ
+                            template_x_global = self.scan_area_coords["left"] + template_x_in_scan
+                            template_y_global = self.scan_area_coords["top"] + template_y_in_scan
+
+                            # Учитываем место совпадения в тепловой карте товара
+                            heatmap = self.item_heatmaps.get(name)
+                            if heatmap is not None:
+                                heatmap.add(template_x_global, template_y_global, SEARCH_REGION_MAX_HITS)
+
+                            if self.scan_area_calibrator is not None:
+                                # Автокалибровка SCAN_AREA: название вместе с областью поиска цены
+                                rel_x, rel_y, rel_w, rel_h = PRICE_SEARCH_RELATIVE_AREA
+                                self.scan_area_calibrator.add_rect(
+                                    min(template_x_in_scan, template_x_in_scan + rel_x),
+                                    min(template_y_in_scan, template_y_in_scan + rel_y),
+                                    max(template_x_in_scan + w, template_x_in_scan + rel_x + rel_w),
+                                    max(template_y_in_scan + h, template_y_in_scan + rel_y + rel_h),
+                                )
+
+                            # Bounding box найденного шаблона в ГЛОБАЛЬНЫХ координатах
+                            template_bbox_global = {
+                                "left": template_x_global,
+                                "top": template_y_global,
+                                "width": template_w_in_scan,
+                                "height": template_h_in_scan
+                            }
+
+                            items_processed_this_loop.add(name) # Помечаем товар как обработанный в этом скане
+
+                            if not self._is_running:
+                                break
+
+                            # --- 5. Поиск и проверка цены в области ---
+                            price, price_ok = self._find_and_check_price(
+                                template_bbox_global,       # Глобальные коорд. бокса названия
+                                (template_x_in_scan, template_y_in_scan, template_w_in_scan, template_h_in_scan), # Коорд/размер бокса названия в скане
+                                item_data,                  # Данные товара
+                                bgr                         # BGR изображение области сканирования
+                            )
+                            self._metric("item_checked", name, float(max_val), True, price)
+                            if not self._is_running:
+                                break
+
+                            # --- 6. Выполнение действия ---
+                            if price_ok:
+                                logger.info(f"[{self.worker_id}] Цена {price}$ для '{name}' ({current_progress['bought']}/{current_progress['target']}) соответствует условию ({target_price if target_price > 0 else 'Любая'}$)")
+                                if not self._is_running:
+                                    break
+                                # Выполняем клик и Esc
+                                success = self._perform_item_action(
+                                    template_bbox_global, item_data, price
+                                )
+                                if not self._is_running:
+                                    break
+
+                                if success:
+                                    action_taken_this_loop = True # Флаг, что действие было выполнено
+                                    # Пауза после действия, чтобы игра успела отреагировать
+                                    if not self._sleep_interruptible(
+                                        POST_ACTION_PAUSE
+                                    ):
+                                        break # Если пауза прервана, выходим из цикла worker
+                                    # После клика+ESC экран изменился, и этот кадр устарел:
+                                    # остальные товары проверяются уже на новом кадре
+                                    pass_cut_short = True
+                                    break
+
+                            else:
+                                 if target_price > 0 and price is not None:
+                                     logger.info(f"[{self.worker_id}] Цена {price}$ для '{name}' ВЫШЕ лимита {target_price}$. Действие не выполнено.")
+                                 elif price is None:
+                                      logger.warning(f"[{self.worker_id}] Не удалось найти/распознать валидную цену для '{name}'. Действие не выполнено.")
+                                 # Действие не выполнено, продолжаем поиск или ждем следующей итерации
+
+                        # --- Конец обработки найденного совпадения для товара ---
+                        if not self._is_running:
+                            break # Еще одна проверка перед следующим товаром
+
+
+                    # --- Конец итерации по всем активным товарам ---
+                    if not self._is_running:
+                        break
+                    # Прерванный проход не сдвигает расписание: на новом кадре проверяются
+                    # те же товары, включая не дошедшие до проверки
+                    if not pass_cut_short:
+                        self._frame_index += 1
+                    frame_time = time.perf_counter() - frame_start_time
+                    self._metric("stage_time", "frame", frame_time)
+                    self._trace("frame", frame_start_time, frame_time, {"frame": self._frame_index})
+
+                    # --- 7. Проверка достижения ВСЕХ целей ---
+                    # Проверяем только если есть товары в item_progress (т.е. не пустой список)
+                    all_done = (
+                        all(
+                            p["bought"] >= p["target"]
+                            for p in self.item_progress.values()
+                        ) if self.item_progress else False
+                    )
+                    if all_done:
+                        logger.info(f"[{self.worker_id}] !!! ВСЕ ЦЕЛИ ДЛЯ АКТИВНЫХ ТОВАРОВ ДОСТИГНУТЫ !!! Остановка Worker.")
+                        self.all_targets_reached = True
+                        self.stop()
+                        break # Устанавливаем флаг и останавливаем Worker
+
+                    if not self._is_running:
+                        break # Финальная проверка перед паузой/обновлением
+
+                    if not self._first_scan_reported:
+                        self._first_scan_reported = True
+                        self._emit("first_scan_completed")
+
+                    # Учет пустых кадров для режима простоя
+                    if match_found_this_loop or action_taken_this_loop:
+                        self._empty_frames_in_row = 0
+                    else:
+                        self._empty_frames_in_row += 1
+
+                    # --- 8. Обновление списка в игре или пауза ---
+                    now = time.monotonic()
+                    # Если не было выполнено ни одного действия в этом цикле сканирования
+                    # И прошло достаточно времени с последнего обновления
+                    needs_refresh = (
+                        not action_taken_this_loop
+                        and (REFRESH_BUTTON_X is not None and REFRESH_BUTTON_Y is not None) # Только если кнопка Обновить задана
+                        and (now - self.last_refresh_time > MIN_REFRESH_INTERVAL)
+                    )
+
+                    if needs_refresh:
+                        if not self._is_running:
+                            break
+                        logger.info(f"[{self.worker_id}] Ничего не найдено/куплено за долгий период. Попытка обновить список в игре.")
+                        self._try_refresh_list() # Кликаем по кнопке Обновить
+                        if not self._is_running:
+                            break
+                        # После обновления список новый - возвращаемся к полной частоте
+                        self._empty_frames_in_row = 0
+                        if self.scan_area_calibrator is not None and self.scan_area_calibrator.on_refresh():
+                            self._finish_scan_area_calibration()
+                        # Пауза после клика "Обновить", чтобы список успел прогрузиться
+                        if not self._sleep_interruptible(REFRESH_PAUSE):
+                            break
+                    elif not action_taken_this_loop: # Пауза, только если не было действия и не было обновления
+                         # Короткая пауза для снижения нагрузки на CPU.
+                         # В режиме простоя пауза длиннее, но прерывается пробой экрана.
+                         loop_pause = self._current_loop_pause()
+                         if loop_pause > WORKER_LOOP_PAUSE:
+                             if not self._idle_pause(loop_pause):
+                                 break
+                         elif not self._sleep_interruptible(loop_pause):
+                             break
+
+
+                # --- Обработка исключений внутри цикла ---
+                # Эти исключения не должны приводить к краху всего Worker'а,
+                # только к пропуску текущей итерации цикла while.
+                except FrameSourceError as e:
+                    logger.warning(f"[{self.worker_id}] Ошибка источника кадров в цикле: {e}. Пауза 1с.")
+                    if not self._sleep_interruptible(1.0):
+                        break
+                except cv2.error as e:
+                    logger.error(f"[{self.worker_id}] OpenCV Error в цикле: {e}. Пауза 0.5с.")
+                    if not self._sleep_interruptible(0.5):
+                        break
+                except SystemExit as e:
+                    # Перехват SystemExit, если где-то в коде он вызван
+                    logger.info(f"[{self.worker_id}] Получен SystemExit: {e}. Завершение Worker.")
+                    self.stop()
+                    break # Останавливаем Worker
+                except Exception:
+                    # Ловим все остальные неожиданные ошибки в цикле
+                    logger.exception(f"[{self.worker_id}] КРИТИЧЕСКАЯ НЕОЖИДАННАЯ ошибка в основном цикле поиска:")
+                    # При критической ошибке в цикле, возможно, лучше остановиться
+                    self._emit("error", f"Критическая ошибка в цикле поиска: {sys.exc_info()[0].__name__}")
+                    self.stop()
+                    break # Останавливаем Worker
+
+            # --- Конец основного цикла while ---
+            log_status = (
+                f"Worker завершает работу. "
+                f"is_running={self._is_running}, "
+                f"all_targets_reached={self.all_targets_reached}"
+            )
+            logger.info(log_status)
+        finally:
+            # --- Очистка ресурсов Worker'а ---
+            logger.info(f"[{self.worker_id}] Начинается очистка ресурсов Worker'а...")
+            for stat_name, stats in self.item_stats.items():
+                if stats["scans"]:
+                    logger.info(
+                        f"[{self.worker_id}] Статистика '{stat_name}': проверок {stats['scans']}, "
+                        f"совпадений {stats['hits']}, частота {stats['hit_rate']:.2f}."
+                    )
+            if self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None
+            # Источник кадров и OCR Reader остаются для следующего сеанса (закрываются в _close_resources)
+
+            # Сохраняем накопленные калибровочные данные (области поиска и цены)
+            if self.item_heatmaps or self.price_areas:
+                self.calibration.save()
+
+            logger.info(f"[{self.worker_id}] Очистка ресурсов Worker'а завершена.")
+            self._metric("worker_state", "stopped")
+            logger.info(f"[{self.worker_id}] Сеанс поиска завершен. Отправка finished({self.all_targets_reached}).")
+            # Отправляем сигнал finished в основной поток
+            self._emit("finished", self.all_targets_reached, self.session_id)
+
+    def _start_recorder(self):
+        """Начинает запись кадров сеанса в RECORDER_FOLDER. Ошибка записи не мешает поиску."""
+        root = os.path.join(BASE_DIR, RECORDER_FOLDER)
+        try:
+            # Место под новую запись: хранится RECORDER_KEEP_SESSIONS записей вместе с ней
+            if RECORDER_KEEP_SESSIONS > 0:
+                frame_recorder.prune_recordings(root, RECORDER_KEEP_SESSIONS - 1)
+            self.recorder = frame_recorder.FrameRecorder(
+                os.path.join(root, time.strftime("%Y%m%d_%H%M%S")),
+                keyframe_interval=RECORDER_KEYFRAME_INTERVAL,
+                compression_level=RECORDER_COMPRESSION_LEVEL,
+                queue_size=RECORDER_QUEUE_SIZE,
+                max_bytes=RECORDER_MAX_MB * 1048576,
+            ).open()
+        except Exception:
+            logger.exception(f"[{self.worker_id}] Не удалось начать запись кадров:")
+            self.recorder = None
+
+    def _sleep_interruptible(self, duration_sec: float) -> bool:
+        """
+        Выполняет паузу, которая может быть прервана флагом остановки Worker'а.
+        Возвращает True, если пауза завершилась без прерывания, False если была прервана.
+        """
+        if not self._is_running: return False # Если уже запрошена остановка, не спим
+        if duration_sec <= 0: return True # Пауза 0 или меньше - мгновенно, не прерываема
+
+        # Ожидаем события остановки, но с таймаутом duration_sec
+        start_time = time.perf_counter()
+        interrupted = self._stop_event.wait(timeout=duration_sec)
+        self._trace("sleep", start_time, time.perf_counter() - start_time)
+
+        # interrupted == True, если событие было установлено в течение таймаута
+        # interrupted == False, если таймаут истек
+        # Возвращаем True, если пауза завершилась БЕЗ прерывания, и Worker still should be running
+        return not interrupted and self._is_running
+
+    def _current_loop_pause(self) -> float:
+        """
+        Возвращает паузу цикла с учетом режима простоя.
+        Пока пустых кадров подряд не больше IDLE_BACKOFF_AFTER_EMPTY_FRAMES,
+        используется WORKER_LOOP_PAUSE, далее пауза растет экспоненциально
+        до IDLE_MAX_LOOP_PAUSE.
+        """
+        extra_frames = self._empty_frames_in_row - IDLE_BACKOFF_AFTER_EMPTY_FRAMES
+        if not IDLE_BACKOFF_ENABLED or extra_frames <= 0:
+            pause = WORKER_LOOP_PAUSE
+        else:
+            # Ограничиваем степень, чтобы не получить переполнение на долгом простое
+            pause = min(
+                IDLE_MAX_LOOP_PAUSE,
+                WORKER_LOOP_PAUSE * IDLE_BACKOFF_FACTOR ** min(extra_frames, 32)
+            )
+            pause = max(pause, WORKER_LOOP_PAUSE)
+
+        # Логируем только изменение паузы, чтобы не засорять лог
+        if pause != self._last_logged_pause:
+            if pause > WORKER_LOOP_PAUSE:
+                logger.info(f"[{self.worker_id}] Режим простоя: {self._empty_frames_in_row} пустых кадров подряд, пауза цикла {pause:.2f}с.")
+                self._metric("worker_state", "idle")
+            else:
+                logger.info(f"[{self.worker_id}] Выход из режима простоя, пауза цикла {pause:.2f}с.")
+                self._metric("worker_state", "running")
+            self._last_logged_pause = pause
+        return pause
+
+    def _idle_pause(self, duration_sec: float) -> bool:
+        """
+        Пауза режима простоя. Каждые IDLE_PROBE_INTERVAL секунд делает дешевую
+        пробу экрана и завершается досрочно, если область сканирования изменилась.
+        Возвращает True, если Worker должен продолжать работу, False при остановке.
+        """
+        deadline = time.monotonic() + duration_sec
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._is_running
+            if not self._sleep_interruptible(min(IDLE_PROBE_INTERVAL, remaining)):
+                return False
+            if self._probe_detects_change():
+                logger.info(f"[{self.worker_id}] Проба обнаружила изменение экрана. Возврат к полной частоте сканирования.")
+                self._empty_frames_in_row = 0
+                return self._is_running
+
+    def _probe_detects_change(self) -> bool:
+        """
+        Проба изменения экрана: захватывает всю область сканирования (как обычный
+        кадр), берет каждый IDLE_PROBE_STEP-й пиксель и сравнивает с пробой последнего
+        обработанного кадра. Экономится поиск шаблонов и OCR, а не захват.
+        Возвращает True, если доля измененных пикселей превышает порог.
+        """
+        if self._last_probe is None or self.frame_source is None or self.scan_area_coords is None:
+            return True # Сравнивать не с чем - лучше выполнить полный скан
+        try:
+            img_bgra = self.frame_source.grab(self.scan_area_coords)
+            probe_bgra = np.ascontiguousarray(img_bgra[::IDLE_PROBE_STEP, ::IDLE_PROBE_STEP])
+            probe = cv2.cvtColor(probe_bgra, cv2.COLOR_BGRA2GRAY)
+        except Exception as e:
+            logger.debug(f"[{self.worker_id}] Ошибка пробы экрана: {e}")
+            return False # При ошибке пробы просто продолжаем паузу
+
+        if probe.shape != self._last_probe.shape:
+            return True
+        changed = np.count_nonzero(cv2.absdiff(probe, self._last_probe) > IDLE_PROBE_PIXEL_DELTA)
+        return changed > probe.size * IDLE_PROBE_CHANGED_FRACTION
+
+
+    def _try_refresh_list(self):
+        """
+        Пытается кликнуть по координатам кнопки 'Обновить'.
+        Проверяет флаг остановки перед выполнением действий pyautogui.
+        """
+        # Проверяем, заданы ли координаты кнопки Обновить
+        if REFRESH_BUTTON_X is None or REFRESH_BUTTON_Y is None:
+            # logger.debug(f"[{self.worker_id}] Координаты кнопки Обновить не заданы. Пропуск обновления.")
+            return # Нечего делать, если координаты не заданы
+
+        # Проверяем флаг остановки перед началом действия
+        if not self._is_running:
+            logger.info(f"[{self.worker_id}] Обновление отменено, запрошена остановка.")
+            return
+
+        try:
+            # Используем глобальную блокировку для pyautogui
+            with input_lock:
+                if not self._is_running:
+                    return # Повторная проверка после получения блокировки
+                logger.info(f"[{self.worker_id}] Клик по кнопке 'Обновить' ({REFRESH_BUTTON_X},{REFRESH_BUTTON_Y}).")
+                if self._input_enabled:
+                    with self._track("refresh"):
+                        pyautogui.click(REFRESH_BUTTON_X, REFRESH_BUTTON_Y)
+                if not self._is_running:
+                    return # Повторная проверка после клика
+
+            # Обновляем время последнего обновления только при успешном клике
+            self.last_refresh_time = time.monotonic()
+
+        except pyautogui.FailSafeException:
+             # pyautogui.FailSafeException может возникнуть, если курсор мыши
+             # перемещен в угол экрана (защита pyautogui).
+             logger.warning(f"[{self.worker_id}] pyAutoGUI FailSafe сработал при клике 'Обновить'. Пауза 1с.")
+             # При FailSafe лучше остановиться или сделать большую паузу
+             if not self._sleep_interruptible(1.0):
+                 return # Проверка остановки после паузы
+
+        except Exception:
+            logger.exception(f"[{self.worker_id}] Ошибка при клике по кнопке 'Обновить':")
+            # При ошибке клика делаем небольшую паузу
+            if not self._sleep_interruptible(0.5):
+                return
+
+
+    def _read_price_ocr(self, roi_bgr: np.ndarray) -> tuple[list, bool]:
+        """
+        OCR области цены (этап "ocr") с кэшем результатов по хэшу пикселей области.
+        Возвращает (результаты readtext detail=1, взяты ли они из кэша).
+        """
+        key = None
+        if OCR_RESULT_CACHE_SIZE > 0:
+            roi_bytes = np.ascontiguousarray(roi_bgr)
+            key = (roi_bytes.shape, hashlib.blake2b(roi_bytes.data, digest_size=16).digest())
+            cached = self.ocr_cache.get(key)
+            if cached is not None:
+                self.ocr_cache.move_to_end(key)
+                self._metric("ocr_cache_hit")
+                return cached, True
+
+        ocr_results = self._run_stage(
+            "ocr", self._readtext_locked,
+            roi_bgr,
+            allowlist=OCR_PRICE_ALLOWLIST,
+            detail=1 # Получаем детализацию
+        )
+        if key is not None:
+            self.ocr_cache[key] = ocr_results
+            while len(self.ocr_cache) > OCR_RESULT_CACHE_SIZE:
+                self.ocr_cache.popitem(last=False) # Вытесняем самую давнюю область
+        return ocr_results, False
+
+    def _readtext_locked(self, image, **kwargs) -> list:
+        """reader.readtext под ocr_lock (выполняется в потоке этапов)."""
+        with ocr_lock:
+            return self.ocr_reader.readtext(image, **kwargs)
+
+    def _find_and_check_price(
+        self,
+        item_bbox_global: dict, # Глобальные координаты bbox названия
+        template_bbox_in_scan: tuple[int, int, int, int], # Коорд/размер bbox названия в scan_area
+        item_data: dict,
+        screen_bgr_scan_area: np.ndarray, # BGR изображение области сканирования
+        use_calibrated_area: bool = True # False - OCR на полной PRICE_SEARCH_RELATIVE_AREA
+    ) -> tuple[int | None, bool]:
+        """
+        Находит и распознает цену в области рядом с названием.
+        Использует OCR с детализацией и фильтрацию блоков по положению и содержанию.
+        Если для товара откалибрована суженная область цены, OCR выполняется на ней,
+        а при неудаче или обрезанном блоке - повторно на полной области.
+        """
+        if not self._is_running: return None, False
+
+        name = item_data.get("name", "N/A")
+        target_price = item_data.get("max_price", DEFAULT_ITEM_MAX_PRICE)
+
+        price = None
+        price_ok = False
+        price_search_roi_bgr = None # Область поиска цены для OCR
+
+        # Откалиброванная (суженная) область цены, если данных уже достаточно
+        price_calibrator = self.price_areas.get(name)
+        calibrated_area = None
+        if use_calibrated_area and price_calibrator is not None:
+            calibrated_area = price_calibrator.area(
+                PRICE_SEARCH_RELATIVE_AREA, PRICE_AREA_CALIBRATION_MIN_SAMPLES, PRICE_AREA_CALIBRATION_MARGIN
+            )
+
+        try:
+            # --- 1. Определяем область поиска цены ОТНОСИТЕЛЬНО НАЙДЕННОГО названия ---
+            # Используем константу PRICE_SEARCH_RELATIVE_AREA = (X_OFFSET_REL, Y_OFFSET_REL, WIDTH, HEIGHT)
+            # или откалиброванную область в том же формате
+            rel_offset_x, rel_offset_y, search_width, search_height = calibrated_area or PRICE_SEARCH_RELATIVE_AREA
+
+            # Координаты верхнего левого угла НАЙДЕННОГО названия в scan_area
+            template_x_in_scan, template_y_in_scan, template_w_in_scan, template_h_in_scan = template_bbox_in_scan
+
+            # Координаты верхнего левого угла области поиска цены ВНУТРИ screen_bgr_scan_area
+            # Смещение относительно ВЕРХНЕ-ЛЕВОГО угла НАЙДЕННОГО НАЗВАНИЯ
+            price_search_x_in_scan = template_x_in_scan + rel_offset_x
+            price_search_y_in_scan = template_y_in_scan + rel_offset_y
+
+
+            # Размеры захваченного изображения области сканирования
+            scan_h, scan_w = screen_bgr_scan_area.shape[:2]
+
+            # Обрезаем область поиска по границам захваченной области сканирования
+            roi_left = max(0, price_search_x_in_scan)
+            roi_top = max(0, price_search_y_in_scan)
+
+            # Координаты нижнего правого угла области поиска (до обрезки)
+            price_search_right_in_scan = price_search_x_in_scan + search_width
+            price_search_bottom_in_scan = price_search_y_in_scan + search_height
+
+            roi_right = min(scan_w, price_search_right_in_scan)
+            roi_bottom = min(scan_h, price_search_bottom_in_scan)
+
+            # Проверяем валидность обрезанной области
+            if roi_right <= roi_left or roi_bottom <= roi_top:
+                logger.error(f"[{self.worker_id}] Расчетная область ПОИСКА цены для '{name}' невалидна после обрезки ({roi_left},{roi_top},{roi_right-roi_left},{roi_bottom-roi_top}).")
+                # Отладочное сохранение даже пустой области, если DEBUG_SAVE_PRICE_ROI=True
+                if DEBUG_SAVE_PRICE_ROI:
+                     try:
+                         dummy_img = np.zeros((10, 10, 3), dtype=np.uint8) # Маленькое черное изображение
+                         cv2.imwrite(ABS_DEBUG_PRICE_ROI_PATH, dummy_img)
+                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Debug ROI (пустая область) сохранен: {ABS_DEBUG_PRICE_ROI_PATH}")
+                     except Exception as e:
+                         logger.error(f"[{self.worker_id}] Не удалось сохранить debug ROI (пустая область): {e}")
+                return None, False
+
+            # Вырезаем область поиска из захваченного BGR изображения области сканирования
+            price_search_roi_bgr = screen_bgr_scan_area[roi_top:roi_bottom, roi_left:roi_right]
+
+            # Повторная проверка на пустую область после вырезки
+            if price_search_roi_bgr.size == 0:
+                logger.warning(f"[{self.worker_id}] Пустая область ПОИСКА цены вырезана для '{name}'.")
+                if DEBUG_SAVE_PRICE_ROI:
+                     try:
+                         dummy_img = np.zeros((10, 10, 3), dtype=np.uint8)
+                         cv2.imwrite(ABS_DEBUG_PRICE_ROI_PATH, dummy_img)
+                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Debug ROI (пустая вырезка) сохранен: {ABS_DEBUG_PRICE_ROI_PATH}")
+                     except Exception as e:
+                         logger.error(f"[{self.worker_id}] Не удалось сохранить debug ROI (пустая вырезка): {e}")
+                return None, False
+
+            # --- Отладка: Сохранение ОБЛАСТИ ПОИСКА цены ---
+            if DEBUG_SAVE_PRICE_ROI:
+                try:
+                    # Глобальные координаты верхнего левого угла области поиска цены
+                    price_search_x_global = self.scan_area_coords["left"] + roi_left
+                    price_search_y_global = self.scan_area_coords["top"] + roi_top
+                    logger.info(
+                        f"[{self.worker_id}] [Цена '{name}'] Debug ПОИСКОВАЯ область рассчитана: "
+                        f"Глобальные ({price_search_x_global},{price_search_y_global}), "
+                        f"Размер ({price_search_roi_bgr.shape[1]}x{price_search_roi_bgr.shape[0]})."
+                    )
+                    cv2.imwrite(ABS_DEBUG_PRICE_ROI_PATH, price_search_roi_bgr)
+                    logger.info(f"[{self.worker_id}] [Цена '{name}'] Debug ПОИСКОВАЯ область сохранена: {ABS_DEBUG_PRICE_ROI_PATH}")
+                except Exception as e:
+                    logger.error(f"[{self.worker_id}] Не удалось сохранить debug ПОИСКОВУЮ область цены в {ABS_DEBUG_PRICE_ROI_PATH}: {e}")
+
+        except Exception:
+            logger.exception(f"[{self.worker_id}] Ошибка расчета/вырезки области ПОИСКА цены для '{name}':")
+            return None, False
+
+        # --- OCR: Распознавание текста в ОБЛАСТИ ПОИСКА цены (с детализацией) ---
+        try:
+            if not self._is_running:
+                logger.info(f"[{self.worker_id}] Остановка Worker'а запрошена перед OCR области поиска цены для '{name}'.")
+                return None, False
+
+            logger.info(f"[{self.worker_id}] Запуск OCR на области ПОИСКА цены ({price_search_roi_bgr.shape[1]}x{price_search_roi_bgr.shape[0]}px, detail=1)...")
+            # detail=1 возвращает (bbox, text, confidence)
+            ocr_results_detail, ocr_from_cache = self._read_price_ocr(price_search_roi_bgr)
+            logger.info(
+                f"[{self.worker_id}] OCR области ПОИСКА завершен{' (из кэша)' if ocr_from_cache else ''}. "
+                f"Результатов: {len(ocr_results_detail)}"
+            )
+            # Логируем все найденные блоки для отладки
+            if ocr_results_detail:
+                for i, (bbox, text, confidence) in enumerate(ocr_results_detail):
+                    logger.debug(f"[{self.worker_id}]   OCR Block {i}: Text='{text}', Confidence={confidence:.2f}, Bbox={bbox}")
+
+
+            if not self._is_running: return None, False
+
+            # --- 2. Ищем блок, похожий на цену, среди результатов OCR ---
+            # (cleaned_text, confidence, bbox_in_search_roi) или None
+            best_price_candidate, rejected_blocks = select_price_candidate(
+                ocr_results_detail, (roi_left, roi_top), template_bbox_in_scan
+            )
+            if best_price_candidate:
+                logger.debug(f"[{self.worker_id}] Найден первый подходящий кандидат цены (справа): '{best_price_candidate[0]}' with confidence {best_price_candidate[1]:.2f}")
+            elif rejected_blocks:
+                logger.debug(f"[{self.worker_id}] Блоки OCR отклонены для '{name}': {rejected_blocks}")
+            # Повтор области из кэша OCR не добавляет в корпус нового образца
+            if self.price_corpus is not None and not self.price_corpus.full and not ocr_from_cache:
+                self.price_corpus.add(
+                    price_search_roi_bgr,
+                    (template_x_in_scan - roi_left, template_y_in_scan - roi_top, template_w_in_scan, template_h_in_scan),
+                    ocr_results_detail, name,
+                    int(best_price_candidate[0]) if best_price_candidate else None, rejected_blocks,
+                )
+
+            # --- 3. Если кандидат на цену найден ---
+            if best_price_candidate:
+                price_str, confidence, bbox_in_search_roi = best_price_candidate
+                logger.info(f"[{self.worker_id}] [Цена '{name}'] Выбран лучший кандидат: '{price_str}' with confidence {confidence:.2f}")
+
+                # Границы блока цены в координатах скана
+                block_xs = [int(point[0]) for point in bbox_in_search_roi]
+                block_ys = [int(point[1]) for point in bbox_in_search_roi]
+                block_left = roi_left + min(block_xs)
+                block_right = roi_left + max(block_xs)
+                block_top = roi_top + min(block_ys)
+                block_bottom = roi_top + max(block_ys)
+
+                if calibrated_area is not None and (
+                    block_left - roi_left < PRICE_AREA_EDGE_GUARD or roi_right - block_right < PRICE_AREA_EDGE_GUARD
+                ):
+                    # Цена могла быть обрезана суженной областью (например, стала длиннее)
+                    logger.info(f"[{self.worker_id}] [Цена '{name}'] Блок цены касается края суженной области. Повтор OCR на полной области.")
+                    return self._find_and_check_price(
+                        item_bbox_global, template_bbox_in_scan, item_data, screen_bgr_scan_area,
+                        use_calibrated_area=False
+                    )
+
+                if price_calibrator is not None:
+                    # Калибровка области цены: запоминаем блок относительно шаблона
+                    price_calibrator.add(
+                        block_left - template_x_in_scan, block_top - template_y_in_scan,
+                        block_right - template_x_in_scan, block_bottom - template_y_in_scan,
+                    )
+
+                try:
+                    price = int(price_str)
+                    logger.info(f"[{self.worker_id}] [Цена '{name}'] Конвертировано в int: {price}$.")
+                    price_ok = (target_price <= 0) or (price <= target_price)
+
+                    if target_price > 0:
+                         log_check = f"({price}$ <= {target_price}$)"
+                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Условие цены ({target_price}$): {log_check} -> {price_ok}")
+                    else:
+                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Условие цены (Любая): Всегда True -> {price_ok}")
+
+                    if not price_ok and target_price > 0:
+                         logger.info(f"[{self.worker_id}] Цена ВЫШЕ лимита для '{name}': {price}$ > {target_price}$.")
+
+                    return price, price_ok # Возвращаем найденную цену и результат проверки
+
+                except ValueError:
+                    logger.error(f"[{self.worker_id}] Ошибка конвертации лучшего кандидата '{price_str}' в int для '{name}'.")
+                    return None, False
+
+            elif calibrated_area is not None:
+                # Цена могла сместиться за пределы суженной области
+                logger.info(f"[{self.worker_id}] [Цена '{name}'] В суженной области цена не найдена. Повтор OCR на полной области.")
+                return self._find_and_check_price(
+                    item_bbox_global, template_bbox_in_scan, item_data, screen_bgr_scan_area,
+                    use_calibrated_area=False
+                )
+
+            else:
+                # Ни один блок не прошел проверку на кандидата цены
+                logger.warning(f"[{self.worker_id}] Не найдено блоков, похожих на цену и соответствующих положению, в области поиска для '{name}'.")
+                # Опционально можно логировать все результаты OCR здесь, если не логируются выше
+                # logger.debug(f"[{self.worker_id}] Все OCR результаты в области поиска: {ocr_results_detail}")
+                return None, False
+
+        except StageCancelled:
+            logger.info(f"[{self.worker_id}] OCR цены для '{name}' прерван остановкой.")
+            return None, False
+        except StageDeadlineExceeded as e:
+            logger.warning(f"[{self.worker_id}] {e}. Цена '{name}' не проверена в этом кадре.")
+            return None, False
+        except Exception:
+            logger.exception(f"[{self.worker_id}] Неожиданная ошибка при OCR/поиске блока цены для '{name}':")
+            return None, False
+
+
+    def _perform_item_action(
+        self,
+        item_bbox_global: dict, # Глобальные координаты bbox найденного шаблона
+        item_data: dict, # Данные товара
+        price: int # Распознанная цена
+    ) -> bool:
+        """
+        Выполняет действие: клик левой кнопкой мыши по центру найденного элемента,
+        затем нажатие клавиши Esc.
+        Обновляет прогресс товара и отправляет сигнал.
+
+        Возвращает True, если действие выполнено успешно до конца, False иначе
+        (например, если Worker остановлен во время выполнения действия).
+        """
+        if not self._is_running:
+            logger.warning(f"[{self.worker_id}] Действие для '{item_data.get('name','N/A')}' отменено, запрошена остановка.")
+            return False # Не выполняем действие, если Worker останавливается
+
+        name = item_data.get("name", "N/A")
+        prog = self.item_progress.get(name)
+
+        # Проверка, что прогресс отслеживается и цель еще не достигнута
+        if not prog or prog["bought"] >= prog["target"]:
+            logger.warning(f"[{self.worker_id}] Действие для '{name}' отменено: прогресс не отслеживается или цель уже достигнута.")
+            return False
+
+        try:
+            # Рассчитываем центр найденного bounding box'а шаблона (глобальные координаты)
+            center_x = item_bbox_global["left"] + item_bbox_global["width"] // 2
+            center_y = item_bbox_global["top"] + item_bbox_global["height"] // 2
+
+            # Опционально: Проверка, что координаты центра находятся в пределах экрана
+            # (pyautogui может работать и с координатами вне экрана, но это хорошая проверка)
+            # w_scr, h_scr = pyautogui.size() # Получение размера экрана может быть медленным
+            # if not (0 <= center_x < w_scr and 0 <= center_y < h_scr):
+            #     logger.error(f"[{self.worker_id}] Рассчитанные координаты ЦЕНТРА ({center_x},{center_y}) для '{name}' вне пределов экрана. Пропуск действия.")
+            #     return False
+
+        except Exception:
+            logger.exception(f"[{self.worker_id}] Ошибка расчета центра для действия с '{name}':")
+            return False # Ошибка при расчете координат
+
+        try:
+            # Текущее количество до действия
+            current_bought = prog["bought"]
+            # Количество после успешного действия
+            next_bought_count = current_bought + 1
+            target_qty = prog["target"]
+
+            log_msg = (
+                f"[{self.worker_id}] !!! ВЫПОЛНЯЕТСЯ ДЕЙСТВИЕ для '{name}': "
+                f"Клик ЛКМ ({center_x},{center_y}) + Нажатие ESC. "
+                f"Цена: {price}$. Прогресс: {next_bought_count}/{target_qty}"
+            )
+            logger.info(log_msg)
+
+            # --- Выполнение клика и Esc с блокировкой ---
+            # Используем input_lock, чтобы другие потоки (если появятся)
+            # не пытались использовать pyautogui одновременно.
+            with input_lock:
+                # Проверка остановки ПЕРЕД кликом
+                if not self._is_running:
+                    logger.warning(f"[{self.worker_id}] Действие (Клик) для '{name}' отменено перед pyautogui.click, запрошена остановка.")
+                    return False
+
+                # Выполняем клик
+                # TODO: Проверить, может ли pyautogui.click быть прерван? Скорее всего, нет.
+                if self._input_enabled:
+                    with self._track("action", {"item": name, "input": "click"}):
+                        pyautogui.click(center_x, center_y)
+                if self._frame_start_time is not None:
+                    self._metric("action_latency", time.perf_counter() - self._frame_start_time)
+
+                # Проверка остановки ПОСЛЕ клика, ПЕРЕД Esc
+                if not self._is_running:
+                    logger.warning(f"[{self.worker_id}] Действие (Esc) для '{name}' отменено перед pyautogui.press('esc'), запрошена остановка.")
+                    return False
+
+                # Короткая пауза между кликом и Esc может быть полезна
+                # time.sleep(0.05)
+                # Проверка остановки ПОСЛЕ короткой паузы (если она есть)
+                if not self._is_running:
+                    logger.warning(f"[{self.worker_id}] Действие (Esc) для '{name}' отменено после паузы, запрошена остановка.")
+                    return False
+
+                # Выполняем нажатие Esc
+                # TODO: Проверить, может ли pyautogui.press быть прерван? Скорее всего, нет.
+                if self._input_enabled:
+                    with self._track("action", {"item": name, "input": "esc"}):
+                        pyautogui.press("esc")
+
+                # Проверка остановки ПОСЛЕ Esc
+                if not self._is_running:
+                    logger.warning(f"[{self.worker_id}] Действие для '{name}' прервано после pyautogui.press('esc'), запрошена остановка.")
+                    return False
+
+            # Если мы дошли до этого места, значит клик и Esc были успешно вызваны (не обязательно выполнены игрой!)
+            # Обновляем счетчик купленного в прогрессе Worker'а
+            prog["bought"] = next_bought_count
+            logger.info(f"[{self.worker_id}] Прогресс для '{name}' обновлен: {prog['bought']}/{prog['target']}")
+
+            # Отправляем сигнал в основной поток об успешном действии
+            # Этот сигнал будет обработан в MainThread для обновления UI и звукового оповещения
+            self._emit("action_performed", name, price, prog["bought"])
+            logger.info(f"[{self.worker_id}] Сигнал action_performed_signal({name}, {price}, {prog['bought']}) отправлен.")
+
+            return True # Действие успешно инициировано и прогресс обновлен
+
+        except pyautogui.FailSafeException:
+             logger.warning(f"[{self.worker_id}] pyAutoGUI FailSafe сработал при выполнении действия для '{name}'. Пауза 1с.")
+             # При FailSafe лучше остановиться или сделать большую паузу
+             if not self._sleep_interruptible(1.0):
+                 return False # Проверка остановки после паузы
+             return False # Действие не было завершено корректно
+
+        except Exception:
+            # Логируем любую другую ошибку при выполнении действий pyautogui
+            logger.exception(f"[{self.worker_id}] Ошибка при выполнении действий (Клик+ESC) для '{name}':")
+            # При ошибке действия возвращаем False
+            return False
+
+    def stop(self):
+        """
+        Устанавливает флаг остановки текущего сеанса поиска.
+        Потокобезопасно: вызывается напрямую из любого потока
+        (в приложении - без очереди событий Qt, которая не обрабатывается, пока идет run()).
+        """
+        # Проверяем, не установлен ли флаг уже
+        if not self._stop_event.is_set():
+            logger.info(f"[{threading.current_thread().name}] Worker.stop() вызван. Установка флага остановки...")
+            # Устанавливаем наше событие, которое используется в _sleep_interruptible
+            self._stop_event.set()
+        else:
+             logger.info(f"[{threading.current_thread().name}] Worker.stop() вызван, но флаг остановки уже установлен.")
+
+# --- END OF FILE engine.py ---
@@ -0,0 +1,258 @@
+# --- START OF FILE frame_recorder.py ---
+
+# frame_recorder.py
+"""
+Запись кадров, которые видел Worker, для разбора пропусков и медленных срабатываний
+и для точного воспроизведения (frame_sources.ReplayFrameSource).
+
+Формат записи - папка с двумя файлами:
+  frames.bin  - сжатые zlib кадры BGR подряд (альфа-канал MSS всегда 255 и не хранится).
+                Опорный кадр хранится целиком, остальные - как XOR с предыдущим:
+                неизменные области списка сжимаются почти до нуля;
+  index.jsonl - первая строка - заголовок записи, далее строка на кадр:
+                {"i", "t" (секунды time.monotonic() от начала), "offset", "size",
+                 "key" (опорный кадр), "shape" [h, w, 3], "area" (область экрана)}.
+Опорный кадр пишется каждые keyframe_interval кадров и при смене размера области,
+поэтому для произвольного доступа достаточно распаковать не больше интервала кадров.
+Строка индекса пишется после данных кадра, и оба файла сбрасываются на диск после
+каждого кадра: после аварийного завершения запись читается до последнего кадра.
+
+Сжатие и запись выполняются в отдельном потоке; Worker только кладет кадр в очередь.
+Если поток записи не успевает, кадры отбрасываются (счетчик dropped), а не тормозят поиск.
+"""
+import json
+import logging
+import mmap
+import os
+import queue
+import shutil
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.frame_recorder")
+
+FORMAT_VERSION = 1
+DATA_FILE = "frames.bin"
+INDEX_FILE = "index.jsonl"
+
+
+def is_recording(path: str) -> bool:
+    """True, если в папке path есть запись этого формата."""
+    return os.path.exists(os.path.join(path, DATA_FILE)) and os.path.exists(os.path.join(path, INDEX_FILE))
+
+
+def prune_recordings(root: str, keep: int):
+    """Оставляет в root не больше keep последних записей (по имени папки), остальные удаляет."""
+    if keep < 0 or not os.path.isdir(root):
+        return
+    sessions = sorted(
+        name for name in os.listdir(root)
+        if is_recording(os.path.join(root, name))
+    )
+    for name in sessions[:len(sessions) - keep]:
+        try:
+            shutil.rmtree(os.path.join(root, name))
+            logger.info(f"Удалена старая запись кадров '{name}'.")
+        except OSError as e:
+            logger.warning(f"Не удалось удалить запись кадров '{name}': {e}")
+
+
+class FrameRecorder:
+    """
+    Запись кадров в папку path в фоновом потоке.
+    add(frame, area) - из потока Worker'а: кадр (BGRA/BGR, не изменяется после захвата)
+    ставится в очередь без копирования. close() - дописывает очередь и закрывает файлы.
+    max_bytes - предел размера данных (0 - без предела), после него запись прекращается.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        keyframe_interval: int = 30,
+        compression_level: int = 1,
+        queue_size: int = 8,
+        max_bytes: int = 0,
+    ):
+        self.path = path
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.compression_level = compression_level
+        self.max_bytes = max_bytes
+        self.frames = 0 # Записано кадров
+        self.dropped = 0 # Отброшено кадров (очередь заполнена или превышен предел)
+        self.bytes_written = 0
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._start_time = None
+        self._previous = None # Предыдущий записанный кадр BGR (основа для XOR)
+        self._since_key = 0
+        self._full = False # Превышен max_bytes
+        self._data_file = None
+        self._index_file = None
+        self._thread = None
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._data_file = open(os.path.join(self.path, DATA_FILE), "wb")
+        self._index_file = open(os.path.join(self.path, INDEX_FILE), "w", encoding="utf-8")
+        header = {
+            "version": FORMAT_VERSION,
+            "format": "bgr-zlib-xor",
+            "keyframe_interval": self.keyframe_interval,
+            "started": time.time(),
+        }
+        self._index_file.write(json.dumps(header) + "\n")
+        self._index_file.flush()
+        self._start_time = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="FrameRecorder", daemon=True)
+        self._thread.start()
+        logger.info(f"Запись кадров: '{self.path}'.")
+        return self
+
+    # --- Поток Worker'а ---
+
+    def add(self, frame: np.ndarray, area: dict):
+        """Ставит кадр в очередь записи. Не блокирует: при заполненной очереди кадр отбрасывается."""
+        if self._thread is None or self._full:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((time.monotonic() - self._start_time, frame, dict(area)))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Дописывает очередь и закрывает файлы."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._data_file.close()
+        self._index_file.close()
+        logger.info(
+            f"Запись кадров завершена: {self.frames} кадров, {self.bytes_written / 1048576:.1f} МБ, "
+            f"отброшено {self.dropped}. '{self.path}'"
+        )
+
+    # --- Поток записи ---
+
+    def _loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._write(*job)
+            except Exception:
+                logger.exception("Ошибка записи кадра. Запись прекращена.")
+                self._full = True
+
+    def _write(self, t: float, frame: np.ndarray, area: dict):
+        if self._full:
+            self.dropped += 1
+            return
+        bgr = np.ascontiguousarray(frame[:, :, :3]) if frame.ndim == 3 else np.ascontiguousarray(frame)
+        key = (
+            self._previous is None
+            or self._previous.shape != bgr.shape
+            or self._since_key >= self.keyframe_interval
+        )
+        payload = bgr if key else np.bitwise_xor(bgr, self._previous)
+        data = zlib.compress(payload.tobytes(), self.compression_level)
+        if self.max_bytes and self.bytes_written + len(data) > self.max_bytes:
+            logger.warning(f"Запись кадров достигла предела {self.max_bytes / 1048576:.0f} МБ. Запись прекращена.")
+            self._full = True
+            self.dropped += 1
+            return
+
+        record = {
+            "i": self.frames,
+            "t": round(t, 4),
+            "offset": self.bytes_written,
+            "size": len(data),
+            "key": key,
+            "shape": list(bgr.shape),
+            "area": area,
+        }
+        self._data_file.write(data)
+        self._data_file.flush()
+        self._index_file.write(json.dumps(record) + "\n")
+        self._index_file.flush()
+
+        self.bytes_written += len(data)
+        self.frames += 1
+        self._previous = bgr
+        self._since_key = 0 if key else self._since_key + 1
+
+
+class RecordingReader:
+    """
+    Чтение записи с произвольным доступом: frames.bin открывается через memory-map,
+    frame(i) распаковывает кадр от ближайшего опорного. Последний распакованный
+    кадр запоминается, поэтому последовательное чтение распаковывает каждый кадр один раз.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header = {}
+        self.records = []
+        with open(os.path.join(path, INDEX_FILE), "r", encoding="utf-8") as f:
+            for number, line in enumerate(f):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break # Недописанная строка после аварийного завершения
+                if number == 0:
+                    self.header = record
+                else:
+                    self.records.append(record)
+        if self.header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия записи кадров в '{path}': {self.header.get('version')}")
+
+        self._file = open(os.path.join(path, DATA_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # Кадры, данные которых не успели записаться, отбрасываются
+        self.records = [r for r in self.records if r["offset"] + r["size"] <= size]
+        self._last = (None, None) # (номер, кадр BGR)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _decode(self, record: dict) -> np.ndarray:
+        raw = zlib.decompress(self._data[record["offset"]:record["offset"] + record["size"]])
+        return np.frombuffer(raw, dtype=np.uint8).reshape(record["shape"])
+
+    def frame(self, index: int) -> np.ndarray:
+        """Кадр BGR номер index."""
+        last_index, last_frame = self._last
+        if last_index == index:
+            return last_frame
+        record = self.records[index]
+        if record["key"]:
+            frame = self._decode(record)
+        else:
+            if last_index is not None and last_index < index and index - last_index <= self.header.get("keyframe_interval", 1):
+                start, frame = last_index + 1, last_frame
+            else:
+                start = index
+                while not self.records[start]["key"]:
+                    start -= 1
+                frame = self._decode(self.records[start])
+                start += 1
+            # Опорные кадры внутри диапазона распаковываются целиком
+            for position in range(start, index + 1):
+                current = self.records[position]
+                frame = self._decode(current) if current["key"] else np.bitwise_xor(frame, self._decode(current))
+        self._last = (index, frame)
+        return frame
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+# --- END OF FILE frame_recorder.py ---
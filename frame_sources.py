@@ -0,0 +1,399 @@
+# --- START OF FILE frame_sources.py ---
+
+# frame_sources.py
+"""
+Источники кадров для движка поиска (engine.ScanEngine).
+Движок не обращается к MSS напрямую: он получает кадры через FrameSource,
+поэтому тот же конвейер (поиск шаблонов, OCR) работает на записанных или
+сгенерированных кадрах - для бенчмарков и профилирования без запущенной игры.
+
+Источники (константа FRAME_SOURCE):
+  "mss"       - захват экрана (MSS), единственный источник с реальными кликами;
+  "replay"    - кадры, записанные на диск (запись frame_recorder.py или папка
+                PNG/NPY с индексом frames.jsonl), с исходной скоростью,
+                ускоренно или без пауз ("max");
+  "synthetic" - сгенерированный список рынка из шаблонов товаров и случайных цен.
+Кадр - массив np.uint8 формы (высота, ширина, 4) в порядке BGRA, как у MSS.
+"""
+import abc
+import glob
+import json
+import logging
+import os
+import random
+import time
+
+import numpy as np
+
+import frame_recorder
+from lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+mss = lazy_import("mss")
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.frame_sources")
+
+SOURCE_MSS = "mss"
+SOURCE_REPLAY = "replay"
+SOURCE_SYNTHETIC = "synthetic"
+SOURCES = (SOURCE_MSS, SOURCE_REPLAY, SOURCE_SYNTHETIC)
+
+REPLAY_SPEED_ORIGINAL = "original"
+REPLAY_SPEED_MAX = "max"
+# Индекс записанных кадров: строка JSON на кадр {"file": ..., "t": ..., "area": {...}}
+REPLAY_INDEX_FILE = "frames.jsonl"
+
+
+class FrameSourceError(Exception):
+    """Кадр не удалось получить (аналог mss.ScreenShotError). Движок пропускает итерацию."""
+
+
+class FrameSourceExhausted(FrameSourceError):
+    """Записанные кадры закончились. Движок завершает сеанс."""
+
+
+def _area_rect(area: dict) -> tuple[int, int, int, int]:
+    return int(area["left"]), int(area["top"]), int(area["width"]), int(area["height"])
+
+
+def _crop(frame: np.ndarray, origin: dict, area: dict) -> np.ndarray:
+    """Вырезает из кадра с началом origin (глобальные координаты) область area."""
+    left, top, width, height = _area_rect(area)
+    x0 = max(0, left - int(origin["left"]))
+    y0 = max(0, top - int(origin["top"]))
+    return frame[y0:y0 + height, x0:x0 + width]
+
+
+def _to_bgra(image: np.ndarray) -> np.ndarray:
+    """Приводит серое/BGR/BGRA изображение к BGRA."""
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    return image
+
+
+class FrameSource(abc.ABC):
+    """
+    Базовый источник кадров (monitors и grab обязательны для реализации).
+    monitors - список областей в формате MSS: [0] - весь виртуальный экран, [1+] - мониторы;
+    interactive - можно ли выполнять клики (False: движок только имитирует действия).
+    """
+
+    name = "base"
+    interactive = False
+
+    def open(self):
+        """Подготавливает источник (вызывается движком перед первым захватом)."""
+
+    @property
+    @abc.abstractmethod
+    def monitors(self) -> list:
+        """Области экрана в формате MSS."""
+
+    @abc.abstractmethod
+    def grab(self, area: dict) -> np.ndarray:
+        """Возвращает кадр области area (BGRA). Бросает FrameSourceError."""
+
+    def close(self):
+        """Освобождает ресурсы источника."""
+
+
+class MssFrameSource(FrameSource):
+    """Захват экрана через MSS."""
+
+    name = SOURCE_MSS
+    interactive = True
+
+    def __init__(self):
+        self._sct = None
+
+    def open(self):
+        if self._sct is None:
+            self._sct = mss.mss()
+            logger.info("MSS инициализирован.")
+
+    @property
+    def monitors(self) -> list:
+        self.open()
+        return self._sct.monitors
+
+    def grab(self, area: dict) -> np.ndarray:
+        self.open()
+        try:
+            return np.asarray(self._sct.grab(area))
+        except mss.ScreenShotError as e:
+            raise FrameSourceError(f"Ошибка захвата экрана MSS: {e}") from e
+
+    def close(self):
+        if self._sct is not None:
+            try:
+                self._sct.close()
+                logger.info("MSS закрыт.")
+            except Exception as e:
+                logger.error(f"Ошибка при закрытии MSS: {e}")
+            self._sct = None
+
+
+class ReplayFrameSource(FrameSource):
+    """
+    Воспроизведение записанных кадров из папки path.
+    Запись frame_recorder.py читается через RecordingReader (у каждого кадра своя область:
+    автокалибровка могла сузить ее во время записи). Для папки изображений
+    порядок и время кадров берутся из REPLAY_INDEX_FILE ("t" - секунды от начала записи,
+    "area" - записанная область экрана); без индекса используются все *.png/*.npy
+    папки по имени с частотой fps.
+    speed: "original" - кадр выбирается по прошедшему времени (как при живом захвате,
+    кадры могут пропускаться или повторяться), число - то же с ускорением,
+    "max" - каждый захват возвращает следующий кадр без пауз.
+    loop - по окончании начинать сначала, иначе FrameSourceExhausted.
+    """
+
+    name = SOURCE_REPLAY
+
+    def __init__(self, path: str, speed=REPLAY_SPEED_ORIGINAL, loop: bool = False, fps: float = 10.0):
+        self.path = path
+        self.loop = loop
+        self.fps = fps
+        if speed == REPLAY_SPEED_MAX:
+            self.factor = None
+        elif speed == REPLAY_SPEED_ORIGINAL:
+            self.factor = 1.0
+        else:
+            self.factor = float(speed)
+            if self.factor <= 0:
+                raise ValueError(f"Скорость воспроизведения должна быть > 0: {speed}")
+        self.frames = [] # [(файл или номер кадра записи, t, область кадра или None)]
+        self.area = None # Записанная область (глобальные координаты)
+        self.recording = None # frame_recorder.RecordingReader
+        self._start_time = None # time.monotonic() первого захвата
+        self._position = 0 # Следующий кадр (режим "max")
+        self.position = None # Номер последнего выданного кадра (сверка с разметкой в бенчмарке)
+        self._cached = (None, None) # (номер, кадр) последнего прочитанного кадра
+
+    def open(self):
+        if self.frames:
+            return
+        index_path = os.path.join(self.path, REPLAY_INDEX_FILE)
+        if frame_recorder.is_recording(self.path):
+            self.recording = frame_recorder.RecordingReader(self.path)
+            self.frames = [
+                (position, float(record["t"]), record.get("area"))
+                for position, record in enumerate(self.recording.records)
+            ]
+            self.area = self._bounding_area([area for _, _, area in self.frames if area])
+        elif os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if self.area is None and record.get("area"):
+                        self.area = dict(record["area"])
+                    if record.get("file"):
+                        self.frames.append((os.path.join(self.path, record["file"]), float(record.get("t", 0.0)), None))
+        else:
+            files = sorted(glob.glob(os.path.join(self.path, "*.png")) + glob.glob(os.path.join(self.path, "*.npy")))
+            self.frames = [(file_path, i / self.fps, None) for i, file_path in enumerate(files)]
+        if not self.frames:
+            raise FrameSourceError(f"Нет записанных кадров в '{self.path}'.")
+        if self.area is None:
+            height, width = self._read(0).shape[:2]
+            self.area = {"left": 0, "top": 0, "width": width, "height": height}
+        logger.info(
+            f"Воспроизведение '{self.path}': {len(self.frames)} кадров, область {self.area}, "
+            f"скорость {'max' if self.factor is None else f'x{self.factor:g}'}."
+        )
+
+    @staticmethod
+    def _bounding_area(areas: list) -> dict | None:
+        """Область, охватывающая все области кадров записи."""
+        if not areas:
+            return None
+        left = min(a["left"] for a in areas)
+        top = min(a["top"] for a in areas)
+        right = max(a["left"] + a["width"] for a in areas)
+        bottom = max(a["top"] + a["height"] for a in areas)
+        return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+    @property
+    def monitors(self) -> list:
+        self.open()
+        return [dict(self.area), dict(self.area)]
+
+    def close(self):
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
+        self.frames = []
+        self.area = None
+        self._cached = (None, None)
+        self._start_time = None
+        self._position = 0
+
+    def _read(self, position: int) -> np.ndarray:
+        if self._cached[0] == position:
+            return self._cached[1]
+        file_path = self.frames[position][0]
+        if self.recording is not None:
+            frame = self.recording.frame(file_path)
+        elif file_path.endswith(".npy"):
+            frame = np.load(file_path)
+        else:
+            frame = cv2.imread(file_path, cv2.IMREAD_UNCHANGED)
+        if frame is None or frame.size == 0:
+            raise FrameSourceError(f"Не удалось прочитать кадр '{file_path}'.")
+        frame = _to_bgra(frame)
+        self._cached = (position, frame)
+        return frame
+
+    def _next_position(self) -> int:
+        """Номер кадра для текущего захвата."""
+        count = len(self.frames)
+        if self.factor is None:
+            position = self._position
+            if position >= count:
+                if not self.loop:
+                    raise FrameSourceExhausted("Записанные кадры закончились.")
+                position = 0
+            self._position = position + 1
+            return position
+
+        now = time.monotonic()
+        if self._start_time is None:
+            self._start_time = now
+        first_t = self.frames[0][1]
+        # Длительность записи: последний кадр показывается один интервал 1/fps
+        duration = self.frames[-1][1] - first_t + 1.0 / self.fps
+        elapsed = (now - self._start_time) * self.factor
+        if elapsed >= duration:
+            if not self.loop:
+                raise FrameSourceExhausted("Записанные кадры закончились.")
+            elapsed %= duration
+        # Последний кадр с t <= elapsed (кадры упорядочены по времени)
+        position = self._position if self._position < count else 0
+        if self.frames[position][1] - first_t > elapsed:
+            position = 0
+        while position + 1 < count and self.frames[position + 1][1] - first_t <= elapsed:
+            position += 1
+        self._position = position
+        return position
+
+    def grab(self, area: dict) -> np.ndarray:
+        self.open()
+        position = self._next_position()
+        self.position = position
+        return _crop(self._read(position), self.frames[position][2] or self.area, area)
+
+
+class SyntheticFrameSource(FrameSource):
+    """
+    Сгенерированный "список рынка": шаблоны товаров в случайном порядке
+    (каждый присутствует с вероятностью presence), под каждым - случайная цена.
+    rows - [{"template_path": ..., "price_range": (мин, макс)}];
+    frames_per_change - сколько захватов подряд список не меняется (как между обновлениями).
+    """
+
+    name = SOURCE_SYNTHETIC
+
+    def __init__(
+        self,
+        rows: list,
+        width: int = 1280,
+        height: int = 720,
+        seed: int | None = 0,
+        presence: float = 0.7,
+        frames_per_change: int = 1,
+        noise: int = 6,
+        price_offset: tuple[int, int] = (40, 4),
+    ):
+        self.rows = rows
+        self.width = width
+        self.height = height
+        self.presence = presence
+        self.frames_per_change = max(1, int(frames_per_change))
+        self.noise = noise
+        self.price_offset = price_offset # (x от левого края шаблона, y от нижнего края)
+        self.area = {"left": 0, "top": 0, "width": width, "height": height}
+        self._random = random.Random(seed)
+        self._templates = None # [(BGRA шаблон, диапазон цены)]
+        self._grabs = 0
+        self._frame = None
+
+    def open(self):
+        if self._templates is not None:
+            return
+        self._templates = []
+        for row in self.rows:
+            image = cv2.imread(row["template_path"], cv2.IMREAD_COLOR)
+            if image is None or image.size == 0:
+                logger.warning(f"Синтетический источник: шаблон '{row['template_path']}' не прочитан. Пропуск.")
+                continue
+            self._templates.append((_to_bgra(image), tuple(row.get("price_range", (1, 100000)))))
+        logger.info(f"Синтетический источник: {len(self._templates)} шаблонов, кадр {self.width}x{self.height}.")
+
+    @property
+    def monitors(self) -> list:
+        return [dict(self.area), dict(self.area)]
+
+    def _render(self) -> np.ndarray:
+        rnd = self._random
+        frame = np.full((self.height, self.width, 4), 30, dtype=np.uint8)
+        frame[:, :, 3] = 255
+        if self.noise:
+            noise = np.frombuffer(rnd.randbytes(self.height * self.width), dtype=np.uint8).reshape(self.height, self.width)
+            frame[:, :, :3] += (noise % (self.noise + 1))[:, :, None]
+
+        templates = [entry for entry in self._templates if rnd.random() < self.presence]
+        rnd.shuffle(templates)
+        y = 10
+        for template, (low, high) in templates:
+            t_h, t_w = template.shape[:2]
+            row_height = t_h + self.price_offset[1] + 40
+            if y + row_height > self.height or t_w + 20 > self.width:
+                break
+            frame[y:y + t_h, 20:20 + t_w] = template
+            price = rnd.randint(int(low), int(high))
+            origin = (20 + self.price_offset[0], y + t_h + self.price_offset[1] + 24)
+            cv2.putText(frame, f"{price:,}$".replace(",", " "), origin, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (235, 235, 235, 255), 2, cv2.LINE_AA)
+            y += row_height
+        return frame
+
+    def grab(self, area: dict) -> np.ndarray:
+        self.open()
+        if self._frame is None or self._grabs % self.frames_per_change == 0:
+            self._frame = self._render()
+        self._grabs += 1
+        return _crop(self._frame, self.area, area)
+
+
+def create_frame_source(
+    kind: str,
+    items: list | None = None,
+    replay_path: str | None = None,
+    replay_speed=REPLAY_SPEED_ORIGINAL,
+    replay_loop: bool = False,
+    synthetic_size: tuple[int, int] = (1280, 720),
+    synthetic_seed: int | None = 0,
+) -> FrameSource:
+    """
+    Создает источник кадров по имени (FRAME_SOURCE). items - товары движка:
+    синтетический источник рисует их шаблоны с ценами вокруг max_price.
+    """
+    if kind == SOURCE_MSS:
+        return MssFrameSource()
+    if kind == SOURCE_REPLAY:
+        if not replay_path:
+            raise ValueError("Для источника 'replay' не задан путь к записи.")
+        return ReplayFrameSource(replay_path, replay_speed, replay_loop)
+    if kind == SOURCE_SYNTHETIC:
+        rows = []
+        for item in items or []:
+            max_price = max(1, int(item.get("max_price", 1)))
+            rows.append({"template_path": item["template_path"], "price_range": (max(1, max_price // 2), max_price * 2)})
+        width, height = synthetic_size
+        return SyntheticFrameSource(rows, width, height, seed=synthetic_seed)
+    raise ValueError(f"Неизвестный источник кадров '{kind}'. Допустимые: {', '.join(SOURCES)}")
+
+# --- END OF FILE frame_sources.py ---
@@ -0,0 +1,276 @@
+# --- START OF FILE headless.py ---
+
+# headless.py
+"""
+Запуск движка поиска без графического интерфейса (без импорта PyQt).
+Для серверов, автоматических запусков и бенчмарков:
+
+    python headless.py --items market_items.json --config headless.json --duration 600
+
+События движка (см. engine.ScanEngine.EVENTS) выводятся построчно в формате JSON
+(JSONL) в stdout или в файл --events, лог - в stderr (или в --log-file).
+Конфигурация (--config) - JSON с переопределением констант движка по именам
+из constants.py, например {"SCAN_AREA": {...}, "PERFORMANCE_PROFILE": "balanced"}.
+Источник кадров (--source, см. frame_sources.py): экран, запись (--replay) или
+синтетический список; с записью и синтетикой клики не выполняются.
+--trace - трассировка этапов в формате Chrome trace (см. tracing.py) по завершении.
+--metrics-port - счетчики Worker'а в формате Prometheus (см. metrics_exporter.py).
+Остановка: Ctrl+C, истечение --duration, конец записи или достижение всех целей.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import startup_profiler
+
+if __name__ == "__main__":
+    startup_profiler.enable_from_argv() # До импорта engine: замер всех импортов
+
+import engine
+import frame_sources
+import performance
+from constants import (
+    DEFAULT_ITEM_PRIORITY,
+    DEFAULT_ITEM_SCAN_EVERY_N_FRAMES,
+    ITEM_DATA_FILE,
+    METRICS_ENABLED,
+    METRICS_HOST,
+    METRICS_PORT,
+    TEMPLATE_CACHE_ENABLED,
+    TEMPLATE_CACHE_FILE,
+    TEMPLATE_CACHE_PYRAMID_LEVELS,
+    TEMPLATE_FOLDER,
+    TRACE_BUFFER_EVENTS,
+    WORKER_STOP_BUDGET_MS,
+)
+from engine import BASE_DIR, ScanEngine, load_ocr_reader
+from metrics_exporter import MetricsServer, WorkerMetrics
+from template_cache import TemplateCache
+from tracing import TraceBuffer
+
+logger = logging.getLogger("logic.headless")
+
+
+class JsonlEventWriter:
+    """Записывает события движка построчно в JSON. Потокобезопасно."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, *args):
+        record = {"time": round(time.time(), 3), "event": event, "args": list(args)}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def apply_config(path: str) -> dict:
+    """
+    Читает JSON конфигурацию и переопределяет константы движка (модуль engine).
+    Неизвестные имена пропускаются с предупреждением. Возвращает примененные значения.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        overrides = json.load(f)
+    if not isinstance(overrides, dict):
+        raise TypeError(f"Конфигурация '{path}' должна быть JSON объектом.")
+
+    applied = {}
+    for name, value in overrides.items():
+        if not name.isupper() or not hasattr(engine, name):
+            logger.warning(f"Параметр конфигурации '{name}' не используется движком. Пропуск.")
+            continue
+        setattr(engine, name, value)
+        applied[name] = value
+    logger.info(f"Конфигурация '{path}' применена: {sorted(applied)}")
+    return applied
+
+
+def load_items(path: str) -> list:
+    """
+    Загружает товары из JSON файла (формат market_items.json) и возвращает
+    включенные товары с существующими шаблонами.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise TypeError(f"Некорректный формат данных в файле '{path}'.")
+
+    template_folder = os.path.join(BASE_DIR, TEMPLATE_FOLDER)
+    items = []
+    for item in data:
+        if not item.get("enabled", False):
+            continue
+        path_value = item.get("template_path")
+        if not item.get("name") or not path_value:
+            logger.warning(f"Товар с некорректными данными (имя/путь): {item}. Пропущен.")
+            continue
+        template_path = path_value if os.path.isabs(path_value) else os.path.join(BASE_DIR, path_value)
+        if not os.path.exists(template_path):
+            # Файл данных мог быть перенесен с другой машины: ищем шаблон в папке шаблонов
+            fallback = os.path.join(template_folder, os.path.basename(path_value.replace("\\", "/")))
+            if not os.path.exists(fallback):
+                logger.warning(f"Шаблон НЕ НАЙДЕН для товара '{item['name']}' ('{path_value}'). Пропущен.")
+                continue
+            template_path = fallback
+        item = dict(item, template_path=template_path, bought_count=0)
+        item.setdefault("priority", DEFAULT_ITEM_PRIORITY)
+        item.setdefault("scan_every_n_frames", DEFAULT_ITEM_SCAN_EVERY_N_FRAMES)
+        items.append(item)
+    logger.info(f"Загружено {len(items)} включенных товаров из '{path}'.")
+    return items
+
+
+def run_headless(
+    items: list,
+    on_event=None,
+    duration: float | None = None,
+    reader=None,
+    template_cache: TemplateCache | None = None,
+    stop_event: threading.Event | None = None,
+    frame_source=None,
+    on_metric=None,
+    tracer: TraceBuffer | None = None,
+) -> bool:
+    """
+    Выполняет один сеанс поиска без Qt и ждет его завершения.
+    reader - готовый EasyOCR Reader (если None, создается load_ocr_reader());
+    duration - ограничение времени сеанса (секунды), stop_event - внешняя остановка;
+    frame_source - источник кадров (None - по FRAME_SOURCE), on_metric - см. ScanEngine.METRICS,
+    tracer - буфер трассировки этапов (tracing.py).
+    Возвращает True, если сеанс завершился достижением всех целей.
+    """
+    if reader is None:
+        profile = performance.get_profile(engine.PERFORMANCE_PROFILES, engine.PERFORMANCE_PROFILE)
+        reader = load_ocr_reader(profile, progress=lambda text: on_event and on_event("progress", text))
+
+    finished = threading.Event()
+    result = {"stopped_by_target": False}
+
+    def handle_event(event: str, *args):
+        if event == "finished":
+            result["stopped_by_target"] = bool(args[0]) if args else False
+            finished.set()
+        if on_event is not None:
+            on_event(event, *args)
+
+    scan_engine = ScanEngine(
+        [], reader, template_cache, on_event=handle_event, frame_source=frame_source, on_metric=on_metric,
+        tracer=tracer,
+    )
+    thread = threading.Thread(target=scan_engine.serve, name="HeadlessWorker", daemon=True)
+    thread.start()
+    scan_engine.post_command(ScanEngine.CMD_START, items)
+
+    deadline = time.monotonic() + duration if duration else None
+    try:
+        while not finished.wait(0.2):
+            if stop_event is not None and stop_event.is_set():
+                logger.info("Внешняя остановка сеанса.")
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info(f"Время сеанса истекло ({duration}с).")
+                break
+    except KeyboardInterrupt:
+        logger.info("Остановка по Ctrl+C.")
+    finally:
+        scan_engine.request_stop()
+        scan_engine.post_command(ScanEngine.CMD_SHUTDOWN)
+        thread.join(WORKER_STOP_BUDGET_MS / 1000.0)
+        if thread.is_alive():
+            logger.critical("!!! Поток движка не завершился штатно в отведенное время!")
+    return result["stopped_by_target"]
+
+
+def _setup_logging(log_file: str | None, level: str):
+    """Лог движка ("logic" и дочерние логгеры) - в stderr или файл: stdout занят событиями."""
+    handler = logging.FileHandler(log_file, mode="w", encoding="utf-8") if log_file else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)-5.5s] [%(threadName)s] %(message)s"))
+    root_logger = logging.getLogger("logic")
+    root_logger.addHandler(handler)
+    root_logger.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Поиск товаров без графического интерфейса.")
+    parser.add_argument("--items", default=os.path.join(BASE_DIR, ITEM_DATA_FILE), help="Файл товаров (JSON)")
+    parser.add_argument("--config", help="JSON с переопределением констант движка")
+    parser.add_argument("--events", help="Файл событий JSONL (по умолчанию stdout)")
+    parser.add_argument("--source", choices=frame_sources.SOURCES, help="Источник кадров (по умолчанию FRAME_SOURCE)")
+    parser.add_argument("--replay", help="Папка записанных кадров (источник replay)")
+    parser.add_argument("--replay-speed", help="Скорость воспроизведения: original, max или множитель")
+    parser.add_argument("--metrics-port", type=int, help="Порт метрик Prometheus (по умолчанию METRICS_PORT при METRICS_ENABLED)")
+    parser.add_argument("--trace", help="Файл трассировки Chrome trace (последние TRACE_BUFFER_EVENTS отрезков)")
+    parser.add_argument("--duration", type=float, help="Ограничение времени сеанса (секунды)")
+    parser.add_argument("--log-file", help="Файл лога (по умолчанию stderr)")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument(startup_profiler.PROFILE_FLAG, action="store_true", help="Профиль импортов и этапов запуска")
+    args = parser.parse_args(argv)
+
+    _setup_logging(args.log_file, args.log_level)
+    if args.config:
+        apply_config(args.config)
+    # Параметры командной строки важнее файла конфигурации
+    if args.replay:
+        engine.FRAME_REPLAY_PATH = args.replay
+        engine.FRAME_SOURCE = frame_sources.SOURCE_REPLAY
+    if args.replay_speed:
+        engine.FRAME_REPLAY_SPEED = args.replay_speed
+    if args.source:
+        engine.FRAME_SOURCE = args.source
+    # Ограничение потоков OpenMP/MKL - до импорта torch (см. performance.py)
+    performance.apply_environment(performance.get_profile(engine.PERFORMANCE_PROFILES, engine.PERFORMANCE_PROFILE))
+
+    items = load_items(args.items)
+    if not items:
+        logger.error("Нет включенных товаров с шаблонами. Завершение.")
+        return 2
+
+    events_stream = open(args.events, "a", encoding="utf-8") if args.events else sys.stdout
+    metrics_server = None
+    try:
+        write_event = JsonlEventWriter(events_stream)
+        metrics = None
+        if args.metrics_port or METRICS_ENABLED:
+            metrics = WorkerMetrics()
+            metrics_server = MetricsServer(metrics, args.metrics_port or METRICS_PORT, METRICS_HOST)
+            metrics_server.start()
+
+        def on_event(event: str, *event_args):
+            if metrics is not None:
+                metrics.on_event(event, *event_args)
+            write_event(event, *event_args)
+        with startup_profiler.section("Загрузка OCR"):
+            profile = performance.get_profile(engine.PERFORMANCE_PROFILES, engine.PERFORMANCE_PROFILE)
+            reader = load_ocr_reader(profile, progress=lambda text: on_event("progress", text))
+        startup_profiler.report("headless: OCR загружен")
+        template_cache = (
+            TemplateCache(os.path.join(BASE_DIR, TEMPLATE_FOLDER, TEMPLATE_CACHE_FILE), TEMPLATE_CACHE_PYRAMID_LEVELS)
+            if TEMPLATE_CACHE_ENABLED else None
+        )
+        if metrics is not None:
+            metrics.template_cache = template_cache
+        tracer = TraceBuffer(TRACE_BUFFER_EVENTS) if args.trace else None
+        stopped_by_target = run_headless(
+            items, on_event, args.duration, reader, template_cache, on_metric=metrics, tracer=tracer
+        )
+        if tracer is not None:
+            tracer.dump(args.trace)
+        on_event("exit", stopped_by_target)
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        if events_stream is not sys.stdout:
+            events_stream.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE headless.py ---
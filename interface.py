@@ -1,19 +1,24 @@
 
 import os
+import time
 
 from PyQt6.QtCore import (QMetaObject, QPoint, QRect, QSize, Qt, QTimer,
                           pyqtSlot)
 from PyQt6.QtGui import QColor, QIcon, QIntValidator, QPixmap, QFont, QCursor
-from PyQt6.QtWidgets import (QApplication, QCheckBox, QDialog,
+from PyQt6.QtWidgets import (QApplication, QCheckBox, QComboBox, QDialog,
                              QDialogButtonBox, QFormLayout, QHBoxLayout, QLabel,
                              QLineEdit, QListWidget, QListWidgetItem,
                              QMessageBox, QPushButton, QSizePolicy, QSpinBox,
                              QToolTip, QVBoxLayout, QWidget)
 
 from constants import (ADD_ITEM_HOTKEY, DEFAULT_ITEM_ENABLED,
-                       DEFAULT_ITEM_MAX_PRICE, DEFAULT_ITEM_QUANTITY,
+                       DEFAULT_ITEM_MAX_PRICE, DEFAULT_ITEM_PRIORITY,
+                       DEFAULT_ITEM_QUANTITY, DEFAULT_ITEM_SCAN_EVERY_N_FRAMES,
+                       ITEM_PRIORITY_LABELS, ITEM_PRIORITY_SCAN_EVERY_N_FRAMES,
                        MAIN_WINDOW_HEIGHT, MAIN_WINDOW_WIDTH,
-                       STOP_MONITORING_HOTKEY, TEMPLATE_FOLDER)
+                       MAX_ITEM_SCAN_EVERY_N_FRAMES, PERF_PANEL_ENABLED,
+                       PERF_PANEL_UPDATE_MS, STOP_MONITORING_HOTKEY,
+                       TEMPLATE_FOLDER)
 
 
 # --- Диалог редактирования товара ---
@@ -70,6 +75,23 @@ class ItemEditDialog(QDialog):
             "Сколько штук этого товара нужно купить (цель)."
         )
 
+        self.priorityComboBox = QComboBox()
+        for priority_key, priority_label in ITEM_PRIORITY_LABELS.items():
+            self.priorityComboBox.addItem(priority_label, priority_key)
+        self.priorityComboBox.setToolTip(
+            "Приоритет товара: товары с высоким приоритетом проверяются первыми.\n"
+            "Низкий приоритет по умолчанию проверяется реже (не в каждом кадре)."
+        )
+
+        self.scanEverySpinBox = QSpinBox()
+        self.scanEverySpinBox.setMinimum(0)
+        self.scanEverySpinBox.setMaximum(MAX_ITEM_SCAN_EVERY_N_FRAMES)
+        self.scanEverySpinBox.setSpecialValueText("По приоритету") # Отображается для 0
+        self.scanEverySpinBox.setToolTip(
+            "Проверять шаблон товара каждый N-й кадр.\n"
+            "0 - частота определяется приоритетом."
+        )
+
         # Счетчик текущего количества (только для отображения)
         self.boughtCountLabel = QLabel()
         self.boughtCountLabel.setToolTip("Текущее количество купленного товара (сброс при перезапуске).")
@@ -121,6 +143,15 @@ class ItemEditDialog(QDialog):
             self.item_data.get("quantity", DEFAULT_ITEM_QUANTITY)
         )
 
+        priority = self.item_data.get("priority", DEFAULT_ITEM_PRIORITY)
+        priority_index = self.priorityComboBox.findData(priority)
+        if priority_index < 0:
+            priority_index = self.priorityComboBox.findData(DEFAULT_ITEM_PRIORITY)
+        self.priorityComboBox.setCurrentIndex(max(0, priority_index))
+
+        scan_every = self.item_data.get("scan_every_n_frames", DEFAULT_ITEM_SCAN_EVERY_N_FRAMES)
+        self.scanEverySpinBox.setValue(scan_every if isinstance(scan_every, int) else 0)
+
         # Отображение текущего счетчика
         bought_count = self.item_data.get("bought_count", 0)
         self.boughtCountLabel.setText(str(bought_count))
@@ -146,6 +177,8 @@ class ItemEditDialog(QDialog):
 
         formLayout.addRow("Макс. цена ($):", self.maxPriceEdit)
         formLayout.addRow("Купить кол-во:", self.quantitySpinBox)
+        formLayout.addRow("Приоритет:", self.priorityComboBox)
+        formLayout.addRow("Проверять каждый N-й кадр:", self.scanEverySpinBox)
         formLayout.addRow("Куплено (текущий запуск):", self.boughtCountLabel) # Добавление счетчика
 
 
@@ -169,6 +202,8 @@ class ItemEditDialog(QDialog):
             "enabled": self.enabledCheckbox.isChecked(),
             "max_price": max_price,
             "quantity": self.quantitySpinBox.value(),
+            "priority": self.priorityComboBox.currentData() or DEFAULT_ITEM_PRIORITY,
+            "scan_every_n_frames": self.scanEverySpinBox.value(),
             # purchased_count НЕ редактируется через диалог
         }
 
@@ -179,6 +214,9 @@ class MainWindow(QWidget):
 
     # logic: BotLogic # Добавление типа для подсказок
 
+    # Этапы Worker'а на панели производительности: этап (см. engine.ScanEngine.METRICS) -> подпись
+    PERF_STAGES = (("grab", "захват"), ("convert", "конв."), ("match", "поиск"), ("ocr", "OCR"), ("action", "клик"))
+
     def __init__(self, logic, parent=None):
         super().__init__(parent)
         self.logic = logic
@@ -225,6 +263,8 @@ class MainWindow(QWidget):
         self._setup_management_panel(main_layout)
         self._setup_item_list(main_layout)
         self._setup_search_panel(main_layout)
+        if PERF_PANEL_ENABLED:
+            self._setup_perf_panel(main_layout)
         self._setup_status_bar(main_layout)
 
         self.setLayout(main_layout)
@@ -319,6 +359,73 @@ class MainWindow(QWidget):
 
         parent_layout.addLayout(search_layout)
 
+    def _setup_perf_panel(self, parent_layout: QVBoxLayout):
+        """
+        Настраивает панель производительности. Значения берутся из метрик Worker'а
+        (logic.metrics) по таймеру раз в PERF_PANEL_UPDATE_MS, а не по каждому кадру.
+        """
+        self.perfLabel = QLabel("")
+        self.perfLabel.setStyleSheet("QLabel { padding: 2px 3px; color: #404040; font-size: 8pt; }")
+        self.perfLabel.setToolTip(
+            "FPS - обработанных кадров в секунду;\n"
+            "захват→клик - время от начала захвата кадра до последнего клика по товару;\n"
+            "кэш шаблонов - доля загрузок шаблонов из памяти (без чтения файла) с запуска;\n"
+            "CPU - загрузка процессора приложением (все ядра = 100%);\n"
+            "доли - часть времени, затраченная на этапы Worker'а, остальное - паузы.\n"
+            f"Значения за последние {PERF_PANEL_UPDATE_MS / 1000:g} с."
+        )
+        parent_layout.addWidget(self.perfLabel)
+
+        self._perf_previous = None # (time.monotonic(), time.process_time(), снимок метрик)
+        self.perfTimer = QTimer(self)
+        self.perfTimer.setInterval(PERF_PANEL_UPDATE_MS)
+        self.perfTimer.timeout.connect(self._update_perf_panel)
+        self.perfTimer.start()
+        self._update_perf_panel()
+
+    def _update_perf_panel(self):
+        """Обновляет панель производительности по разнице метрик с прошлого обновления."""
+        metrics = getattr(self.logic, "metrics", None)
+        if metrics is None:
+            self.perfLabel.setVisible(False)
+            return
+        snapshot = metrics.snapshot()
+        now = time.monotonic()
+        cpu_time = time.process_time() # Время CPU всех потоков процесса
+        previous = self._perf_previous
+        self._perf_previous = (now, cpu_time, snapshot)
+        if previous is None or now <= previous[0]:
+            self.perfLabel.setText("Производительность: нет данных")
+            return
+
+        elapsed = now - previous[0]
+        counters = snapshot["counters"]
+        previous_counters = previous[2]["counters"]
+        cpu_usage = (cpu_time - previous[1]) / elapsed / (os.cpu_count() or 1)
+        if snapshot["state"] == "stopped":
+            self.perfLabel.setText(f"Поиск не запущен | CPU {cpu_usage:.0%}")
+            return
+
+        frames = counters["frames_processed_total"] - previous_counters["frames_processed_total"]
+        latency = snapshot["last_action_latency"]
+        template_hits = snapshot["template_cache"].get("memory", 0)
+        template_lookups = sum(snapshot["template_cache"].values())
+        shares = []
+        busy = 0.0
+        for stage, label in self.PERF_STAGES:
+            seconds = snapshot["stage_seconds"].get(stage, 0.0) - previous[2]["stage_seconds"].get(stage, 0.0)
+            busy += seconds
+            shares.append(f"{label} {seconds / elapsed:.0%}")
+        shares.append(f"паузы {max(0.0, 1.0 - busy / elapsed):.0%}")
+
+        state = " (простой)" if snapshot["state"] == "idle" else ""
+        latency_text = f"{latency * 1000:.0f} мс" if latency is not None else "—"
+        cache_text = f"{template_hits / template_lookups:.0%}" if template_lookups else "—"
+        self.perfLabel.setText(
+            f"FPS {frames / elapsed:.1f}{state} | захват→клик {latency_text} | "
+            f"кэш шаблонов {cache_text} | CPU {cpu_usage:.0%}\n" + " · ".join(shares)
+        )
+
     def _setup_status_bar(self, parent_layout: QVBoxLayout):
         """Настраивает строку статуса."""
         self.statusBar = QLabel("Инициализация...") # Начальный текст статуса
@@ -356,6 +463,7 @@ class MainWindow(QWidget):
         self.logic.signal_update_status.connect(self.update_status)
         self.logic.signal_enable_controls.connect(self.enable_controls)
         self.logic.signal_update_item_list.connect(self.update_item_list)
+        self.logic.signal_ocr_ready.connect(self._on_ocr_ready)
         self.logic.signal_action_performed.connect(self._on_action_performed)
         self.logic.signal_monitoring_stopped.connect(
             self._on_monitoring_stopped
@@ -394,10 +502,10 @@ class MainWindow(QWidget):
         self, current: QListWidgetItem | None, previous: QListWidgetItem | None
     ):
         """Обработчик смены выбранного элемента в списке."""
-        # Кнопка удаления активна только если что-то выбрано И процесс не запущен
+        # Кнопка удаления активна только если что-то выбрано И не идет выделение области
+        # (во время поиска товар удаляется и из работающего Worker'а)
         can_remove = (
             current is not None
-            and not self.logic.monitoring_active
             and not self.logic.is_selecting_area
         )
         self.removeItemButton.setEnabled(can_remove)
@@ -408,13 +516,14 @@ class MainWindow(QWidget):
         if not item_widget:
             return # Нет элемента
 
-        # Проверяем состояние приложения - нельзя редактировать во время поиска/выделения
-        if self.logic.monitoring_active or self.logic.is_selecting_area:
-            self.update_status("Остановите процесс для редактирования.")
+        # Проверяем состояние приложения - нельзя редактировать во время выделения.
+        # Во время поиска изменения применяются работающим Worker'ом без перезапуска.
+        if self.logic.is_selecting_area:
+            self.update_status("Завершите выделение для редактирования.")
             QMessageBox.warning(
                 self,
                 "Действие недоступно",
-                "Сначала остановите поиск или режим выделения.",
+                "Сначала завершите режим выделения.",
             )
             return
 
@@ -637,6 +746,14 @@ class MainWindow(QWidget):
         price = item_data.get("max_price", 0)
         tip_lines.append(f"Макс. цена: {price}${' (Без лимита)' if price == 0 else ''}")
         tip_lines.append(f"Цель: {item_data.get('quantity', 1)} шт.")
+        priority = item_data.get("priority", DEFAULT_ITEM_PRIORITY)
+        scan_every = item_data.get("scan_every_n_frames", DEFAULT_ITEM_SCAN_EVERY_N_FRAMES)
+        if not isinstance(scan_every, int) or scan_every <= 0:
+            scan_every = ITEM_PRIORITY_SCAN_EVERY_N_FRAMES.get(priority, 1)
+        tip_lines.append(
+            f"Приоритет: {ITEM_PRIORITY_LABELS.get(priority, priority)}"
+            f" (проверка каждый {scan_every}-й кадр)"
+        )
         tip_lines.append(f"Куплено (текущий запуск): {item_data.get('bought_count', 0)}")
 
 
@@ -678,6 +795,7 @@ class MainWindow(QWidget):
         # Кнопка активна, если:
         # 1. Нет активного мониторинга И нет режима выделения области.
         # 2. Есть хотя бы один товар в списке, который включен И имеет существующий файл шаблона.
+        # 3. OCR загружен (загрузка идет в фоне после запуска приложения).
         is_monitoring = self.logic.monitoring_active
         is_selecting = self.logic.is_selecting_area
 
@@ -687,6 +805,7 @@ class MainWindow(QWidget):
         # Устанавливаем активность кнопки
         self.startButton.setEnabled(
             not is_monitoring and not is_selecting and has_enabled_valid_items
+            and self.logic.ocr_ready
         )
 
 
@@ -701,16 +820,18 @@ class MainWindow(QWidget):
         # Кнопка Стоп активна только если мониторинг запущен
         self.stopButton.setEnabled(is_monitoring)
 
-        # Управление товарами (Добавить, Удалить, Список, Игнор. Аренда) активны
+        # Добавление товара (выделение области) и "Игнор. Аренда" активны
         # только если НЕ запущен мониторинг И НЕ режим выделения
         can_manage = not is_monitoring and not is_selecting
         self.addItemButton.setEnabled(can_manage)
-        self.itemListWidget.setEnabled(can_manage)
         self.ignoreRentCheckbox.setEnabled(can_manage)
 
-        # Кнопка Удалить активна только если можно управлять И что-то выбрано в списке
+        # Список товаров (редактирование, вкл/выкл) и удаление доступны и во время поиска:
+        # изменения передаются работающему Worker'у
+        can_edit_items = not is_selecting
+        self.itemListWidget.setEnabled(can_edit_items)
         item_selected = self.itemListWidget.currentItem() is not None
-        self.removeItemButton.setEnabled(can_manage and item_selected)
+        self.removeItemButton.setEnabled(can_edit_items and item_selected)
 
         # Кнопка Старт обновляется отдельно функцией _update_start_button_state,
         # т.к. зависит еще и от состояния списка товаров.
@@ -791,6 +912,12 @@ class MainWindow(QWidget):
                 "Все цели для активных товаров достигнуты.\nАвтоматический поиск остановлен."
             )
 
+    @pyqtSlot(bool)
+    def _on_ocr_ready(self, ok: bool):
+        """Обработчик сигнала о завершении фоновой загрузки OCR."""
+        # Кнопка Старт становится активной только после загрузки OCR
+        self._update_start_button_state()
+
     # @pyqtSlot(str)
     # def _on_logic_init_error(self, error_msg):
     #     """Обработчик сигнала о критической ошибке инициализации логики."""
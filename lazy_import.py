@@ -0,0 +1,78 @@
+# --- START OF FILE lazy_import.py ---
+
+# lazy_import.py
+"""
+Отложенный импорт тяжелых библиотек (easyocr/torch, cv2, pyautogui и т.д.).
+Модуль-заместитель импортирует настоящий модуль при первом обращении
+к его атрибуту, поэтому окно приложения появляется, не дожидаясь импорта torch.
+"""
+import importlib
+import logging
+import threading
+import time
+import types
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.lazy_import")
+
+_load_lock = threading.RLock() # Один импорт одновременно (модуль могут запросить несколько потоков)
+
+
+class LazyModule(types.ModuleType):
+    """
+    Заместитель модуля. Атрибуты читаются и записываются в настоящем модуле,
+    который импортируется при первом обращении.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        """Импортирует настоящий модуль (один раз) и возвращает его."""
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _load_lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    start_time = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+                    logger.info(
+                        f"Отложенный импорт '{self.__name__}' выполнен за "
+                        f"{time.perf_counter() - start_time:.2f}с "
+                        f"(поток {threading.current_thread().name})."
+                    )
+        return module
+
+    @property
+    def is_loaded(self) -> bool:
+        """True, если настоящий модуль уже импортирован."""
+        return self.__dict__["_lazy_module"] is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "загружен" if self.is_loaded else "не загружен"
+        return f"<LazyModule '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Возвращает заместитель модуля name. Импорт произойдет при первом обращении."""
+    return LazyModule(name)
+
+
+def preload(*modules: LazyModule):
+    """Импортирует указанные модули заранее (например, в фоновом потоке)."""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
+
+# --- END OF FILE lazy_import.py ---
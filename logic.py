@@ -7,13 +7,28 @@ import sys
 import threading
 import time
 import traceback
+from typing import TYPE_CHECKING
 
-import cv2
-import easyocr
-import keyboard # Предполагается установленной (pip install keyboard)
-import mss # Предполагается установленной (pip install mss)
 import numpy as np
-import pyautogui # Предполагается установленной (pip install pyautogui)
+
+from lazy_import import lazy_import, preload
+
+if TYPE_CHECKING:
+    # Не выполняется. Нужен анализаторам импортов (PyInstaller, IDE),
+    # которые не видят отложенные импорты ниже.
+    import cv2
+    import easyocr
+    import keyboard
+    import mss
+    import pyautogui
+
+# Тяжелые библиотеки импортируются при первом обращении (см. lazy_import.py):
+# импорт easyocr (torch) занимает секунды и не должен задерживать появление окна.
+cv2 = lazy_import("cv2")
+easyocr = lazy_import("easyocr")
+keyboard = lazy_import("keyboard") # Предполагается установленной (pip install keyboard)
+mss = lazy_import("mss") # Предполагается установленной (pip install mss)
+pyautogui = lazy_import("pyautogui") # Предполагается установленной (pip install pyautogui)
 
 # --- Сторонние библиотеки ---
 try:
@@ -63,34 +78,49 @@ try:
     # Импорт констант после определения BASE_DIR
     from constants import (
         ADD_ITEM_HOTKEY,
+        CALIBRATION_DATA_FILE,
         DEBUG_SAVE_PRICE_ROI,
         DEBUG_PRICE_ROI_PATH,
         DEFAULT_ITEM_ENABLED,
         DEFAULT_ITEM_MAX_PRICE,
+        DEFAULT_ITEM_PRIORITY,
         DEFAULT_ITEM_QUANTITY,
+        DEFAULT_ITEM_SCAN_EVERY_N_FRAMES,
         ITEM_DATA_FILE,
         LOG_FILE_NAME,
-        MIN_REFRESH_INTERVAL,
+        MAX_ITEM_SCAN_EVERY_N_FRAMES,
+        METRICS_ENABLED,
+        METRICS_HOST,
+        METRICS_PORT,
         OCR_LANGUAGES,
-        OCR_PRICE_ALLOWLIST,
-        POST_ACTION_PAUSE,
-        PRICE_SEARCH_RELATIVE_AREA, # НОВАЯ КОНСТАНТА
-        PRICE_OCR_CONFIDENCE_THRESHOLD, # НОВАЯ КОНСТАНТА
-        PRICE_MIN_HORIZONTAL_OFFSET_FROM_TEMPLATE_LEFT, # НОВАЯ КОНСТАНТА
-        PRICE_MIN_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM, # НОВАЯ КОНСТАНТА
-        PRICE_MAX_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM, # НОВАЯ КОНСТАНТА
-        REFRESH_BUTTON_X,
-        REFRESH_BUTTON_Y,
-        REFRESH_PAUSE,
-        SCAN_AREA,
+        PERFORMANCE_PROFILE,
+        PERFORMANCE_PROFILES,
+        PROFILER_HOTKEY,
+        PROFILER_SAMPLE_INTERVAL,
+        PROFILER_TOP_FUNCTIONS,
         SCAN_INTERVAL_WHEN_NOT_FOUND,
         STOP_MONITORING_HOTKEY,
         TARGET_WINDOW_TITLE, # Пока не используется
+        TEMPLATE_CACHE_ENABLED,
+        TEMPLATE_CACHE_FILE,
+        TEMPLATE_CACHE_PYRAMID_LEVELS,
         TEMPLATE_FOLDER,
-        TEMPLATE_MATCH_THRESHOLD,
-        WORKER_LOOP_PAUSE,
+        TRACE_BUFFER_EVENTS,
+        TRACE_DUMP_HOTKEY,
+        TRACE_ENABLED,
+        TRACE_FOLDER,
+        WATCHDOG_AUTO_RESTART,
+        WORKER_STOP_BUDGET_MS,
     )
     from screen_selector import ScreenSelectionWidget # Импорт виджета выделения
+    from calibration import CalibrationStore
+    import performance
+    from engine import ScanEngine, get_item_scan_cadence, load_ocr_reader, ocr_lock
+    from sampling_profiler import SamplingProfiler
+    from metrics_exporter import MetricsServer, WorkerMetrics
+    from stages import StageRunner
+    from template_cache import TemplateCache
+    from tracing import TraceBuffer
 
     PYQT_AVAILABLE = True
 except ImportError as import_err:
@@ -112,7 +142,9 @@ except ImportError as import_err:
 
 # --- Определение путей к ресурсам ---
 ABS_TEMPLATE_FOLDER = os.path.join(BASE_DIR, TEMPLATE_FOLDER)
+ABS_TEMPLATE_CACHE_FILE = os.path.join(ABS_TEMPLATE_FOLDER, TEMPLATE_CACHE_FILE)
 ABS_ITEM_DATA_FILE = os.path.join(BASE_DIR, ITEM_DATA_FILE)
+ABS_CALIBRATION_DATA_FILE = os.path.join(BASE_DIR, CALIBRATION_DATA_FILE)
 LOG_FILE_PATH = os.path.join(BASE_DIR, LOG_FILE_NAME)
 ABS_DEBUG_PRICE_ROI_PATH = os.path.join(BASE_DIR, DEBUG_PRICE_ROI_PATH)
 
@@ -160,1056 +192,139 @@ logger.info(f"Transliterate Available: {TRANS_AVAILABLE}")
 logger.info("=" * 50)
 
 
-# --- Глобальная блокировка для pyautogui ---
-# Это необходимо, чтобы избежать одновременных вызовов pyautogui из разных потоков,
-# что может привести к непредсказуемому поведению или ошибкам.
-input_lock = threading.RLock()
-
-
 # ============================================================================
 # === Класс Worker: Фоновый исполнитель задач ===
 # ============================================================================
 class Worker(QObject):
     """
-    Выполняет поиск и действия в отдельном потоке.
-    Логирование в файл. Усиленная проверка остановки.
+    Qt-обертка над движком поиска ScanEngine (engine.py).
+    Живет в своем QThread (слот serve()), события движка передает сигналами
+    в основной поток (BotLogic/Interface). Команды (post_command, request_stop,
+    post_item_delta) потокобезопасны и передаются движку напрямую.
     """
 
+    CMD_START = ScanEngine.CMD_START
+    CMD_UPDATE = ScanEngine.CMD_UPDATE
+    CMD_SHUTDOWN = ScanEngine.CMD_SHUTDOWN
+    DELTA_UPSERT = ScanEngine.DELTA_UPSERT
+    DELTA_REMOVE = ScanEngine.DELTA_REMOVE
+
     # Сигналы для отправки данных обратно в основной поток (BotLogic/Interface)
-    finished = pyqtSignal(bool) # bool: True если остановлен по достижению цели
+    finished = pyqtSignal(bool, object) # bool: True если остановлен по достижению цели; id сеанса (post_command)
     error = pyqtSignal(str) # Сигнал об ошибке (не критической для краха потока)
     action_performed_signal = pyqtSignal(str, int, int) # name, price, total_bought
+    first_scan_completed = pyqtSignal() # Первый кадр полностью обработан (для замера времени запуска)
+    service_stopped = pyqtSignal() # Цикл команд serve() завершен (после CMD_SHUTDOWN)
+    stage_overrun = pyqtSignal(str, float) # Этап (см. STAGE_DEADLINES) превысил лимит: этап, время
+    stage_stalled = pyqtSignal(object) # Сторож обнаружил зависание этапа: словарь события (см. stage_watchdog.py)
 
-    def __init__(self, items_to_search: list, ocr_reader: easyocr.Reader):
+    def __init__(
+        self,
+        items_to_search: list,
+        ocr_reader: "easyocr.Reader",
+        template_cache: "TemplateCache | None" = None,
+        metrics: "WorkerMetrics | None" = None,
+        tracer: "TraceBuffer | None" = None,
+    ):
         super().__init__()
-        # Устанавливаем имя потока для логирования. Делаем это в run(),
-        # т.к. поток QThread создается и запускается извне.
-        # threading.current_thread().name = f"Worker_{id(self)}"
-
-        logger.info("Инициализация Worker...")
-        # Копируем данные, чтобы Worker работал с собственной копией
-        self.items_data = [item.copy() for item in items_to_search]
-        self.ocr_reader = ocr_reader # Reader передается из основного потока
-        self.templates = {} # Загруженные шаблоны OpenCV
-        self.item_progress = {} # Словарь для отслеживания купленного кол-ва
-        self._stop_event = threading.Event() # Событие для надежной остановки Worker'а
-        self.scan_area_coords = None # Координаты области сканирования
-        self.sct = None # MSS скриншоттер
-        self.last_refresh_time = 0 # Время последнего обновления списка в игре
-        self.all_targets_reached = False # Флаг, были ли достигнуты все цели
-
-        # Загрузка шаблонов и инициализация прогресса происходит в __init__
-        # для проверки данных до запуска потока.
-        try:
-            self._load_templates()
-        except Exception:
-            # Если загрузка шаблонов не удалась, логируем и обнуляем список
-            logger.exception(
-                f"[Worker] Критическая ошибка при загрузке шаблонов:"
-            )
-            self.items_data = [] # Очищаем список товаров для поиска
-
-        # Проверка, есть ли вообще что искать после загрузки шаблонов
-        if not self.items_data:
-            logger.warning(
-                f"[Worker] Нет валидных товаров для поиска после загрузки шаблонов."
-            )
-        else:
-             logger.info(f"[Worker] Worker инициализирован с {len(self.items_data)} товарами.")
-
-    @property
-    def _is_running(self) -> bool:
-        """
-        Проверяет, был ли запрошен останов.
-        Комбинирует проверку threading.Event и флага прерывания потока Qt.
-        """
-        # Проверка флага из threading.Event
-        if self._stop_event.is_set():
-            return False
+        self.metrics = metrics # Метрики для Prometheus (см. metrics_exporter.py), общие для всех Worker'ов
+        self._signals = {
+            "finished": self.finished,
+            "error": self.error,
+            "action_performed": self.action_performed_signal,
+            "first_scan_completed": self.first_scan_completed,
+            "service_stopped": self.service_stopped,
+            "stage_overrun": self.stage_overrun,
+            "stage_stalled": self.stage_stalled,
+        }
+        self.engine = ScanEngine(
+            items_to_search, ocr_reader, template_cache,
+            on_event=self._on_engine_event,
+            extra_stop_check=self._qt_interruption_requested,
+            on_metric=metrics,
+            tracer=tracer,
+        )
 
-        # Проверка флага прерывания потока Qt
+    def _on_engine_event(self, event: str, *args):
+        """Событие движка -> сигнал Qt (вызывается в потоке Worker'а)."""
+        if self.metrics is not None:
+            self.metrics.on_event(event, *args)
+        signal = self._signals.get(event)
+        if signal is not None:
+            signal.emit(*args)
+
+    @staticmethod
+    def _qt_interruption_requested() -> bool:
+        """Флаг прерывания потока Qt (QThread.requestInterruption)."""
         qt_thread = QtCore.QThread.currentThread()
-        if qt_thread and qt_thread.isInterruptionRequested():
-            # Если поток Qt запросил прерывание, устанавливаем и наше событие
-            # для синхронизации и более быстрого выхода из блокирующих sleep
-            self._stop_event.set()
-            return False
+        return bool(qt_thread and qt_thread.isInterruptionRequested())
 
-        return True # Если ни один флаг не установлен, значит поток должен работать
-
-    def _load_templates(self):
-        """
-        Загружает шаблоны OpenCV из файлов и инициализирует item_progress.
-        Вызывается в __init__ Worker'а.
-        """
-        logger.info(f"[Worker] Загрузка шаблонов...")
-        valid_items_temp = [] # Временный список для валидных товаров
-        self.templates.clear() # Очищаем предыдущие шаблоны
-        self.item_progress.clear() # Очищаем предыдущий прогресс
-
-        for item_data in self.items_data:
-            # Проверка остановки во время загрузки шаблонов (хотя обычно быстро)
-            if not self._is_running:
-                logger.warning("[Worker] Загрузка шаблонов прервана.")
-                break # Прерываем цикл, если запрошена остановка
-
-            item_name = item_data.get("name")
-            template_path = item_data.get("template_path")
-            target_qty = item_data.get("quantity", DEFAULT_ITEM_QUANTITY) # Целевое количество
-
-            # Базовая проверка данных
-            if not item_name or not isinstance(item_name, str):
-                logger.warning(f"[Worker] Пропущен товар с некорректным именем: {item_name}")
-                continue
-            if item_name in self.templates:
-                logger.warning(f"[Worker] Пропущен дубликат товара в списке: '{item_name}'")
-                continue
-            if not template_path or not isinstance(template_path, str):
-                 logger.warning(f"[Worker] Пропущен товар '{item_name}': отсутствует путь к шаблону.")
-                 continue
-            if not os.path.isabs(template_path):
-                 # Конвертируем относительный путь в абсолютный, если необходимо
-                 # (Хотя логика сохранения в BotLogic должна сохранять абсолютные)
-                 abs_path = os.path.abspath(os.path.join(BASE_DIR, template_path))
-                 logger.warning(f"[Worker] Конвертация относительного пути для '{item_name}': {template_path} -> {abs_path}")
-                 template_path = abs_path
-
-
-            if not os.path.exists(template_path):
-                logger.error(
-                    f"[Worker] Шаблон НЕ НАЙДЕН для '{item_name}' "
-                    f"по пути '{template_path}'. Пропуск."
-                )
-                continue # Пропускаем этот товар
+    # --- Состояние движка, используемое BotLogic ---
 
-            try:
-                # Загружаем изображение шаблона в оттенках серого
-                template_img = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-                if template_img is None:
-                    raise ValueError(
-                        f"OpenCV не смог загрузить изображение из: {template_path}"
-                    )
-
-                # Проверяем размер шаблона (должен быть больше 3x3 пикселей)
-                h, w = template_img.shape[:2]
-                if w < 3 or h < 3:
-                    logger.warning(
-                        f"[Worker] Шаблон '{item_name}' слишком мал "
-                        f"({w}x{h}px). Пропуск."
-                    )
-                    continue # Пропускаем слишком маленькие шаблоны
-
-                # Если все проверки пройдены, добавляем шаблон и инициализируем прогресс
-                self.templates[item_name] = template_img
-                self.item_progress[item_name] = {
-                    "bought": 0, # Сбрасываем счетчик при каждом запуске Worker'а
-                    "target": max(1, target_qty), # Цель должна быть минимум 1
-                }
-                 # Добавляем товар во временный список валидных
-                valid_items_temp.append(item_data)
-
-            except Exception:
-                # Логируем любую другую ошибку при загрузке конкретного шаблона
-                logger.exception(
-                    f"[Worker] Ошибка при загрузке и проверке шаблона "
-                    f"'{item_name}' по пути '{template_path}':"
-                )
-                continue # Пропускаем этот товар
-
-        # Обновляем основной список товаров Worker'а только валидными товарами
-        self.items_data = valid_items_temp
-        num_valid = len(self.items_data)
-
-        if num_valid > 0:
-            logger.info(
-                f"[Worker] Загрузка шаблонов завершена. Обрабатывается {num_valid} валидных товаров."
-            )
-        else:
-            logger.warning(
-                f"[Worker] Загрузка шаблонов завершена. Не найдено ни одного "
-                f"валидного шаблона для поиска."
-            )
+    @property
+    def worker_id(self) -> str:
+        return self.engine.worker_id
 
-    def _get_screen_area_for_scan(self) -> bool:
-        """
-        Определяет координаты области экрана для сканирования.
-        Приоритет: SCAN_AREA из констант, затем основной монитор MSS.
-        Возвращает True, если область успешно определена, False иначе.
-        """
-        logger.info(f"[Worker] Определение области сканирования...")
-        coords_ok = False
-        required_keys = ["left", "top", "width", "height"] # Ключи, необходимые для dict области
-
-        # Убедимся, что MSS инициализирован
-        if self.sct is None:
-            logger.error(f"[Worker] MSS (sct) не инициализирован!")
-            return False
-
-        # 1. Проверка SCAN_AREA из constants.py
-        if (
-            SCAN_AREA
-            and isinstance(SCAN_AREA, dict)
-            and all(k in SCAN_AREA for k in required_keys)
-        ):
-            try:
-                sa = SCAN_AREA
-                # Проверяем, что все значения - int и размеры положительные
-                is_valid = (
-                    all(isinstance(sa.get(k), int) for k in required_keys)
-                    and sa.get("width", 0) > 0
-                    and sa.get("height", 0) > 0
-                )
-                if is_valid:
-                    # Получаем размеры всего виртуального экрана для проверки границ
-                    # Используем geometry монитора 0 в MSS, которая представляет весь виртуальный рабочий стол
-                    monitors = self.sct.monitors
-                    if len(monitors) > 0:
-                         virtual_screen = monitors[0] # Индекс 0 - это весь виртуальный экран
-                         w_scr, h_scr = virtual_screen["width"], virtual_screen["height"]
-                         # Проверяем, что область не выходит за границы виртуального экрана
-                         is_within_bounds = (
-                             sa["left"] >= virtual_screen["left"]
-                             and sa["top"] >= virtual_screen["top"]
-                             and sa["left"] + sa["width"] <= virtual_screen["left"] + w_scr
-                             and sa["top"] + sa["height"] <= virtual_screen["top"] + h_scr
-                         )
-
-                         if is_within_bounds:
-                            self.scan_area_coords = sa.copy()
-                            coords_ok = True
-                            logger.info(
-                                f"[Worker] Используется SCAN_AREA из констант: "
-                                f"{self.scan_area_coords}"
-                            )
-                         else:
-                            logger.error(
-                                f"[Worker] SCAN_AREA {sa} выходит за границы виртуального экрана ({virtual_screen}). Игнорируется."
-                            )
-                    else:
-                         logger.error("[Worker] MSS не обнаружил ни одного монитора, невозможно проверить SCAN_AREA.")
+    @property
+    def stage_runner(self) -> StageRunner:
+        return self.engine.stage_runner
 
+    @property
+    def session_active(self) -> bool:
+        return self.engine.session_active
 
-                else:
-                    logger.error(
-                        f"[Worker] SCAN_AREA невалидна (не int или нулевые размеры): {sa}. Игнорируется."
-                    )
-            except Exception:
-                logger.exception(
-                    f"[Worker] Ошибка валидации или получения размеров виртуального экрана для SCAN_AREA:"
-                )
+    # --- Команды (потокобезопасны) ---
 
-        # 2. Если SCAN_AREA невалидна или не задана, используем основной монитор MSS
-        if not coords_ok:
-            try:
-                monitors = self.sct.monitors # monitors[0] - виртуальный десктоп, monitors[1+] - физ.мониторы
-                if len(monitors) > 1:
-                    # MSS часто имеет монитор 1 как основной физический
-                    info = monitors[1]
-                    logger.info(
-                        f"[Worker] SCAN_AREA не задана/невалидна. Используется основной физический монитор: {info}"
-                    )
-                elif len(monitors) == 1:
-                    # Если только один монитор, он может быть как monitors[0] (виртуальный == физический)
-                    # или как monitors[1] с monitors[0] как псевдо-виртуальным
-                    # Проверим monitors[0] как возможный единственный физический
-                    info = monitors[0]
-                    logger.info(
-                        f"[Worker] SCAN_AREA не задана/невалидна. Используется единственный монитор (monitors[0]): {info}"
-                    )
-                else:
-                    logger.error(
-                        f"[Worker] MSS не обнаружил мониторов! Невозможно определить область сканирования."
-                    )
-                    return False # Не удалось определить область
-
-                # Удаляем ненужные ключи типа 'scale', 'retina'
-                info.pop("scale", None)
-                info.pop("retina", None)
-                self.scan_area_coords = info.copy()
-                coords_ok = True
-                logger.info(f"[Worker] Область сканирования определена как: {self.scan_area_coords}")
+    def post_command(self, command: str, payload=None, session_id=None):
+        self.engine.post_command(command, payload, session_id)
 
-            except Exception:
-                logger.exception(f"[Worker] КРИТИЧЕСКАЯ ошибка при попытке получить информацию о мониторах из MSS:")
-                coords_ok = False # Снова ошибка
+    def request_stop(self) -> bool:
+        return self.engine.request_stop()
 
-        if not coords_ok:
-            logger.error(
-                f"[Worker] Не удалось определить область сканирования!"
-                f" Проверьте SCAN_AREA в constants.py или настройки мониторов."
-            )
-        return coords_ok
+    def post_item_delta(self, kind: str, data):
+        self.engine.post_item_delta(kind, data)
 
     @pyqtSlot()
-    def run(self):
-        """
-        Основной цикл работы Worker'а.
-        Захват экрана, поиск шаблонов, проверка цен, выполнение действий.
-        Выполняется в отдельном QThread.
-        """
-        # Устанавливаем имя потока здесь, т.к. run() вызывается уже в созданном потоке QThread
-        threading.current_thread().name = f"WorkerThread_{id(self)}"
-        self.worker_id = threading.current_thread().name
-
-        self._stop_event.clear() # Сбрасываем флаг остановки перед началом
-        self.all_targets_reached = False # Сбрасываем флаг достижения цели
-        logger.info(f"[{self.worker_id}] >>> Worker запущен. Начало основного цикла поиска.")
-
-        # Проверка наличия товаров для поиска
-        if not self.items_data:
-            logger.warning(f"[{self.worker_id}] Нет товаров для поиска. Завершение Worker.")
-            self.finished.emit(False) # Завершаем без достижения цели
-            return
+    def serve(self):
+        """Слот запуска потока: цикл команд движка до CMD_SHUTDOWN."""
+        self.engine.serve()
 
-        # Инициализация MSS
-        try:
-            if not self._is_running:
-                raise SystemExit("Остановка до инициализации MSS")
-            self.sct = mss.mss()
-            logger.info(f"[{self.worker_id}] MSS инициализирован для Worker'а.")
-            if not self._is_running:
-                raise SystemExit("Остановка после инициализации MSS")
-        except Exception:
-            logger.exception(f"[{self.worker_id}] КРИТИЧЕСКАЯ ошибка инициализации MSS:")
-            self.error.emit("Ошибка инициализации захвата экрана (MSS).")
-            self.finished.emit(False) # Завершаем с ошибкой
-            return
-
-        # Определение области сканирования
-        if not self._get_screen_area_for_scan():
-            logger.error(f"[{self.worker_id}] Не удалось определить область сканирования. Завершение Worker.")
-            self.error.emit("Не удалось определить область сканирования.")
-            try:
-                self.sct.close() # Пытаемся закрыть MSS при ошибке
-            except Exception:
-                pass
-            self.sct = None
-            self.finished.emit(False) # Завершаем с ошибкой
-            return
-
-        # Инициализация времени последнего обновления
-        self.last_refresh_time = time.monotonic()
-        logger.info(f"[{self.worker_id}] Основной цикл поиска запущен.")
-
-        try:
-            # --- ОСНОВНОЙ ЦИКЛ ПОИСКА ---
-            while self._is_running:
-                # Очень частая проверка флага остановки в начале каждой итерации
-                if not self._is_running:
-                    break
-
-                action_taken_this_loop = False # Флаг, было ли выполнено действие в этой итерации
-                items_processed_this_loop = set() # Множество имен товаров, которые уже обработали в этом скане
-
-                try:
-                    # --- 1. Захват экрана ---
-                    if not self._is_running:
-                        break
-                    # Убедимся, что sct не None перед использованием
-                    if self.sct is None or self.scan_area_coords is None:
-                         logger.error(f"[{self.worker_id}] Ресурсы захвата экрана недоступны в цикле.")
-                         if not self._sleep_interruptible(1.0):
-                             break # Пауза перед повторной попыткой
-                         continue # Пропускаем текущую итерацию
-                    try:
-                        img_grab = self.sct.grab(self.scan_area_coords)
-                        if not self._is_running:
-                            break
-                    except mss.ScreenShotError as e:
-                        logger.warning(f"[{self.worker_id}] Ошибка захвата экрана MSS: {e}. Пауза 1с.")
-                        if not self._sleep_interruptible(1.0):
-                            break
-                        continue # Пропускаем текущую итерацию при ошибке захвата
-                    except Exception as e:
-                        logger.exception(f"[{self.worker_id}] Неожиданная ошибка при захвате экрана:")
-                        if not self._sleep_interruptible(1.0):
-                            break
-                        continue
-
-                    img_bgra = np.array(img_grab)
-
-                    # Проверка на пустой кадр
-                    if img_bgra.size == 0:
-                        logger.warning(f"[{self.worker_id}] Захвачен пустой кадр ({self.scan_area_coords}). Пауза 0.5с.")
-                        if not self._sleep_interruptible(0.5):
-                            break
-                        continue # Пропускаем текущую итерацию
-
-                    # Конвертация для OpenCV и OCR
-                    gray = cv2.cvtColor(img_bgra, cv2.COLOR_BGRA2GRAY)
-                    bgr = cv2.cvtColor(img_bgra, cv2.COLOR_BGRA2BGR) # BGR для сохранения ROI
-
-                    # --- 2. Итерация по активным товарам ---
-                    # Фильтруем только те товары, которые включены и еще не достигли цели
-                    active_items = [
-                        item for item in self.items_data
-                        if item.get("name") in self.item_progress # Проверка наличия в прогрессе
-                        and item.get("enabled", False) # Проверка, что товар включен
-                        and self.item_progress[item["name"]]["bought"]
-                        < self.item_progress[item["name"]]["target"] # Проверка, что цель не достигнута
-                    ]
-
-                    if not active_items and self.item_progress:
-                         # Если нет активных товаров, но есть товары в списке, возможно,
-                         # все цели достигнуты или все отключены.
-                         # Проверим, все ли цели достигнуты.
-                         all_done_check = all(
-                             p["bought"] >= p["target"]
-                             for p in self.item_progress.values()
-                         )
-                         if all_done_check and self.item_progress:
-                              logger.info(f"[{self.worker_id}] Все цели достигнуты. Завершение Worker.")
-                              self.all_targets_reached = True
-                              self.stop()
-                              break # Устанавливаем флаг и останавливаем
-
-                         # Если не все цели достигнуты (значит, часть отключена или нет шаблона),
-                         # просто продолжаем цикл (возможно, пользователь включит товар позже)
-                         # Если нет активных, просто ждем следующей итерации или обновления
-
-                    for item_data in active_items:
-                        if not self._is_running:
-                            break # Проверка остановки перед обработкой каждого товара
-
-                        name = item_data.get("name")
-                        tmpl = self.templates.get(name) # Получаем шаблон из загруженных
-                        target_price = item_data.get("max_price", DEFAULT_ITEM_MAX_PRICE) # Макс. цена из данных
-                        current_progress = self.item_progress.get(name) # Прогресс по этому товару
-
-                        # Проверки на корректность данных товара и шаблона
-                        if tmpl is None or current_progress is None or name in items_processed_this_loop:
-                            continue # Пропускаем, если нет шаблона/прогресса или уже обработали в этом скане
-
-                        h, w = tmpl.shape[:2]
-                        if w == 0 or h == 0:
-                            logger.warning(f"[{self.worker_id}] Шаблон '{name}' имеет нулевые размеры. Пропуск.")
-                            continue
-
-                        # --- 3. Поиск шаблона ---
-                        if not self._is_running:
-                            break
-                        try:
-                            # Выполняем поиск шаблона по серому изображению области сканирования
-                            res = cv2.matchTemplate(
-                                gray, tmpl, cv2.TM_CCOEFF_NORMED
-                            )
-                            if not self._is_running:
-                                break
-
-                            # Находим лучшее совпадение
-                            _, max_val, _, max_loc = cv2.minMaxLoc(res)
-                            if not self._is_running:
-                                break
-
-                        except cv2.error as e:
-                            logger.error(f"[{self.worker_id}] Ошибка cv2.matchTemplate для '{name}': {e}")
-                            continue # Пропускаем товар при ошибке CV
-                        except Exception:
-                            logger.exception(f"[{self.worker_id}] Неожиданная ошибка при поиске шаблона для '{name}':")
-                            continue
-
-                        # --- 4. Обработка найденного совпадения ---
-                        if max_val >= TEMPLATE_MATCH_THRESHOLD:
-                            # Шаблон найден с достаточной уверенностью
-                            logger.info(f"[{self.worker_id}] Шаблон '{name}' найден с уверенностью {max_val:.2f} на {max_loc}.")
-
-                            # Координаты верхнего левого угла НАЙДЕННОГО шаблона на СКРИНШОТЕ области сканирования
-                            template_x_in_scan = max_loc[0]
-                            template_y_in_scan = max_loc[1]
-                            template_w_in_scan = w
-                            template_h_in_scan = h
-
-
-                            # Координаты верхнего левого угла НАЙДЕННОГО шаблона на ВСЕМ ЭКРАНЕ
-                            template_x_global = self.scan_area_coords["left"] + template_x_in_scan
-                            template_y_global = self.scan_area_coords["top"] + template_y_in_scan
-
-                            # Bounding box найденного шаблона в ГЛОБАЛЬНЫХ координатах
-                            template_bbox_global = {
-                                "left": template_x_global,
-                                "top": template_y_global,
-                                "width": template_w_in_scan,
-                                "height": template_h_in_scan
-                            }
-
-                            items_processed_this_loop.add(name) # Помечаем товар как обработанный в этом скане
-
-                            if not self._is_running:
-                                break
-
-                            # --- 5. Поиск и проверка цены в области ---
-                            price, price_ok = self._find_and_check_price(
-                                template_bbox_global,       # Глобальные коорд. бокса названия
-                                (template_x_in_scan, template_y_in_scan, template_w_in_scan, template_h_in_scan), # Коорд/размер бокса названия в скане
-                                item_data,                  # Данные товара
-                                bgr                         # BGR изображение области сканирования
-                            )
-                            if not self._is_running:
-                                break
-
-                            # --- 6. Выполнение действия ---
-                            if price_ok:
-                                logger.info(f"[{self.worker_id}] Цена {price}$ для '{name}' ({current_progress['bought']}/{current_progress['target']}) соответствует условию ({target_price if target_price > 0 else 'Любая'}$)")
-                                if not self._is_running:
-                                    break
-                                # Выполняем клик и Esc
-                                success = self._perform_item_action(
-                                    template_bbox_global, item_data, price
-                                )
-                                if not self._is_running:
-                                    break
-
-                                if success:
-                                    action_taken_this_loop = True # Флаг, что действие было выполнено
-                                    # Пауза после действия, чтобы игра успела отреагировать
-                                    if not self._sleep_interruptible(
-                                        POST_ACTION_PAUSE
-                                    ):
-                                        break # Если пауза прервана, выходим из цикла worker
-
-                            else:
-                                 if target_price > 0 and price is not None:
-                                     logger.info(f"[{self.worker_id}] Цена {price}$ для '{name}' ВЫШЕ лимита {target_price}$. Действие не выполнено.")
-                                 elif price is None:
-                                      logger.warning(f"[{self.worker_id}] Не удалось найти/распознать валидную цену для '{name}'. Действие не выполнено.")
-                                 # Действие не выполнено, продолжаем поиск или ждем следующей итерации
-
-                        # --- Конец обработки найденного совпадения для товара ---
-                        if not self._is_running:
-                            break # Еще одна проверка перед следующим товаром
-
-
-                    # --- Конец итерации по всем активным товарам ---
-                    if not self._is_running:
-                        break
-
-                    # --- 7. Проверка достижения ВСЕХ целей ---
-                    # Проверяем только если есть товары в item_progress (т.е. не пустой список)
-                    all_done = (
-                        all(
-                            p["bought"] >= p["target"]
-                            for p in self.item_progress.values()
-                        ) if self.item_progress else False
-                    )
-                    if all_done:
-                        logger.info(f"[{self.worker_id}] !!! ВСЕ ЦЕЛИ ДЛЯ АКТИВНЫХ ТОВАРОВ ДОСТИГНУТЫ !!! Остановка Worker.")
-                        self.all_targets_reached = True
-                        self.stop()
-                        break # Устанавливаем флаг и останавливаем Worker
-
-                    if not self._is_running:
-                        break # Финальная проверка перед паузой/обновлением
-
-                    # --- 8. Обновление списка в игре или пауза ---
-                    now = time.monotonic()
-                    # Если не было выполнено ни одного действия в этом цикле сканирования
-                    # И прошло достаточно времени с последнего обновления
-                    needs_refresh = (
-                        not action_taken_this_loop
-                        and (REFRESH_BUTTON_X is not None and REFRESH_BUTTON_Y is not None) # Только если кнопка Обновить задана
-                        and (now - self.last_refresh_time > MIN_REFRESH_INTERVAL)
-                    )
-
-                    if needs_refresh:
-                        if not self._is_running:
-                            break
-                        logger.info(f"[{self.worker_id}] Ничего не найдено/куплено за долгий период. Попытка обновить список в игре.")
-                        self._try_refresh_list() # Кликаем по кнопке Обновить
-                        if not self._is_running:
-                            break
-                        # Пауза после клика "Обновить", чтобы список успел прогрузиться
-                        if not self._sleep_interruptible(REFRESH_PAUSE):
-                            break
-                    elif not action_taken_this_loop: # Пауза, только если не было действия и не было обновления
-                         # Делаем короткую паузу для снижения нагрузки на CPU
-                         if not self._sleep_interruptible(WORKER_LOOP_PAUSE):
-                             break
-
-
-                # --- Обработка исключений внутри цикла ---
-                # Эти исключения не должны приводить к краху всего Worker'а,
-                # только к пропуску текущей итерации цикла while.
-                except mss.ScreenShotError as e:
-                    logger.warning(f"[{self.worker_id}] MSS grab Error в цикле: {e}. Пауза 1с.")
-                    if not self._sleep_interruptible(1.0):
-                        break
-                except cv2.error as e:
-                    logger.error(f"[{self.worker_id}] OpenCV Error в цикле: {e}. Пауза 0.5с.")
-                    if not self._sleep_interruptible(0.5):
-                        break
-                except SystemExit as e:
-                    # Перехват SystemExit, если где-то в коде он вызван
-                    logger.info(f"[{self.worker_id}] Получен SystemExit: {e}. Завершение Worker.")
-                    self.stop()
-                    break # Останавливаем Worker
-                except Exception:
-                    # Ловим все остальные неожиданные ошибки в цикле
-                    logger.exception(f"[{self.worker_id}] КРИТИЧЕСКАЯ НЕОЖИДАННАЯ ошибка в основном цикле поиска:")
-                    # При критической ошибке в цикле, возможно, лучше остановиться
-                    self.error.emit(f"Критическая ошибка в цикле поиска: {sys.exc_info()[0].__name__}")
-                    self.stop()
-                    break # Останавливаем Worker
-
-            # --- Конец основного цикла while ---
-            log_status = (
-                f"Worker завершает работу. "
-                f"is_running={self._is_running}, "
-                f"all_targets_reached={self.all_targets_reached}"
-            )
-            logger.info(log_status)
-        finally:
-            # --- Очистка ресурсов Worker'а ---
-            logger.info(f"[{self.worker_id}] Начинается очистка ресурсов Worker'а...")
-            if self.sct:
-                try:
-                    self.sct.close()
-                    logger.info(f"[{self.worker_id}] MSS закрыт.")
-                except Exception as e:
-                     logger.error(f"[{self.worker_id}] Ошибка при закрытии MSS: {e}")
-                self.sct = None
-
-            # easyocr reader передается извне, его здесь не удаляем/закрываем.
-            self.ocr_reader = None # Очищаем ссылку
-
-            logger.info(f"[{self.worker_id}] Очистка ресурсов Worker'а завершена.")
-            logger.info(f"[{self.worker_id}] Worker завершил работу. Отправка finished({self.all_targets_reached}).")
-            # Отправляем сигнал finished в основной поток
-            self.finished.emit(self.all_targets_reached)
-
-    def _sleep_interruptible(self, duration_sec: float) -> bool:
-        """
-        Выполняет паузу, которая может быть прервана флагом остановки Worker'а.
-        Возвращает True, если пауза завершилась без прерывания, False если была прервана.
-        """
-        if not self._is_running: return False # Если уже запрошена остановка, не спим
-        if duration_sec <= 0: return True # Пауза 0 или меньше - мгновенно, не прерываема
-
-        # Ожидаем события остановки, но с таймаутом duration_sec
-        interrupted = self._stop_event.wait(timeout=duration_sec)
-
-        # interrupted == True, если событие было установлено в течение таймаута
-        # interrupted == False, если таймаут истек
-        # Возвращаем True, если пауза завершилась БЕЗ прерывания, и Worker still should be running
-        return not interrupted and self._is_running
-
-
-    def _try_refresh_list(self):
-        """
-        Пытается кликнуть по координатам кнопки 'Обновить'.
-        Проверяет флаг остановки перед выполнением действий pyautogui.
-        """
-        # Проверяем, заданы ли координаты кнопки Обновить
-        if REFRESH_BUTTON_X is None or REFRESH_BUTTON_Y is None:
-            # logger.debug(f"[{self.worker_id}] Координаты кнопки Обновить не заданы. Пропуск обновления.")
-            return # Нечего делать, если координаты не заданы
-
-        # Проверяем флаг остановки перед началом действия
-        if not self._is_running:
-            logger.info(f"[{self.worker_id}] Обновление отменено, запрошена остановка.")
-            return
-
-        try:
-            # Используем глобальную блокировку для pyautogui
-            with input_lock:
-                if not self._is_running:
-                    return # Повторная проверка после получения блокировки
-                logger.info(f"[{self.worker_id}] Клик по кнопке 'Обновить' ({REFRESH_BUTTON_X},{REFRESH_BUTTON_Y}).")
-                pyautogui.click(REFRESH_BUTTON_X, REFRESH_BUTTON_Y)
-                if not self._is_running:
-                    return # Повторная проверка после клика
-
-            # Обновляем время последнего обновления только при успешном клике
-            self.last_refresh_time = time.monotonic()
-
-        except pyautogui.FailSafeException:
-             # pyautogui.FailSafeException может возникнуть, если курсор мыши
-             # перемещен в угол экрана (защита pyautogui).
-             logger.warning(f"[{self.worker_id}] pyAutoGUI FailSafe сработал при клике 'Обновить'. Пауза 1с.")
-             # При FailSafe лучше остановиться или сделать большую паузу
-             if not self._sleep_interruptible(1.0):
-                 return # Проверка остановки после паузы
-
-        except Exception:
-            logger.exception(f"[{self.worker_id}] Ошибка при клике по кнопке 'Обновить':")
-            # При ошибке клика делаем небольшую паузу
-            if not self._sleep_interruptible(0.5):
-                return
-
-
-    def _find_and_check_price(
-        self,
-        item_bbox_global: dict, # Глобальные координаты bbox названия
-        template_bbox_in_scan: tuple[int, int, int, int], # Коорд/размер bbox названия в scan_area
-        item_data: dict,
-        screen_bgr_scan_area: np.ndarray # BGR изображение области сканирования
-    ) -> tuple[int | None, bool]:
-        """
-        Находит и распознает цену в области рядом с названием.
-        Использует OCR с детализацией и фильтрацию блоков по положению и содержанию.
-        """
-        if not self._is_running: return None, False
-
-        name = item_data.get("name", "N/A")
-        target_price = item_data.get("max_price", DEFAULT_ITEM_MAX_PRICE)
-
-        price = None
-        price_ok = False
-        price_search_roi_bgr = None # Область поиска цены для OCR
-
-        try:
-            # --- 1. Определяем область поиска цены ОТНОСИТЕЛЬНО НАЙДЕННОГО названия ---
-            # Используем константу PRICE_SEARCH_RELATIVE_AREA = (X_OFFSET_REL, Y_OFFSET_REL, WIDTH, HEIGHT)
-            rel_offset_x, rel_offset_y, search_width, search_height = PRICE_SEARCH_RELATIVE_AREA
-
-            # Координаты верхнего левого угла НАЙДЕННОГО названия в scan_area
-            template_x_in_scan, template_y_in_scan, template_w_in_scan, template_h_in_scan = template_bbox_in_scan
-
-            # Координаты верхнего левого угла области поиска цены ВНУТРИ screen_bgr_scan_area
-            # Смещение относительно ВЕРХНЕ-ЛЕВОГО угла НАЙДЕННОГО НАЗВАНИЯ
-            price_search_x_in_scan = template_x_in_scan + rel_offset_x
-            price_search_y_in_scan = template_y_in_scan + rel_offset_y
-
-
-            # Размеры захваченного изображения области сканирования
-            scan_h, scan_w = screen_bgr_scan_area.shape[:2]
-
-            # Обрезаем область поиска по границам захваченной области сканирования
-            roi_left = max(0, price_search_x_in_scan)
-            roi_top = max(0, price_search_y_in_scan)
-
-            # Координаты нижнего правого угла области поиска (до обрезки)
-            price_search_right_in_scan = price_search_x_in_scan + search_width
-            price_search_bottom_in_scan = price_search_y_in_scan + search_height
-
-            roi_right = min(scan_w, price_search_right_in_scan)
-            roi_bottom = min(scan_h, price_search_bottom_in_scan)
-
-            # Проверяем валидность обрезанной области
-            if roi_right <= roi_left or roi_bottom <= roi_top:
-                logger.error(f"[{self.worker_id}] Расчетная область ПОИСКА цены для '{name}' невалидна после обрезки ({roi_left},{roi_top},{roi_right-roi_left},{roi_bottom-roi_top}).")
-                # Отладочное сохранение даже пустой области, если DEBUG_SAVE_PRICE_ROI=True
-                if DEBUG_SAVE_PRICE_ROI:
-                     try:
-                         dummy_img = np.zeros((10, 10, 3), dtype=np.uint8) # Маленькое черное изображение
-                         cv2.imwrite(ABS_DEBUG_PRICE_ROI_PATH, dummy_img)
-                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Debug ROI (пустая область) сохранен: {ABS_DEBUG_PRICE_ROI_PATH}")
-                     except Exception as e:
-                         logger.error(f"[{self.worker_id}] Не удалось сохранить debug ROI (пустая область): {e}")
-                return None, False
-
-            # Вырезаем область поиска из захваченного BGR изображения области сканирования
-            price_search_roi_bgr = screen_bgr_scan_area[roi_top:roi_bottom, roi_left:roi_right]
-
-            # Повторная проверка на пустую область после вырезки
-            if price_search_roi_bgr.size == 0:
-                logger.warning(f"[{self.worker_id}] Пустая область ПОИСКА цены вырезана для '{name}'.")
-                if DEBUG_SAVE_PRICE_ROI:
-                     try:
-                         dummy_img = np.zeros((10, 10, 3), dtype=np.uint8)
-                         cv2.imwrite(ABS_DEBUG_PRICE_ROI_PATH, dummy_img)
-                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Debug ROI (пустая вырезка) сохранен: {ABS_DEBUG_PRICE_ROI_PATH}")
-                     except Exception as e:
-                         logger.error(f"[{self.worker_id}] Не удалось сохранить debug ROI (пустая вырезка): {e}")
-                return None, False
-
-            # --- Отладка: Сохранение ОБЛАСТИ ПОИСКА цены ---
-            if DEBUG_SAVE_PRICE_ROI:
-                try:
-                    # Глобальные координаты верхнего левого угла области поиска цены
-                    price_search_x_global = self.scan_area_coords["left"] + roi_left
-                    price_search_y_global = self.scan_area_coords["top"] + roi_top
-                    logger.info(
-                        f"[{self.worker_id}] [Цена '{name}'] Debug ПОИСКОВАЯ область рассчитана: "
-                        f"Глобальные ({price_search_x_global},{price_search_y_global}), "
-                        f"Размер ({price_search_roi_bgr.shape[1]}x{price_search_roi_bgr.shape[0]})."
-                    )
-                    cv2.imwrite(ABS_DEBUG_PRICE_ROI_PATH, price_search_roi_bgr)
-                    logger.info(f"[{self.worker_id}] [Цена '{name}'] Debug ПОИСКОВАЯ область сохранена: {ABS_DEBUG_PRICE_ROI_PATH}")
-                except Exception as e:
-                    logger.error(f"[{self.worker_id}] Не удалось сохранить debug ПОИСКОВУЮ область цены в {ABS_DEBUG_PRICE_ROI_PATH}: {e}")
-
-        except Exception:
-            logger.exception(f"[{self.worker_id}] Ошибка расчета/вырезки области ПОИСКА цены для '{name}':")
-            return None, False
-
-        # --- OCR: Распознавание текста в ОБЛАСТИ ПОИСКА цены (с детализацией) ---
-        try:
-            if not self._is_running:
-                logger.info(f"[{self.worker_id}] Остановка Worker'а запрошена перед OCR области поиска цены для '{name}'.")
-                return None, False
-
-            logger.info(f"[{self.worker_id}] Запуск OCR на области ПОИСКА цены ({price_search_roi_bgr.shape[1]}x{price_search_roi_bgr.shape[0]}px, detail=1)...")
-            # detail=1 возвращает (bbox, text, confidence)
-            ocr_results_detail = self.ocr_reader.readtext(
-                price_search_roi_bgr,
-                allowlist=OCR_PRICE_ALLOWLIST,
-                detail=1 # Получаем детализацию
-            )
-            logger.info(f"[{self.worker_id}] OCR области ПОИСКА завершен. Результатов: {len(ocr_results_detail)}")
-            # Логируем все найденные блоки для отладки
-            if ocr_results_detail:
-                for i, (bbox, text, confidence) in enumerate(ocr_results_detail):
-                    logger.debug(f"[{self.worker_id}]   OCR Block {i}: Text='{text}', Confidence={confidence:.2f}, Bbox={bbox}")
-
-
-            if not self._is_running: return None, False
-
-            best_price_candidate = None # (cleaned_text, confidence, bbox_in_search_roi)
-
-            # --- 2. Ищем блок, похожий на цену, среди результатов OCR ---
-            # Итерируем в обратном порядке, чтобы найти цену, которая обычно справа
-            # Сортируем блоки по координате X верхнего левого угла (по убыванию)
-            # Это позволяет обрабатывать блоки справа налево
-            sorted_ocr_results = sorted(ocr_results_detail, key=lambda x: x[0][0][0], reverse=True)
-
-            for (bbox_in_search_roi, text, confidence) in sorted_ocr_results:
-                # Проверяем уверенность OCR для этого блока
-                if confidence < PRICE_OCR_CONFIDENCE_THRESHOLD:
-                   # logger.debug(f"[{self.worker_id}] Блок '{text}' имеет низкую уверенность {confidence:.2f}. Пропуск.")
-                   continue # Пропускаем блоки с низкой уверенностью
-
-                # Проверяем, похож ли текст блока на цену (содержит цифры и разрешенные символы)
-                cleaned_text = self._extract_price_digits_only(text) # Используем доработанную логику для чистки и проверки *только* цифр
-                if not cleaned_text:
-                    # logger.debug(f"[{self.worker_id}] Блок '{text}' после чистки '{cleaned_text}' не содержит только цифр. Пропуск.")
-                    continue # Пропускаем блоки, которые не являются чистыми числами
-
-                # !!! Дополнительная проверка положения блока ОТНОСИТЕЛЬНО НАЙДЕННОГО НАЗВАНИЯ !!!
-                # Координаты верхнего левого угла блока относительно *начала СКАНА*
-                block_x_in_scan = roi_left + int(bbox_in_search_roi[0][0])
-                block_y_in_scan = roi_top + int(bbox_in_search_roi[0][1])
-                # Координаты нижнего правого угла блока относительно *начала СКАНА*
-                # block_right_in_scan = roi_left + int(bbox_in_search_roi[2][0])
-                # block_bottom_in_scan = roi_top + int(bbox_in_search_roi[2][1])
-
-                # Проверяем горизонтальное положение: Левый край блока цены должен быть правее
-                # левого края названия + минимальный отступ.
-                if block_x_in_scan < template_x_in_scan + PRICE_MIN_HORIZONTAL_OFFSET_FROM_TEMPLATE_LEFT:
-                    # logger.debug(f"[{self.worker_id}] Блок '{text}' (X={block_x_in_scan}) находится слишком ЛЕВЕЕ ({template_x_in_scan + PRICE_MIN_HORIZONTAL_OFFSET_FROM_TEMPLATE_LEFT}) названия. Пропуск.")
-                    continue # Блок слишком далеко слева
-
-                # Проверяем вертикальное положение: Верхний край блока цены должен находиться
-                # в заданном диапазоне относительно НИЖНЕГО края названия.
-                template_bottom_y_in_scan = template_y_in_scan + template_h_in_scan
-
-                if not (block_y_in_scan >= template_bottom_y_in_scan + PRICE_MIN_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM and
-                        block_y_in_scan <= template_bottom_y_in_scan + PRICE_MAX_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM):
-                     # logger.debug(f"[{self.worker_id}] Блок '{text}' (Y={block_y_in_scan}) находится вне ожидаемого вертикального диапазона ({template_bottom_y_in_scan + PRICE_MIN_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM}-{template_bottom_y_in_scan + PRICE_MAX_VERTICAL_OFFSET_FROM_TEMPLATE_BOTTOM}) относительно низа названия. Пропуск.")
-                     continue # Блок не на ожидаемой строке цены
-
-
-                # Если блок прошел все проверки (уверенность, текст, положение)
-                # Считаем его валидным кандидатом. Так как мы итерируем справа налево,
-                # первый найденный валидный блок, вероятно, и есть цена.
-                # Выбираем этот блок как лучший и останавливаем поиск кандидатов.
-                best_price_candidate = (cleaned_text, confidence, bbox_in_search_roi)
-                logger.debug(f"[{self.worker_id}] Найден первый подходящий кандидат цены (справа): '{cleaned_text}' with confidence {confidence:.2f}")
-                break # Выходим из цикла поиска кандидатов
-
-
-            # --- 3. Если кандидат на цену найден ---
-            if best_price_candidate:
-                price_str, confidence, bbox_in_search_roi = best_price_candidate
-                logger.info(f"[{self.worker_id}] [Цена '{name}'] Выбран лучший кандидат: '{price_str}' with confidence {confidence:.2f}")
-
-                try:
-                    price = int(price_str)
-                    logger.info(f"[{self.worker_id}] [Цена '{name}'] Конвертировано в int: {price}$.")
-                    price_ok = (target_price <= 0) or (price <= target_price)
-
-                    if target_price > 0:
-                         log_check = f"({price}$ <= {target_price}$)"
-                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Условие цены ({target_price}$): {log_check} -> {price_ok}")
-                    else:
-                         logger.info(f"[{self.worker_id}] [Цена '{name}'] Условие цены (Любая): Всегда True -> {price_ok}")
-
-                    if not price_ok and target_price > 0:
-                         logger.info(f"[{self.worker_id}] Цена ВЫШЕ лимита для '{name}': {price}$ > {target_price}$.")
-
-                    return price, price_ok # Возвращаем найденную цену и результат проверки
-
-                except ValueError:
-                    logger.error(f"[{self.worker_id}] Ошибка конвертации лучшего кандидата '{price_str}' в int для '{name}'.")
-                    return None, False
-
-            else:
-                # Ни один блок не прошел проверку на кандидата цены
-                logger.warning(f"[{self.worker_id}] Не найдено блоков, похожих на цену и соответствующих положению, в области поиска для '{name}'.")
-                # Опционально можно логировать все результаты OCR здесь, если не логируются выше
-                # logger.debug(f"[{self.worker_id}] Все OCR результаты в области поиска: {ocr_results_detail}")
-                return None, False
-
-        except Exception:
-            logger.exception(f"[{self.worker_id}] Неожиданная ошибка при OCR/поиске блока цены для '{name}':")
-            return None, False
-
-    # Новая версия функции для извлечения *только* цифр и проверки, что нет других символов
-    def _extract_price_digits_only(self, text: str) -> str:
-        """
-        Очищает строку от разрешенных нецифровых символов ($, пробелы, запятые)
-        и возвращает строку цифр, только если после чистки остаются ТОЛЬКО цифры.
-        Возвращает пустую строку, если есть другие символы.
-        """
-        if not isinstance(text, str):
-            return ""
-
-        # Удаляем только разрешенные нецифровые символы
-        cleaned_text = text.strip().replace("$", "").replace(" ", "").replace(",", "")
-
-        # Проверяем, что после удаления разрешенных символов осталась строка, состоящая ТОЛЬКО из цифр
-        if cleaned_text.isdigit():
-            return cleaned_text
-        else:
-            return "" # Возвращаем пустую строку, если были другие символы или пусто
-
-
-    def _perform_item_action(
-        self,
-        item_bbox_global: dict, # Глобальные координаты bbox найденного шаблона
-        item_data: dict, # Данные товара
-        price: int # Распознанная цена
-    ) -> bool:
-        """
-        Выполняет действие: клик левой кнопкой мыши по центру найденного элемента,
-        затем нажатие клавиши Esc.
-        Обновляет прогресс товара и отправляет сигнал.
-
-        Возвращает True, если действие выполнено успешно до конца, False иначе
-        (например, если Worker остановлен во время выполнения действия).
-        """
-        if not self._is_running:
-            logger.warning(f"[{self.worker_id}] Действие для '{item_data.get('name','N/A')}' отменено, запрошена остановка.")
-            return False # Не выполняем действие, если Worker останавливается
-
-        name = item_data.get("name", "N/A")
-        prog = self.item_progress.get(name)
+    @pyqtSlot()
+    def stop(self):
+        """Устанавливает флаг остановки текущего сеанса поиска."""
+        self.engine.stop()
 
-        # Проверка, что прогресс отслеживается и цель еще не достигнута
-        if not prog or prog["bought"] >= prog["target"]:
-            logger.warning(f"[{self.worker_id}] Действие для '{name}' отменено: прогресс не отслеживается или цель уже достигнута.")
-            return False
 
-        try:
-            # Рассчитываем центр найденного bounding box'а шаблона (глобальные координаты)
-            center_x = item_bbox_global["left"] + item_bbox_global["width"] // 2
-            center_y = item_bbox_global["top"] + item_bbox_global["height"] // 2
+# ============================================================================
+# === Класс ResourceLoader: Фоновая загрузка OCR ===
+# ============================================================================
+class ResourceLoader(QObject):
+    """
+    Импортирует тяжелые библиотеки, создает EasyOCR Reader и выполняет прогрев
+    в отдельном потоке, чтобы главное окно появлялось сразу после запуска.
+    """
 
-            # Опционально: Проверка, что координаты центра находятся в пределах экрана
-            # (pyautogui может работать и с координатами вне экрана, но это хорошая проверка)
-            # w_scr, h_scr = pyautogui.size() # Получение размера экрана может быть медленным
-            # if not (0 <= center_x < w_scr and 0 <= center_y < h_scr):
-            #     logger.error(f"[{self.worker_id}] Рассчитанные координаты ЦЕНТРА ({center_x},{center_y}) для '{name}' вне пределов экрана. Пропуск действия.")
-            #     return False
+    progress = pyqtSignal(str) # Текст этапа загрузки для строки статуса
+    finished = pyqtSignal(object) # easyocr.Reader или None при ошибке
 
-        except Exception:
-            logger.exception(f"[{self.worker_id}] Ошибка расчета центра для действия с '{name}':")
-            return False # Ошибка при расчете координат
+    def __init__(self, perf_profile: dict, parent=None):
+        super().__init__(parent)
+        self.perf_profile = perf_profile # Профиль производительности (потоки torch/OpenCV)
 
+    @pyqtSlot()
+    def run(self):
+        """Загружает модели EasyOCR. Всегда завершается сигналом finished."""
+        threading.current_thread().name = "ResourceLoaderThread"
+        reader = None
+        start_time = time.monotonic()
         try:
-            # Текущее количество до действия
-            current_bought = prog["bought"]
-            # Количество после успешного действия
-            next_bought_count = current_bought + 1
-            target_qty = prog["target"]
-
-            log_msg = (
-                f"[{self.worker_id}] !!! ВЫПОЛНЯЕТСЯ ДЕЙСТВИЕ для '{name}': "
-                f"Клик ЛКМ ({center_x},{center_y}) + Нажатие ESC. "
-                f"Цена: {price}$. Прогресс: {next_bought_count}/{target_qty}"
-            )
-            logger.info(log_msg)
-
-            # --- Выполнение клика и Esc с блокировкой ---
-            # Используем input_lock, чтобы другие потоки (если появятся)
-            # не пытались использовать pyautogui одновременно.
-            with input_lock:
-                # Проверка остановки ПЕРЕД кликом
-                if not self._is_running:
-                    logger.warning(f"[{self.worker_id}] Действие (Клик) для '{name}' отменено перед pyautogui.click, запрошена остановка.")
-                    return False
-
-                # Выполняем клик
-                # TODO: Проверить, может ли pyautogui.click быть прерван? Скорее всего, нет.
-                pyautogui.click(center_x, center_y)
-
-                # Проверка остановки ПОСЛЕ клика, ПЕРЕД Esc
-                if not self._is_running:
-                    logger.warning(f"[{self.worker_id}] Действие (Esc) для '{name}' отменено перед pyautogui.press('esc'), запрошена остановка.")
-                    return False
-
-                # Короткая пауза между кликом и Esc может быть полезна
-                # time.sleep(0.05)
-                # Проверка остановки ПОСЛЕ короткой паузы (если она есть)
-                if not self._is_running:
-                    logger.warning(f"[{self.worker_id}] Действие (Esc) для '{name}' отменено после паузы, запрошена остановка.")
-                    return False
-
-                # Выполняем нажатие Esc
-                # TODO: Проверить, может ли pyautogui.press быть прерван? Скорее всего, нет.
-                pyautogui.press("esc")
-
-                # Проверка остановки ПОСЛЕ Esc
-                if not self._is_running:
-                    logger.warning(f"[{self.worker_id}] Действие для '{name}' прервано после pyautogui.press('esc'), запрошена остановка.")
-                    return False
-
-            # Если мы дошли до этого места, значит клик и Esc были успешно вызваны (не обязательно выполнены игрой!)
-            # Обновляем счетчик купленного в прогрессе Worker'а
-            prog["bought"] = next_bought_count
-            logger.info(f"[{self.worker_id}] Прогресс для '{name}' обновлен: {prog['bought']}/{prog['target']}")
-
-            # Отправляем сигнал в основной поток об успешном действии
-            # Этот сигнал будет обработан в MainThread для обновления UI и звукового оповещения
-            self.action_performed_signal.emit(name, price, prog["bought"])
-            logger.info(f"[{self.worker_id}] Сигнал action_performed_signal({name}, {price}, {prog['bought']}) отправлен.")
-
-            return True # Действие успешно инициировано и прогресс обновлен
-
-        except pyautogui.FailSafeException:
-             logger.warning(f"[{self.worker_id}] pyAutoGUI FailSafe сработал при выполнении действия для '{name}'. Пауза 1с.")
-             # При FailSafe лучше остановиться или сделать большую паузу
-             if not self._sleep_interruptible(1.0):
-                 return False # Проверка остановки после паузы
-             return False # Действие не было завершено корректно
-
+            reader = load_ocr_reader(self.perf_profile, progress=self.progress.emit)
         except Exception:
-            # Логируем любую другую ошибку при выполнении действий pyautogui
-            logger.exception(f"[{self.worker_id}] Ошибка при выполнении действий (Клик+ESC) для '{name}':")
-            # При ошибке действия возвращаем False
-            return False
-
-    @pyqtSlot()
-    def stop(self):
-        """
-        Устанавливает флаг остановки Worker'а и запрашивает прерывание
-        потока Qt. Вызывается из основного потока.
-        """
-        # Проверяем, не установлен ли флаг уже
-        if not self._stop_event.is_set():
-            logger.info(f"[{threading.current_thread().name}] Worker.stop() вызван. Установка флага остановки и запрос прерывания потока...")
-            # Устанавливаем наше событие, которое используется в _sleep_interruptible
-            self._stop_event.set()
-
-            # Запрашиваем прерывание потока Qt.
-            # Это работает в сочетании с self._is_running, т.к. _is_running проверяет этот флаг.
-            qt_thread = QtCore.QThread.currentThread()
-            if qt_thread:
-                 # Убедимся, что мы не запрашиваем прерывание основного потока QApplication
-                 # Worker всегда должен выполняться в отдельном потоке.
-                 # Проверяем имя потока, чтобы исключить MainThread
-                 # Worker Thread ID должен быть отличен от MainThread ID
-                 if threading.current_thread().ident != qt_thread.ident: # Проверка на всякий случай
-                     if not qt_thread.isInterruptionRequested():
-                         qt_thread.requestInterruption()
-                         logger.info(f"[{threading.current_thread().name}] Запрос прерывания для QThread '{qt_thread.objectName() or 'N/A'}' отправлен.")
-                     else:
-                         logger.info(f"[{threading.current_thread().name}] QThread '{qt_thread.objectName() or 'N/A'}' уже имеет запрос на прерывание.")
-                 else:
-                     logger.error(f"[{threading.current_thread().name}] Попытка запросить прерывание для своего потока Worker!")
-            else:
-                 logger.warning(f"[{threading.current_thread().name}] Не удалось получить ссылку на QThread для запроса прерывания.")
-        else:
-             logger.info(f"[{threading.current_thread().name}] Worker.stop() вызван, но флаг остановки уже установлен.")
+            logger.exception("КРИТИЧЕСКАЯ ОШИБКА инициализации EasyOCR:")
+            reader = None
+        finally:
+            logger.info(f"Фоновая загрузка OCR завершена за {time.monotonic() - start_time:.2f}с (успех: {reader is not None}).")
+            self.finished.emit(reader)
 
 
 # ============================================================================
@@ -1231,17 +346,24 @@ class BotLogic(QObject):
     signal_update_item_list = pyqtSignal(list) # Обновить список товаров в GUI
     signal_action_performed = pyqtSignal(str, int, int) # name, price, total_bought (из Worker)
     signal_monitoring_stopped = pyqtSignal(bool) # bool: True если остановлен по достижению цели (из Worker)
+    signal_ocr_ready = pyqtSignal(bool) # bool: True если OCR загружен успешно (из ResourceLoader)
     # signal_init_error = pyqtSignal(str) # Сигнал об ошибке инициализации (оционально)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, startup_time: float | None = None):
         super().__init__(parent)
         # Устанавливаем имя основного потока для логов
         threading.current_thread().name = "MainThread"
         logger.info("Инициализация BotLogic...")
 
+        # Момент запуска приложения (time.monotonic()) для замеров времени старта
+        self.startup_time = startup_time if startup_time is not None else time.monotonic()
+        self._first_scan_logged = False # Время до первого скана логируется один раз
+        self._monitoring_start_time = None # Момент запуска текущего мониторинга
+
         # Состояние приложения
         self.monitoring_active = False
         self.is_selecting_area = False
+        self._session_id = 0 # Id последнего запущенного сеанса поиска (см. _handle_worker_finished)
 
         # Настройки
         self.ignore_rent = False # Игнорировать ли товары с названием "Аренда" (из constants или загружается)
@@ -1253,11 +375,38 @@ class BotLogic(QObject):
         # Ресурсы (инициализируются при запуске BotLogic)
         self.m_sct = None # MSS скриншоттер (основной экземпляр для выделения области)
         self.m_ocr_reader = None # EasyOCR Reader (основной экземпляр)
+        self.ocr_ready = False # OCR загружен в фоне и готов к работе
+        self.ocr_failed = False # Фоновая загрузка OCR завершилась ошибкой
+        self.m_loader = None # ResourceLoader (фоновая загрузка OCR)
+        self.perf_profile = {} # Профиль производительности (устанавливается в _init_resources)
+        # Кэш шаблонов живет все время работы приложения: повторный запуск поиска
+        # берет подготовленные шаблоны из памяти
+        self.template_cache = (
+            TemplateCache(ABS_TEMPLATE_CACHE_FILE, TEMPLATE_CACHE_PYRAMID_LEVELS)
+            if TEMPLATE_CACHE_ENABLED else None
+        )
+        # Метрики Worker'а (см. metrics_exporter.py): панель производительности окна
+        # и, при METRICS_ENABLED, адрес для Prometheus. Счетчики переживают перезапуск Worker'а сторожем.
+        self.metrics = WorkerMetrics(self.template_cache)
+        self.m_metrics_server = None
+        if METRICS_ENABLED:
+            self.m_metrics_server = MetricsServer(self.metrics, METRICS_PORT, METRICS_HOST)
+            self.m_metrics_server.start()
+        # Буфер трассировки этапов Worker'а (TRACE_ENABLED, см. tracing.py), сохраняется по TRACE_DUMP_HOTKEY.
+        # Живет дольше Worker'а: после перезапуска сторожем видно, что было до зависания.
+        self.tracer = TraceBuffer(TRACE_BUFFER_EVENTS) if TRACE_ENABLED else None
+        # Выборочный профилировщик потоков Worker'а (PROFILER_HOTKEY): цикл поиска и исполнитель этапов
+        self.profiler = SamplingProfiler(
+            lambda thread_name: thread_name.startswith(("WorkerThread_", "WorkerStages_")),
+            PROFILER_SAMPLE_INTERVAL,
+        )
+        self.m_loader_thread = None
         self.m_screen_selector = None # Виджет для выделения области
 
         # Поток и Worker для фоновой работы
         self.m_worker = None
         self.m_thread = None
+        self._abandoned_workers = [] # (Worker, QThread), брошенные при зависании (см. _restart_worker_service)
 
         # Флаг успешной инициализации BotLogic
         self.initialized_ok = False
@@ -1278,8 +427,8 @@ class BotLogic(QObject):
             # Настройка глобальных горячих клавиш
             self._setup_global_hotkey()
             logger.info("Инициализация BotLogic завершена успешно.")
-            # Установка статуса "Готов" после успешной инициализации
-            self.signal_update_status.emit("Готов.")
+            # Загрузка OCR в фоне: окно появляется сразу, кнопка Старт - после загрузки
+            self._start_resource_loader()
         else:
             logger.critical("Инициализация BotLogic завершилась с ошибками.")
             # Уведомление пользователя об ошибке инициализации произойдет в main.py
@@ -1296,12 +445,18 @@ class BotLogic(QObject):
     # --- Методы инициализации и настройки ---
     def _init_resources(self) -> bool:
         """
-        Инициализирует основные ресурсы приложения: папку шаблонов, MSS, EasyOCR.
-        Возвращает True при успехе, False при ошибке.
+        Инициализирует основные ресурсы приложения: папку шаблонов, MSS.
+        EasyOCR загружается отдельно в фоне. Возвращает True при успехе, False при ошибке.
         """
         logger.info("--- Инициализация основных ресурсов ---")
         all_ok = True # Флаг общего успеха
 
+        # 0. Профиль производительности: ограничение пулов потоков OpenMP/MKL
+        # должно быть задано до импорта torch (он выполняется в фоновой загрузке)
+        self.perf_profile = performance.get_profile(PERFORMANCE_PROFILES, PERFORMANCE_PROFILE)
+        performance.apply_environment(self.perf_profile)
+        logger.info(f"Профиль производительности: '{PERFORMANCE_PROFILE}' {self.perf_profile}")
+
         # 1. Создание папки шаблонов
         if not self._create_template_folder():
             logger.warning("Не удалось создать папку шаблонов. Функционал добавления/хранения шаблонов может быть ограничен.")
@@ -1318,37 +473,8 @@ class BotLogic(QObject):
                 # self.signal_update_status.emit("Ошибка MSS!")
                 all_ok = False # Критическая ошибка
 
-        # 3. Инициализация EasyOCR Reader
-        # OCR Reader создается один раз в основном потоке и передается Worker'у.
-        # EasyOCR с gpu=False должен быть потокобезопасным или допускать использование
-        # одного инстанса из нескольких потоков последовательно.
-        if self.m_ocr_reader is None and all_ok: # Инициализируем OCR только если MSS инициализирован успешно
-            try:
-                logger.info(f"Попытка инициализации EasyOCR с языками: {OCR_LANGUAGES}, gpu=False")
-                self.m_ocr_reader = easyocr.Reader(OCR_LANGUAGES, gpu=False)
-                logger.info("EasyOCR инициализирован.")
-
-                # Прогрев OCR: выполняем тестовое распознавание на пустом изображении
-                # Это может помочь загрузить модели и ускорить первое реальное распознавание.
-                logger.info("Прогрев OCR...")
-                try:
-                    # Создаем маленькое пустое изображение
-                    dummy_img = np.zeros((50, 200, 3), dtype=np.uint8)
-                    _ = self.m_ocr_reader.readtext(dummy_img, detail=0)
-                    logger.info("Прогрев OCR завершен успешно.")
-                except Exception as warm_e:
-                     logger.warning(f"Ошибка при прогреве OCR: {warm_e}")
-
-                # Статус "OCR готов" будет установлен в UI после инициализации Logic
-                # и создания MainWindow, через сигнал signal_update_status
-                # self.signal_update_status.emit(f"OCR готов ({', '.join(OCR_LANGUAGES)}).")
-
-
-            except Exception:
-                logger.exception("КРИТИЧЕСКАЯ ОШИБКА инициализации EasyOCR:")
-                # Отправляем сигнал об ошибке в UI после инициализации UI
-                # self.signal_update_status.emit("Ошибка OCR!")
-                all_ok = False # Критическая ошибка
+        # 3. EasyOCR Reader загружается в фоне (см. _start_resource_loader),
+        # т.к. создание модели и прогрев занимают много секунд.
 
         # Общий результат инициализации
         if not all_ok:
@@ -1362,6 +488,117 @@ class BotLogic(QObject):
 
         return all_ok # Возвращаем общий результат
 
+    def _start_resource_loader(self):
+        """Запускает фоновую загрузку EasyOCR в отдельном потоке Qt."""
+        if self.m_ocr_reader is not None or self.m_loader_thread is not None:
+            return
+        logger.info("Запуск фоновой загрузки OCR...")
+        self.signal_update_status.emit("Загрузка OCR...")
+
+        self.m_loader_thread = QThread(self)
+        self.m_loader_thread.setObjectName("ResourceLoaderThread")
+        self.m_loader = ResourceLoader(self.perf_profile)
+        self.m_loader.moveToThread(self.m_loader_thread)
+
+        conn_type = Qt.ConnectionType.QueuedConnection
+        self.m_loader_thread.started.connect(self.m_loader.run, conn_type)
+        self.m_loader.progress.connect(self.signal_update_status, conn_type)
+        self.m_loader.finished.connect(self._handle_resources_loaded, conn_type)
+        self.m_loader.finished.connect(self.m_loader_thread.quit, conn_type)
+        self.m_loader.finished.connect(self.m_loader.deleteLater, conn_type)
+        self.m_loader_thread.finished.connect(self._clear_loader_refs, conn_type)
+        self.m_loader_thread.start()
+
+    @pyqtSlot(object)
+    def _handle_resources_loaded(self, reader):
+        """Слот: фоновая загрузка OCR завершена (reader или None при ошибке)."""
+        if self.cleanup_called:
+            return # Приложение закрывается, ресурс больше не нужен
+        if reader is None:
+            self.ocr_failed = True
+            self.signal_update_status.emit("Ошибка OCR!")
+            self.signal_ocr_ready.emit(False)
+            QMessageBox.critical(
+                None, "Ошибка OCR",
+                "Не удалось загрузить EasyOCR. Поиск и добавление товаров недоступны.\n"
+                "Подробности в лог-файле. Перезапустите приложение."
+            )
+            return
+
+        self.m_ocr_reader = reader
+        self.ocr_ready = True
+        logger.info(f"OCR готов через {time.monotonic() - self.startup_time:.2f}с после запуска приложения.")
+        self.signal_update_status.emit(f"Готов. OCR загружен ({', '.join(OCR_LANGUAGES)}).")
+        self.signal_ocr_ready.emit(True)
+
+    @pyqtSlot()
+    def _clear_loader_refs(self):
+        """Слот: поток фоновой загрузки завершился."""
+        if self.m_loader_thread is not None:
+            self.m_loader_thread.deleteLater()
+        self.m_loader_thread = None
+        self.m_loader = None
+
+    def report_window_shown(self):
+        """Логирует время от запуска приложения до показа главного окна."""
+        logger.info(f"Главное окно показано через {time.monotonic() - self.startup_time:.2f}с после запуска приложения.")
+
+    @pyqtSlot()
+    def _handle_first_scan_completed(self):
+        """Слот: Worker обработал первый кадр. Логирует время до первого скана."""
+        if self._monitoring_start_time is not None:
+            logger.info(f"Первый скан выполнен через {time.monotonic() - self._monitoring_start_time:.2f}с после запуска поиска.")
+        if not self._first_scan_logged:
+            self._first_scan_logged = True
+            logger.info(f"Время от запуска приложения до первого скана: {time.monotonic() - self.startup_time:.2f}с.")
+
+    @pyqtSlot(str, float)
+    def _handle_stage_overrun(self, stage: str, elapsed: float):
+        """Слот: этап Worker'а не уложился в лимит STAGE_DEADLINES (результат отброшен)."""
+        logger.warning(f"Этап Worker'а '{stage}' превысил лимит: {elapsed:.2f}с.")
+        self.signal_update_status.emit(f"Этап '{stage}' слишком долгий ({elapsed:.1f}с), пропуск.")
+
+    @pyqtSlot(object)
+    def _handle_stage_stalled(self, event: dict):
+        """Слот: сторож обнаружил зависание этапа Worker'а (стек уже записан в лог сторожем)."""
+        if self.sender() is not self.m_worker:
+            return # Событие от брошенного (перезапущенного) Worker'а
+        stage, elapsed = event.get("stage"), event.get("elapsed", 0.0)
+        logger.critical(f"Зависание этапа Worker'а '{stage}' ({elapsed:.1f}с, поток {event.get('thread')}).")
+        self.signal_update_status.emit(f"ВНИМАНИЕ: этап '{stage}' завис ({elapsed:.0f}с)!")
+        if WATCHDOG_AUTO_RESTART and self.monitoring_active:
+            self._restart_worker_service(f"зависание этапа '{stage}'")
+
+    def _restart_worker_service(self, reason: str):
+        """
+        Бросает зависший Worker и продолжает поиск в новом постоянном потоке.
+        Зависший поток получает остановку и команду завершения: если вызов вернется,
+        поток завершится сам. Ссылки на него хранятся до QThread.finished.
+        """
+        logger.warning(f"Перезапуск Worker'а: {reason}.")
+        old_worker, old_thread = self.m_worker, self.m_thread
+        if old_worker is not None:
+            old_worker.request_stop()
+            old_worker.post_command(Worker.CMD_SHUTDOWN)
+        if old_thread is not None:
+            self._abandoned_workers.append((old_worker, old_thread))
+        self.m_worker = None
+        self.m_thread = None
+
+        items_for_worker = self._filter_and_validate_items()
+        if not items_for_worker or not self._ensure_worker_service():
+            logger.error("Не удалось перезапустить Worker. Поиск остановлен.")
+            self.monitoring_active = False
+            if not self.is_selecting_area:
+                self.signal_enable_controls.emit(True)
+            self.signal_update_status.emit("Worker завис, перезапуск не удался. Поиск остановлен.")
+            self.signal_monitoring_stopped.emit(False)
+            return
+        self._session_id += 1
+        self.m_worker.post_command(Worker.CMD_START, items_for_worker, self._session_id)
+        self.signal_update_status.emit("Worker перезапущен после зависания.")
+        logger.info(f"Worker перезапущен, поиск продолжен для {len(items_for_worker)} товаров.")
+
     def _create_template_folder(self) -> bool:
         """Создает папку для сохранения шаблонов, если она не существует."""
         if not os.path.exists(ABS_TEMPLATE_FOLDER):
@@ -1381,9 +618,8 @@ class BotLogic(QObject):
         """Настраивает глобальные горячие клавиши для добавления/остановки."""
         logger.info("--- Настройка глобальных горячих клавиш ---")
         try:
-            # Проверка, доступна ли библиотека keyboard
-            if "keyboard" not in sys.modules:
-                raise ImportError("Модуль 'keyboard' не импортирован.")
+            # Импорт библиотеки keyboard (отложенный модуль): ImportError, если она не установлена
+            preload(keyboard)
 
             # Попытка удаления предыдущих хоткеев (если скрипт перезапускается без полного выхода процесса)
             # Ошибки KeyError/AttributeError игнорируются, если хоткеи не были зарегистрированы
@@ -1397,6 +633,16 @@ class BotLogic(QObject):
                 logger.debug(f"Удален старый хоткей '{STOP_MONITORING_HOTKEY}'.")
             except (KeyError, AttributeError):
                 pass
+            if self.tracer is not None:
+                try:
+                    keyboard.remove_hotkey(TRACE_DUMP_HOTKEY)
+                except (KeyError, AttributeError):
+                    pass
+            if PROFILER_HOTKEY:
+                try:
+                    keyboard.remove_hotkey(PROFILER_HOTKEY)
+                except (KeyError, AttributeError):
+                    pass
 
             # Регистрация новых хоткеев
             # trigger_on_release=True позволяет избежать многократного срабатывания при долгом нажатии
@@ -1406,6 +652,14 @@ class BotLogic(QObject):
             keyboard.add_hotkey(STOP_MONITORING_HOTKEY, self._safe_stop_monitoring, trigger_on_release=True)
             logger.info(f"Глобальный хоткей '{STOP_MONITORING_HOTKEY}' [Стоп поиск] зарегистрирован.")
 
+            if self.tracer is not None:
+                keyboard.add_hotkey(TRACE_DUMP_HOTKEY, self._dump_trace, trigger_on_release=True)
+                logger.info(f"Глобальный хоткей '{TRACE_DUMP_HOTKEY}' [Сохранить трассировку] зарегистрирован.")
+
+            if PROFILER_HOTKEY:
+                keyboard.add_hotkey(PROFILER_HOTKEY, self._toggle_profiler, trigger_on_release=True)
+                logger.info(f"Глобальный хоткей '{PROFILER_HOTKEY}' [Профилировщик Worker'а] зарегистрирован.")
+
             logger.warning("!!! Глобальные хоткеи могут требовать прав администратора для работы вне окна приложения !!!")
 
         except ImportError:
@@ -1445,6 +699,45 @@ class BotLogic(QObject):
         else:
              logger.warning("[Hotkey] Не удалось вызвать stop_monitoring: QApplication недоступен.")
 
+    def _dump_trace(self):
+        """
+        Сохраняет буфер трассировки в TRACE_FOLDER (вызывается в потоке хоткеев).
+        Запись файла не касается объектов Qt и не задерживает GUI; сигнал статуса потокобезопасен.
+        """
+        if self.tracer is None:
+            return
+        path = os.path.join(BASE_DIR, TRACE_FOLDER, f"trace_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+        try:
+            spans = self.tracer.dump(path)
+            self.signal_update_status.emit(f"Трассировка сохранена ({spans} отрезков): {os.path.basename(path)}")
+        except Exception:
+            logger.exception("Ошибка сохранения трассировки:")
+            self.signal_update_status.emit("Ошибка сохранения трассировки!")
+
+    def _toggle_profiler(self):
+        """
+        Запускает или останавливает профилировщик Worker'а (вызывается в потоке хоткеев).
+        При остановке профиль сохраняется рядом с файлом лога.
+        """
+        if not self.profiler.running:
+            self.profiler.start()
+            self.signal_update_status.emit("Профилировщик Worker'а запущен.")
+            return
+        self.profiler.stop()
+        self._save_profile()
+
+    def _save_profile(self):
+        """Сохраняет собранный профиль Worker'а в папку файла лога."""
+        base_path = os.path.join(os.path.dirname(LOG_FILE_PATH), f"profile_{datetime.datetime.now():%Y%m%d_%H%M%S}")
+        try:
+            _, summary_path = self.profiler.save(base_path, PROFILER_TOP_FUNCTIONS)
+            self.signal_update_status.emit(
+                f"Профиль сохранен ({self.profiler.samples} выборок): {os.path.basename(summary_path)}"
+            )
+        except Exception:
+            logger.exception("Ошибка сохранения профиля Worker'а:")
+            self.signal_update_status.emit("Ошибка сохранения профиля!")
+
 
     # --- Методы работы с данными товаров ---
     def _sanitize_filename(self, name: str) -> str:
@@ -1529,6 +822,9 @@ class BotLogic(QObject):
             # (Счетчик сбрасывается при каждом запуске приложения)
             for item in self.item_data_list:
                  item['bought_count'] = 0 # Добавляем или сбрасываем счетчик
+                 # Поля расписания проверки (для записей, созданных до их появления)
+                 item.setdefault("priority", DEFAULT_ITEM_PRIORITY)
+                 item.setdefault("scan_every_n_frames", DEFAULT_ITEM_SCAN_EVERY_N_FRAMES)
 
             # Обновляем UI список товаров
             self.signal_update_item_list.emit(self.get_item_data_for_display())
@@ -1651,13 +947,23 @@ class BotLogic(QObject):
         logger.info(f"Настройка 'Игнорировать Аренда' изменена на: {'ВКЛ' if self.ignore_rent else 'ВЫКЛ'}.")
         # Сохранять эту настройку между сессиями можно было бы добавить сюда
 
+    def _push_item_delta(self, kind: str, data):
+        """
+        Передает изменение товара работающему Worker'у (во время поиска),
+        чтобы не перезапускать поиск и не перезагружать остальные шаблоны.
+        """
+        if not self.monitoring_active or self.m_worker is None:
+            return # Вне поиска Worker получит полный список при следующем запуске
+        self.m_worker.post_item_delta(kind, data)
+        logger.info(f"Изменение товара ({kind}) отправлено работающему Worker'у.")
+
     @pyqtSlot(str)
     def remove_item(self, name: str):
-        """Слот для удаления товара по имени."""
-        # Проверяем, не запущены ли процессы, блокирующие управление данными
-        if self.monitoring_active or self.is_selecting_area:
-            self.signal_update_status.emit("Сначала остановите процесс!");
-            logger.warning(f"Попытка удалить товар '{name}' во время активного процесса.")
+        """Слот для удаления товара по имени. Во время поиска товар удаляется и из Worker'а."""
+        # Проверяем, не запущен ли режим выделения, блокирующий управление данными
+        if self.is_selecting_area:
+            self.signal_update_status.emit("Сначала завершите выделение!");
+            logger.warning(f"Попытка удалить товар '{name}' во время выделения области.")
             return
 
         # Находим товар по имени
@@ -1667,6 +973,8 @@ class BotLogic(QObject):
                 # Удаляем товар из списка в памяти
                 self.item_data_list.remove(item)
                 logger.info(f"Товар '{name}' удален из списка.")
+                # Worker выгружает шаблон до следующего кадра (в памяти - файл уже не нужен)
+                self._push_item_delta(Worker.DELTA_REMOVE, name)
                 self.signal_update_status.emit(f"Удалено: {name[:30]}...") # Обновляем статус в UI
 
                 # Попытка удаления связанного файла шаблона
@@ -1680,6 +988,15 @@ class BotLogic(QObject):
                     except Exception:
                          logger.exception(f"Неожиданная ошибка при удалении файла шаблона '{path}':")
 
+                # Забываем шаблон в кэше (из файла кэша уйдет при следующем сохранении)
+                if path and self.template_cache is not None:
+                    self.template_cache.drop(path)
+
+                # Удаляем калибровочные данные товара (обученную область поиска)
+                calibration = CalibrationStore(ABS_CALIBRATION_DATA_FILE)
+                if calibration.load() and calibration.drop_item(name):
+                    calibration.save()
+
                 # Обновляем UI список
                 self.signal_update_item_list.emit(self.get_item_data_for_display())
                 # Сохраняем измененный список данных
@@ -1695,23 +1012,32 @@ class BotLogic(QObject):
 
     @pyqtSlot(str, dict)
     def update_item_data(self, name: str, data: dict):
-        """Слот для обновления параметров товара по имени."""
-         # Проверяем, не запущены ли процессы
-        if self.monitoring_active or self.is_selecting_area:
-            self.signal_update_status.emit("Сначала остановите процесс!");
-            logger.warning(f"Попытка обновить товар '{name}' во время активного процесса.")
+        """Слот для обновления параметров товара по имени. Во время поиска изменения получает Worker."""
+         # Проверяем, не запущен ли режим выделения
+        if self.is_selecting_area:
+            self.signal_update_status.emit("Сначала завершите выделение!");
+            logger.warning(f"Попытка обновить товар '{name}' во время выделения области.")
             return
 
         # Находим товар по имени
         item = self.get_item_data_by_name(name)
         if item:
             # Разрешаем обновлять только определенные поля
-            allowed_keys = {"enabled", "max_price", "quantity"}
+            allowed_keys = {"enabled", "max_price", "quantity", "priority", "scan_every_n_frames"}
             # Создаем словарь с полями, которые разрешено обновлять и которые присутствуют в data
             payload = {k: data[k] for k in allowed_keys if k in data}
+            # Приводим приоритет и частоту проверки к допустимым значениям
+            if "priority" in payload or "scan_every_n_frames" in payload:
+                priority, _ = get_item_scan_cadence({**item, **payload})
+                payload["priority"] = priority
+                every_n = payload.get("scan_every_n_frames", item.get("scan_every_n_frames", DEFAULT_ITEM_SCAN_EVERY_N_FRAMES))
+                if not isinstance(every_n, int) or every_n < 0:
+                    every_n = DEFAULT_ITEM_SCAN_EVERY_N_FRAMES
+                payload["scan_every_n_frames"] = min(every_n, MAX_ITEM_SCAN_EVERY_N_FRAMES)
 
             # Обновляем поля в словаре товара в списке
             item.update(payload)
+            self._push_item_delta(Worker.DELTA_UPSERT, item)
 
             logger.info(f"Данные для товара '{name}' обновлены: {payload}")
             self.signal_update_status.emit(f"Обновлено: {name[:30]}...") # Обновляем статус UI
@@ -1733,6 +1059,9 @@ class BotLogic(QObject):
         if item and item.get("enabled") != enabled:
             item["enabled"] = enabled # Обновляем статус в данных
             logger.info(f"Статус поиска для '{name}' изменен на: {'ВКЛ' if enabled else 'ВЫКЛ'}.")
+            # Во время поиска: выключенный товар остается загруженным (с прогрессом),
+            # включенный впервые - загружается Worker'ом
+            self._push_item_delta(Worker.DELTA_UPSERT, item)
             # Сохраняем данные после изменения статуса
             self._save_item_data()
             # UI уже обновил чекбокс, но _on_item_check_changed также вызывает _style_list_item
@@ -1757,6 +1086,10 @@ class BotLogic(QObject):
             return
 
         # Проверяем, инициализированы ли необходимые ресурсы
+        if self.m_sct is not None and not self.ocr_ready and not self.ocr_failed:
+            self.signal_update_status.emit("OCR еще загружается, подождите...")
+            logger.info("Выделение отложено: OCR еще загружается.")
+            return
         if self.m_sct is None or self.m_ocr_reader is None:
             self.signal_update_status.emit("Ошибка ресурсов (MSS/OCR)!");
             logger.error("MSS или OCR не инициализированы, невозможно начать выделение.")
@@ -1869,7 +1202,9 @@ class BotLogic(QObject):
             logger.info("Запуск OCR на захваченной области...")
             # Выполняем OCR на BGR изображении. detail=0 возвращает только текст.
             # paragraph=True пытается объединить текст в блоки (лучше для длинных названий).
-            ocr_res = self.m_ocr_reader.readtext(captured_image_bgr, detail=0, paragraph=True)
+            # ocr_lock: Reader общий с Worker'ом, который может распознавать цену в этот момент
+            with ocr_lock:
+                ocr_res = self.m_ocr_reader.readtext(captured_image_bgr, detail=0, paragraph=True)
             logger.info(f"OCR завершен. Результат: {ocr_res}")
 
             # Обработка результата OCR
@@ -1939,11 +1274,14 @@ class BotLogic(QObject):
                 "enabled": DEFAULT_ITEM_ENABLED, # Статус включен по умолчанию
                 "max_price": DEFAULT_ITEM_MAX_PRICE, # Макс. цена по умолчанию
                 "quantity": DEFAULT_ITEM_QUANTITY, # Целевое количество по умолчанию
+                "priority": DEFAULT_ITEM_PRIORITY, # Приоритет проверки по умолчанию
+                "scan_every_n_frames": DEFAULT_ITEM_SCAN_EVERY_N_FRAMES, # 0 = частота по приоритету
                 "bought_count": 0, # Счетчик купленного (начинаем с 0)
                 "template_path": template_file_path # Абсолютный путь к сохраненному шаблону
             }
             # Добавляем новую запись в список
             self.item_data_list.append(new_item_entry)
+            self._push_item_delta(Worker.DELTA_UPSERT, new_item_entry)
             # Сортируем список по имени товара для удобства отображения
             self.item_data_list.sort(key=lambda x: x.get("name", "").lower())
 
@@ -2087,6 +1425,10 @@ class BotLogic(QObject):
             logger.error("Система не инициализирована корректно, невозможно запустить мониторинг.")
             QMessageBox.critical(None, "Ошибка Запуска", "Система не инициализирована корректно. Перезапустите приложение.")
             return
+        if not self.ocr_ready and not self.ocr_failed:
+            self.signal_update_status.emit("OCR еще загружается, подождите...")
+            logger.info("Запуск мониторинга отложен: OCR еще загружается.")
+            return
         if self.m_ocr_reader is None or self.m_sct is None:
             self.signal_update_status.emit("Ошибка ресурсов (MSS/OCR)!");
             logger.error("MSS или OCR недоступны, невозможно запустить мониторинг.")
@@ -2105,55 +1447,10 @@ class BotLogic(QObject):
             QMessageBox.warning(None, "Нет товаров для поиска", "Не выбрано ни одного активного товара с существующим файлом шаблона.")
             return
 
-        # Проверка, не работает ли предыдущий Worker/Thread
-        # Это должно быть уже обработано при вызове stop_monitoring(),
-        # но добавим проверку на всякий случай.
-        if self.m_thread and self.m_thread.isRunning():
-            logger.warning("Предыдущий Worker/Thread еще активен. Попытка принудительной остановки.")
-            # Если поток еще жив, пытаемся его остановить перед запуском нового
-            self.stop_monitoring()
-            # Ожидаем завершения предыдущего потока (с таймаутом)
-            wait_time_ms = 2000 # Ждем до 2 секунд
-            if self.m_thread and not self.m_thread.wait(wait_time_ms):
-                logger.critical(f"!!! Предыдущий Worker/Thread не завершился за {wait_time_ms} мс. Невозможно запустить новый.")
-                self.signal_update_status.emit("Ошибка: Предыдущий процесс не остановился!")
-                # Нельзя безопасно запустить новый Worker, выходим.
-                # Можно показать сообщение об ошибке.
-                QMessageBox.critical(None, "Ошибка Запуска", "Не удалось остановить предыдущий процесс. Попробуйте перезапустить приложение.")
-                return
-            else:
-                logger.info("Предыдущий Worker/Thread успешно остановлен.")
-                # Очищаем ссылки после успешной остановки
-                self.m_worker = None
-                self.m_thread = None
-                # Даем немного времени системе
-                time.sleep(0.1)
-                if QApplication.instance():
-                    QApplication.instance().processEvents()
-
-
-        # Очищаем ссылки на старый Worker и Thread перед созданием новых
-        self.m_worker = None
-        self.m_thread = None
-
         try:
-            logger.info("Создание нового Worker и QThread для мониторинга...")
-            # Создаем новый поток Qt
-            self.m_thread = QThread(self)
-            # Устанавливаем имя потока Qt для отладки
-            self.m_thread.setObjectName("MonitoringWorkerThread")
-
-            # Создаем новый Worker, передаем ему список товаров и OCR Reader
-            self.m_worker = Worker(items_for_worker, self.m_ocr_reader)
-            logger.info(f"Worker ID '{id(self.m_worker)}' создан.")
-
-            # Перемещаем Worker объект в созданный поток
-            self.m_worker.moveToThread(self.m_thread)
-            logger.info(f"Worker перемещен в поток '{self.m_thread.objectName()}'.")
-
-            # Подключаем сигналы от Worker'а к соответствующим слотам BotLogic
-            self._connect_worker_signals()
-            logger.info("Сигналы Worker <-> BotLogic соединены.")
+            # Постоянный поток Worker'а создается при первом запуске и живет до выхода
+            if not self._ensure_worker_service():
+                raise RuntimeError("Не удалось запустить поток Worker'а.")
 
             # Устанавливаем флаг активности мониторинга
             self.monitoring_active = True
@@ -2166,9 +1463,14 @@ class BotLogic(QObject):
             self.signal_update_status.emit(msg)
             logger.info(f">>> {msg}")
 
-            # Запускаем поток. При запуске потока (сигнал started), будет вызван метод run() Worker'а.
-            self.m_thread.start()
-            logger.info(f"Поток '{self.m_thread.objectName()}' запущен.")
+            # Команда запуска сеанса поиска. Если предыдущий сеанс еще завершается,
+            # команда будет выполнена сразу после него.
+            # Сигнал finished предыдущего (остановленного, но еще завершающегося) сеанса
+            # приходит от того же Worker'а: сеансы различаются по id
+            self._monitoring_start_time = time.monotonic()
+            self._session_id += 1
+            self.m_worker.post_command(Worker.CMD_START, items_for_worker, self._session_id)
+            logger.info("Команда запуска отправлена постоянному потоку Worker'а.")
 
         except Exception as e:
             # Ловим любые ошибки при создании или запуске Worker/Thread
@@ -2176,18 +1478,38 @@ class BotLogic(QObject):
             self.monitoring_active = False # Убеждаемся, что флаг сброшен
             self.signal_enable_controls.emit(True) # Разблокируем UI контролы
             self.signal_update_status.emit("Критическая ошибка запуска потока!")
-            # Попытка очистить созданные объекты Worker/Thread
-            if self.m_worker:
-                self.m_worker.deleteLater()
-                self.m_worker = None
-            if self.m_thread:
-                self.m_thread.quit()
-                self.m_thread.wait(500)
-                self.m_thread.deleteLater()
-                self.m_thread = None
             # Сообщаем пользователю об ошибке
             QMessageBox.critical(None, "Ошибка Запуска", f"Не удалось запустить процесс поиска:\n{e}\nПопробуйте перезапустить приложение.")
 
+    def _ensure_worker_service(self) -> bool:
+        """
+        Создает постоянный Worker и его QThread, если они еще не созданы.
+        Возвращает True, если поток Worker'а работает.
+        """
+        if self.m_worker is not None and self.m_thread is not None and self.m_thread.isRunning():
+            return True
+
+        logger.info("Создание постоянного Worker'а и QThread...")
+        # Создаем новый поток Qt
+        self.m_thread = QThread(self)
+        # Устанавливаем имя потока Qt для отладки
+        self.m_thread.setObjectName("MonitoringWorkerThread")
+
+        # Worker создается без товаров: список передается с каждой командой запуска
+        self.m_worker = Worker([], self.m_ocr_reader, self.template_cache, self.metrics, self.tracer)
+        logger.info(f"Worker ID '{id(self.m_worker)}' создан.")
+
+        # Перемещаем Worker объект в созданный поток
+        self.m_worker.moveToThread(self.m_thread)
+        logger.info(f"Worker перемещен в поток '{self.m_thread.objectName()}'.")
+
+        # Подключаем сигналы от Worker'а к соответствующим слотам BotLogic
+        self._connect_worker_signals()
+        logger.info("Сигналы Worker <-> BotLogic соединены.")
+
+        self.m_thread.start()
+        logger.info(f"Поток '{self.m_thread.objectName()}' запущен.")
+        return True
 
     def _filter_and_validate_items(self) -> list:
         """
@@ -2263,16 +1585,27 @@ class BotLogic(QObject):
         # Сигнал завершения работы Worker'а -> слот обработки завершения в BotLogic
         self.m_worker.finished.connect(self._handle_worker_finished, conn_type)
 
-        # Сигнал запуска потока Qt -> вызов метода run() Worker'а
+        # Первый обработанный кадр -> замер времени до первого скана
+        self.m_worker.first_scan_completed.connect(self._handle_first_scan_completed, conn_type)
+
+        # Превышение лимита времени этапа -> сообщение в статусе
+        self.m_worker.stage_overrun.connect(self._handle_stage_overrun, conn_type)
+
+        # Зависание этапа (сторож) -> лог, статус и, при WATCHDOG_AUTO_RESTART, перезапуск Worker'а
+        self.m_worker.stage_stalled.connect(self._handle_stage_stalled, conn_type)
+
+        # Сигнал запуска потока Qt -> цикл команд serve() постоянного Worker'а
         # Этот сигнал исходит от QThread после успешного start()
-        self.m_thread.started.connect(self.m_worker.run, conn_type)
+        self.m_thread.started.connect(self.m_worker.serve, conn_type)
 
-        # Сигнал завершения работы Worker'а -> выход из цикла событий потока Qt
-        # Когда Worker закончит run(), он отправит finished, который вызовет quit() потока
-        self.m_worker.finished.connect(self.m_thread.quit, conn_type)
+        # Завершение цикла команд (CMD_SHUTDOWN) -> выход из цикла событий потока Qt.
+        # DirectConnection: QThread.quit() потокобезопасен, а основной поток в cleanup()
+        # в этот момент ждет поток и не обрабатывает очередь событий.
+        # Сигнал finished Worker'а означает конец сеанса поиска, поток при этом живет
+        self.m_worker.service_stopped.connect(self.m_thread.quit, Qt.ConnectionType.DirectConnection)
 
-        # Сигнал завершения работы Worker'а -> удаление объекта Worker после завершения его работы в его потоке
-        self.m_worker.finished.connect(self.m_worker.deleteLater, conn_type)
+        # Завершение потока Qt -> удаление объекта Worker
+        self.m_thread.finished.connect(self.m_worker.deleteLater, conn_type)
 
         # Сигнал завершения работы потока Qt -> сброс ссылок в BotLogic
         # Это должно быть последнее, что происходит
@@ -2297,9 +1630,6 @@ class BotLogic(QObject):
                 self.signal_enable_controls.emit(True)
             self.signal_update_status.emit("Мониторинг уже остановлен.")
             # Убедимся, что ссылки на Worker/Thread сброшены, если их нет или они неактивны
-            if (self.m_thread is None or not self.m_thread.isRunning()) and self.m_worker is None:
-                 self.m_worker = None
-                 self.m_thread = None # Сброс ссылок если поток уже завершился сам
             return
 
         # Если мониторинг активен и есть Worker/Thread
@@ -2313,18 +1643,16 @@ class BotLogic(QObject):
                  self.signal_enable_controls.emit(True) # Разблокируем контролы (кроме Старт)
             self.signal_update_status.emit("Остановка поиска...")
 
-            # Безопасно вызываем метод stop() Worker'а в его потоке через QueuedConnection
-            # Этот вызов не блокирует основной поток.
-            QMetaObject.invokeMethod(
-                self.m_worker,
-                "stop",
-                Qt.ConnectionType.QueuedConnection
-            )
-            logger.info("Команда worker.stop() отправлена в очередь Worker'а.")
-
-            # Ожидание завершения потока Worker'а происходит в cleanup()
-            # или при автоматическом завершении после получения сигнала finished.
-            # Здесь в UI потоке мы просто отправили команду и обновили UI.
+            # Останавливаем сеанс напрямую (потокобезопасно): пока run() выполняется,
+            # очередь событий потока Worker'а не обрабатывается, поэтому
+            # QueuedConnection-вызов stop() дошел бы только после конца сеанса.
+            if self.m_worker.request_stop():
+                logger.info("Флаг остановки сеанса Worker'а установлен. Ожидание сигнала finished.")
+            else:
+                # Сеанс еще не начался (запуск отменен) - сигнала finished не будет
+                logger.info("Сеанс поиска не был начат, запуск отменен.")
+                self.signal_update_status.emit("Поиск остановлен.")
+                self.signal_monitoring_stopped.emit(False)
 
         else:
             # Не должно происходить, если monitoring_active == True
@@ -2333,8 +1661,6 @@ class BotLogic(QObject):
             if not self.is_selecting_area:
                 self.signal_enable_controls.emit(True)
             self.signal_update_status.emit("Состояние сброшено.")
-            self.m_worker = None
-            self.m_thread = None # Убедимся, что ссылки None
 
     # --- Слоты для обработки сигналов от Worker'а (выполняются в основном потоке) ---
     @pyqtSlot(str)
@@ -2381,8 +1707,8 @@ class BotLogic(QObject):
             logger.warning(f"[MainThread] Получен сигнал действия для неизвестного товара '{name}'.")
 
 
-    @pyqtSlot(bool)
-    def _handle_worker_finished(self, stopped_by_target: bool):
+    @pyqtSlot(bool, object)
+    def _handle_worker_finished(self, stopped_by_target: bool, session_id=None):
         """
         Обрабатывает сигнал finished от Worker'а.
         Означает, что Worker завершил свою работу (штатно или с ошибкой/остановкой).
@@ -2391,6 +1717,14 @@ class BotLogic(QObject):
         # Получаем ссылку на Worker, отправивший сигнал
         worker_obj = self.sender()
         worker_id = getattr(worker_obj, "worker_id", "N/A")
+        if worker_obj is not None and worker_obj is not self.m_worker:
+            # Брошенный после зависания Worker вернулся из вызова - поиск уже идет в новом
+            logger.info(f"Сигнал finished от брошенного Worker'а '{worker_id}' проигнорирован.")
+            return
+        if session_id != self._session_id and self.monitoring_active:
+            # Завершился сеанс, остановленный до запуска текущего: текущий продолжает работу
+            logger.info(f"Сигнал finished предыдущего сеанса {session_id} проигнорирован (текущий сеанс {self._session_id}).")
+            return
         reason = "по достижению всех целей" if stopped_by_target else "по команде Стоп или из-за ошибки"
         logger.info(f"--- Получен сигнал Worker.finished от Worker ID '{worker_id}' ({reason}) ---")
 
@@ -2411,8 +1745,8 @@ class BotLogic(QObject):
         self.signal_monitoring_stopped.emit(stopped_by_target)
         logger.info(f"[MainThread] Сигнал signal_monitoring_stopped({stopped_by_target}) отправлен в UI.")
 
-        # Worker и Thread будут автоматически удалены через deleteLater()
-        # после того, как этот слот завершится. Ссылки будут обнулены в _clear_worker_thread_refs.
+        # Постоянный Worker и его поток остаются для следующего запуска.
+        # Они удаляются при выходе из приложения (см. cleanup и _clear_worker_thread_refs).
 
 
     @pyqtSlot()
@@ -2424,6 +1758,11 @@ class BotLogic(QObject):
         """
         thread_obj = self.sender() # Получаем ссылку на QThread, который отправил сигнал
         thread_name = thread_obj.objectName() if thread_obj else "N/A"
+        if thread_obj is not None and thread_obj is not self.m_thread:
+            # Завершился поток брошенного Worker'а: освобождаем только его ссылки
+            self._abandoned_workers = [pair for pair in self._abandoned_workers if pair[1] is not thread_obj]
+            logger.info(f"[MainThread] Поток брошенного Worker'а '{thread_name}' завершен.")
+            return
         worker_id = getattr(self.m_worker, "worker_id", "N/A_before_clear") # ID Worker'а перед обнулением
 
         log_msg = (
@@ -2464,12 +1803,16 @@ class BotLogic(QObject):
         # 2. Отключаем глобальные горячие клавиши
         logger.info("Отключение глобальных горячих клавиш...")
         try:
-            # Если модуль keyboard был импортирован и имеет функцию unhook_all
-            if "keyboard" in sys.modules and hasattr(keyboard, "unhook_all"):
+            # Хоткеи могли быть зарегистрированы, только если модуль keyboard был импортирован
+            if keyboard.is_loaded and hasattr(keyboard, "unhook_all"):
                 keyboard.unhook_all()
                 logger.info("Глобальные хоткеи отключены.")
         except Exception:
              logger.exception("Ошибка при отключении глобальных хоткеев:")
+        # Профилировщик, запущенный хоткеем и не остановленный, сохраняет профиль при выходе
+        if self.profiler.running:
+            self.profiler.stop()
+            self._save_profile()
 
 
         # 3. Закрытие и удаление виджета выделения области (если существует и виден)
@@ -2501,18 +1844,26 @@ class BotLogic(QObject):
                 self.m_screen_selector = None # Обнулить ссылку даже при ошибке
 
 
-        # 4. Oстановка Worker-потока, если он активен
-        # Проверяем, активен ли мониторинг И существует ли поток
+        # 4. Oстановка постоянного Worker-потока, если он создан.
+        # Ожидание OCR/поиска шаблона прерывается сразу (см. stages.py), поэтому поток
+        # завершается в пределах WORKER_STOP_BUDGET_MS даже посреди распознавания.
+        stage_runner = self.m_worker.stage_runner if self.m_worker else None
+        stop_deadline = time.monotonic() + WORKER_STOP_BUDGET_MS / 1000.0
         if self.monitoring_active or (self.m_thread and self.m_thread.isRunning()):
-            logger.info("Мониторинг активен при закрытии. Запрашиваем остановку Worker'а...")
-            # Вызываем stop_monitoring(). Это отправит команду Worker'у и обновит UI флаги.
-            self.stop_monitoring()
+            if self.monitoring_active:
+                logger.info("Мониторинг активен при закрытии. Запрашиваем остановку Worker'а...")
+                # Вызываем stop_monitoring(). Это остановит сеанс и обновит UI флаги.
+                self.stop_monitoring()
+            if self.m_worker:
+                # Завершаем цикл команд постоянного потока
+                self.m_worker.request_stop()
+                self.m_worker.post_command(Worker.CMD_SHUTDOWN)
 
             # Ожидаем завершения потока Worker'а.
             # Это важно, чтобы Worker успел завершить текущие операции и очистить свои ресурсы (напр. MSS).
             # Устанавливаем таймаут на ожидание, чтобы приложение не зависло навсегда.
             if self.m_thread:
-                wait_time_ms = 3000 # Ждем до 3 секунд
+                wait_time_ms = WORKER_STOP_BUDGET_MS
                 logger.info(f"Ожидание завершения потока Worker'а '{self.m_thread.objectName() or 'N/A'}' ({wait_time_ms} мс)...")
                 if not self.m_thread.wait(wait_time_ms):
                     logger.critical("!!! Поток Worker не завершился штатно в отведенное время!")
@@ -2531,6 +1882,27 @@ class BotLogic(QObject):
         else:
              logger.info("Мониторинг не был активен при закрытии.")
 
+        # Потоки брошенных после зависания Worker'ов: ждем только остаток бюджета
+        for _, abandoned_thread in self._abandoned_workers:
+            remaining_ms = max(0, int((stop_deadline - time.monotonic()) * 1000))
+            if not abandoned_thread.wait(remaining_ms):
+                logger.critical(f"!!! Брошенный поток Worker'а '{abandoned_thread.objectName()}' все еще завис при выходе.")
+        self._abandoned_workers = []
+
+
+        # Ожидание фоновой загрузки OCR: создание модели EasyOCR прервать нельзя,
+        # а уничтожение работающего QThread приводит к аварийному завершению.
+        # Ждем только остаток бюджета остановки, затем бросаем загрузку, как зависший Worker.
+        if self.m_loader_thread and self.m_loader_thread.isRunning():
+            remaining_ms = max(0, int((stop_deadline - time.monotonic()) * 1000))
+            logger.info(f"Ожидание завершения фоновой загрузки OCR ({remaining_ms} мс)...")
+            self.m_loader_thread.quit()
+            if not self.m_loader_thread.wait(remaining_ms):
+                logger.critical("!!! Фоновая загрузка OCR не завершилась в отведенное время, поток брошен.")
+            else:
+                logger.info("Поток фоновой загрузки OCR завершен.")
+        self.m_loader = None
+        self.m_loader_thread = None
 
         # 5. Закрытие основного экземпляра MSS
         if self.m_sct:
@@ -2543,7 +1915,14 @@ class BotLogic(QObject):
             self.m_sct = None # Обнуляем ссылку
 
 
-        # 6. Освобождение EasyOCR Reader
+        # 6. Освобождение EasyOCR Reader.
+        # Брошенный этап (OCR, превысивший срок или прерванный остановкой) может еще
+        # выполняться в потоке-исполнителе: ждем его только в пределах оставшегося бюджета.
+        if stage_runner is not None and not stage_runner.wait_idle(stop_deadline - time.monotonic()):
+            logger.warning(
+                "Этап Worker'а еще выполняется в потоке-исполнителе (превышение бюджета остановки). "
+                "Ссылка на EasyOCR Reader остается у исполнителя; поток-демон завершится вместе с процессом."
+            )
         if self.m_ocr_reader:
             logger.info("Освобождение EasyOCR Reader...")
             try:
@@ -2557,6 +1936,11 @@ class BotLogic(QObject):
                 logger.error(f"Ошибка при освобождении EasyOCR Reader: {e}")
             self.m_ocr_reader = None # Обнуляем ссылку
 
+        # 7. Остановка сервера метрик
+        if self.m_metrics_server is not None:
+            self.m_metrics_server.stop()
+            self.m_metrics_server = None
+
         logger.info("--- Очистка BotLogic завершена ---")
         # В конце очистки логики, можно явно завершить логирование,
         # чтобы все буферы были сброшены на диск.
@@ -3,10 +3,20 @@
 # main.py
 """Точка входа в приложение. Инициализация и запуск GUI."""
 
+import time
+# Момент запуска приложения - для замера времени до показа окна и первого скана
+APP_START_TIME = time.monotonic()
+
 import sys
 import os
 import traceback
 import datetime
+
+# Профилировщик запуска (флаг --profile-startup) включается до импорта PyQt и
+# остальных модулей, чтобы замерить их импорт.
+import startup_profiler
+startup_profiler.enable_from_argv()
+
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6.QtCore import Qt # Импорт для QTimer
 
@@ -38,11 +48,12 @@ if BASE_DIR not in sys.path:
 # --- Импорт локальных модулей ---
 # Порядок: стандартные -> сторонние -> локальные
 try:
-    # Импорты локальных модулей после определения BASE_DIR
-    from interface import MainWindow
-    # Импорт BotLogic для его использования, BASE_DIR из constants
-    from logic import BotLogic, BASE_DIR as LOGIC_BASE_DIR
-    from constants import ADD_ITEM_HOTKEY, STOP_MONITORING_HOTKEY
+    with startup_profiler.section("Импорт модулей приложения"):
+        # Импорты локальных модулей после определения BASE_DIR
+        from interface import MainWindow
+        # Импорт BotLogic для его использования, BASE_DIR из constants
+        from logic import BotLogic, BASE_DIR as LOGIC_BASE_DIR
+        from constants import ADD_ITEM_HOTKEY, STOP_MONITORING_HOTKEY
 except ImportError as e:
     print(f"КРИТИЧЕСКАЯ ОШИБКА: Не найдены файлы приложения: {e}",
           file=sys.stderr)
@@ -127,7 +138,11 @@ def global_except_hook(exctype, value, tb):
 sys.excepthook = global_except_hook
 
 # --- Основная точка входа ---
-if __name__ == '__main__':
+def main() -> int:
+    """
+    Создает QApplication, BotLogic и главное окно, запускает цикл событий.
+    Возвращает код завершения приложения. Вызывается из main.py и run.py.
+    """
     # Создаем экземпляр QApplication, если он еще не создан (например,
     # глобальным обработчиком при ошибке импорта)
     app = QApplication.instance()
@@ -145,22 +160,28 @@ if __name__ == '__main__':
     print(f"Используется базовая директория: {BASE_DIR}", flush=True)
 
     # Создаем экземпляр логики приложения
-    # Логика должна быть создана до MainWindow, т.к. передается в конструктор
+    # Логика должна быть создана до MainWindow, т.к. передается в конструктор.
+    # Тяжелая загрузка OCR выполняется BotLogic в фоне, окно появляется сразу.
     print("Создание BotLogic...", flush=True)
     try:
         # Создаем логику. Логика может вызвать global_except_hook
         # или показать QMessageBox сама при критической ошибке инициализации
-        logic = BotLogic()
-        # Если BotLogic не смог инициализироваться и сам не вызвал выход,
-        # проверим его состояние
-        if not hasattr(logic, 'initialized_ok') or not logic.initialized_ok:
-             print("BotLogic не инициализирован успешно. Выход.", file=sys.stderr)
-             sys.exit(1) # Явный выход, если логика сообщила о неудаче
-        print("BotLogic создан и инициализирован успешно.", flush=True)
+        with startup_profiler.section("Создание BotLogic"):
+            logic = BotLogic(startup_time=APP_START_TIME)
     except Exception as e:
-        print("Создание MainWindow...", flush=True)
+        print(f"КРИТИЧЕСКАЯ ОШИБКА: Не удалось создать BotLogic: {e}", file=sys.stderr)
+        global_except_hook(type(e), e, e.__traceback__) # Логируем и выходим
+    # Если BotLogic не смог инициализироваться и сам не вызвал выход,
+    # проверим его состояние
+    if not hasattr(logic, 'initialized_ok') or not logic.initialized_ok:
+        print("BotLogic не инициализирован успешно. Выход.", file=sys.stderr)
+        sys.exit(1) # Явный выход, если логика сообщила о неудаче
+    print("BotLogic создан и инициализирован успешно (OCR загружается в фоне).", flush=True)
+
+    print("Создание MainWindow...", flush=True)
     try:
-        window = MainWindow(logic)
+        with startup_profiler.section("Создание MainWindow"):
+            window = MainWindow(logic)
         print("MainWindow создано.", flush=True)
     except Exception as e:
          print(f"КРИТИЧЕСКАЯ ОШИБКА: Не удалось создать MainWindow: {e}", file=sys.stderr)
@@ -169,7 +190,16 @@ if __name__ == '__main__':
     # Отображаем главное окно
     print("Отображение MainWindow...", flush=True)
     window.show()
-    print("Приложение готово к работе.", flush=True)
+    logic.report_window_shown()
+    print(f"Окно показано через {time.monotonic() - APP_START_TIME:.2f}с после запуска.", flush=True)
+    print("Приложение готово к работе (кнопка поиска станет активной после загрузки OCR).", flush=True)
+
+    if startup_profiler.is_enabled():
+        # Отчет до окна и повторный - после фоновой загрузки OCR (импорт torch)
+        print(startup_profiler.report("окно показано"), flush=True)
+        logic.signal_ocr_ready.connect(
+            lambda ok: print(startup_profiler.report("OCR загружен" if ok else "ошибка загрузки OCR"), flush=True)
+        )
     print(f"Для добавления товара используйте хоткей: "
           f"'{ADD_ITEM_HOTKEY.upper()}'", flush=True)
     print(f"Для остановки поиска используйте хоткей: "
@@ -192,7 +222,11 @@ if __name__ == '__main__':
     #    print("WARN: Logic cleanup was not called via closeEvent.", file=sys.stderr)
     #    logic.cleanup() # Повторный вызов, если по какой-то причине не сработало
 
+    return exit_code
+
+
+if __name__ == '__main__':
     # Выход из скрипта с кодом завершения приложения
-    sys.exit(exit_code)
+    sys.exit(main())
 
 # --- END OF FILE main.py ---
\ No newline at end of file
@@ -0,0 +1,361 @@
+# --- START OF FILE market_synth.py ---
+
+# market_synth.py
+"""
+Генератор синтетических экранов рынка для бенчмарков масштабирования:
+как меняется стоимость поиска шаблонов и OCR на кадр с ростом каталога
+(2 товара в market_items.json -> сотни) и размера области сканирования.
+
+    python market_synth.py generate --out synth/500 --items 500 --frames 60
+    python market_synth.py scale --sizes 2,10,50,100,250,500 --areas 1280x720,1920x1080 --output scaling.json
+
+generate создает в папке --out:
+  templates/item_NNNN.png - шаблоны названий (отрисованы тем же шрифтом, что и экраны);
+  items.json              - товары в формате market_items.json (абсолютные пути шаблонов);
+  frames/                 - кадры PNG с индексом frames.jsonl (источник "replay")
+                            и разметкой labels.jsonl (см. benchmark.py).
+scale генерирует наборы для каждой пары (размер каталога, размер области), прогоняет
+их через benchmark.run_benchmark и сохраняет таблицу (JSON и CSV); если установлен
+matplotlib, рисует графики стоимости поиска и OCR на кадр.
+
+Названия (кириллица и латиница) рисуются через Pillow шрифтом TrueType;
+если шрифт с кириллицей не найден, генерируются только латинские названия.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+from lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageFont = lazy_import("PIL.ImageFont")
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.market_synth")
+
+# Шрифты с кириллицей (первый найденный); --font задает свой
+FONT_CANDIDATES = (
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "C:/Windows/Fonts/segoeui.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+)
+
+NAME_WORDS = {
+    "cyrillic": (
+        ("Малая", "Большая", "Старая", "Прочная", "Легкая", "Военная", "Редкая", "Слабая", "Сильная", "Походная"),
+        ("сумка", "аптечка", "броня", "каска", "рация", "фляга", "батарея", "карта", "граната", "повязка"),
+    ),
+    "latin": (
+        ("Small", "Large", "Old", "Sturdy", "Light", "Military", "Rare", "Weak", "Strong", "Field"),
+        ("Bag", "Medkit", "Armor", "Helmet", "Radio", "Flask", "Battery", "Map", "Grenade", "Bandage"),
+    ),
+}
+
+# Расположение строк: столбцы и смещение цены от левого верхнего угла названия.
+# Цена под названием со сдвигом вправо соответствует PRICE_SEARCH_RELATIVE_AREA по умолчанию.
+LAYOUTS = {
+    "list": {"columns": 1, "price_dx": 40, "price_dy": 6, "row_gap": 14, "margin": 20},
+    "grid": {"columns": 2, "price_dx": 40, "price_dy": 6, "row_gap": 14, "margin": 20},
+    "dense": {"columns": 1, "price_dx": 36, "price_dy": 2, "row_gap": 4, "margin": 10},
+}
+
+BACKGROUND = (28, 30, 34) # RGB
+NAME_COLOR = (220, 220, 220)
+PRICE_COLOR = (240, 240, 240)
+
+
+def load_font(size: int, path: str | None = None):
+    """Шрифт TrueType (path или первый из FONT_CANDIDATES). Возвращает (шрифт, есть ли кириллица)."""
+    for candidate in ([path] if path else []) + list(FONT_CANDIDATES):
+        try:
+            return ImageFont.truetype(candidate, size), True
+        except OSError:
+            continue
+    logger.warning("Шрифт TrueType с кириллицей не найден: будут только латинские названия.")
+    return ImageFont.load_default(), False
+
+
+def generate_names(count: int, seed: int = 0, cyrillic_fraction: float = 0.5) -> list:
+    """Уникальные названия товаров; доля cyrillic_fraction - кириллицей."""
+    rnd = random.Random(seed)
+    names = []
+    seen = set()
+    while len(names) < count:
+        script = "cyrillic" if rnd.random() < cyrillic_fraction else "latin"
+        adjectives, nouns = NAME_WORDS[script]
+        name = f"{rnd.choice(adjectives)} {rnd.choice(nouns)}"
+        if name in seen:
+            name = f"{name} {len(names) + 1}" # Слова повторяются: номер делает название уникальным
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def format_price(price: int) -> str:
+    return f"{price:,}$".replace(",", " ")
+
+
+def render_template(name: str, font, pad: int = 2) -> np.ndarray:
+    """Изображение названия (BGR) - так же, как оно рисуется на экране."""
+    left, top, right, bottom = font.getbbox(name)
+    image = Image.new("RGB", (right - left + 2 * pad, bottom - top + 2 * pad), BACKGROUND)
+    ImageDraw.Draw(image).text((pad - left, pad - top), name, font=font, fill=NAME_COLOR)
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+
+def render_screen(
+    catalog: list,
+    font,
+    price_font,
+    width: int,
+    height: int,
+    layout: dict,
+    rnd: random.Random,
+    noise: float = 4.0,
+) -> tuple[np.ndarray, dict]:
+    """
+    Экран рынка (BGR) со случайными товарами каталога [{"name", "base_price"}]
+    и разметка {название: цена}. Товары заполняют столбцы сверху вниз, пока помещаются.
+    """
+    image = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    labels = {}
+    margin = layout["margin"]
+    column_width = (width - margin) // layout["columns"]
+    name_height = font.getbbox("Ay")[3]
+    cell_height = name_height + layout["price_dy"] + price_font.getbbox("0")[3] + layout["row_gap"]
+    rows = max(0, (height - 2 * margin) // cell_height)
+
+    shown = rnd.sample(catalog, min(len(catalog), rows * layout["columns"]))
+    for position, entry in enumerate(shown):
+        column, row = divmod(position, rows)
+        x = margin + column * column_width
+        y = margin + row * cell_height
+        name = entry["name"]
+        left, top, right, bottom = font.getbbox(name)
+        if x + right - left + 4 > width:
+            continue
+        # Как в render_template: верхний левый угол текста - (x + 2, y + 2)
+        draw.text((x + 2 - left, y + 2 - top), name, font=font, fill=NAME_COLOR)
+        price = max(1, int(entry["base_price"] * rnd.uniform(0.6, 1.4)) // 10 * 10)
+        price_y = y + 2 + (bottom - top) + layout["price_dy"]
+        draw.text((x + layout["price_dx"], price_y), format_price(price), font=price_font, fill=PRICE_COLOR)
+        labels[name] = price
+
+    frame = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+    if noise:
+        noise_layer = np.random.default_rng(rnd.getrandbits(32)).normal(0.0, noise, frame.shape)
+        frame = np.clip(frame.astype(np.float32) + noise_layer, 0, 255).astype(np.uint8)
+    return frame, labels
+
+
+def generate_dataset(
+    out_dir: str,
+    items: int,
+    frames: int,
+    width: int = 1280,
+    height: int = 720,
+    layout: str = "list",
+    seed: int = 0,
+    noise: float = 4.0,
+    cyrillic_fraction: float = 0.5,
+    font_size: int = 18,
+    font_path: str | None = None,
+    fps: float = 10.0,
+) -> dict:
+    """Создает набор (шаблоны, items.json, кадры с разметкой). Возвращает пути набора."""
+    font, has_cyrillic = load_font(font_size, font_path)
+    price_font, _ = load_font(font_size, font_path)
+    if not has_cyrillic:
+        cyrillic_fraction = 0.0
+    rnd = random.Random(seed)
+    names = generate_names(items, seed, cyrillic_fraction)
+
+    template_dir = os.path.join(out_dir, "templates")
+    frames_dir = os.path.join(out_dir, "frames")
+    os.makedirs(template_dir, exist_ok=True)
+    os.makedirs(frames_dir, exist_ok=True)
+
+    catalog = []
+    item_records = []
+    for number, name in enumerate(names, start=1):
+        template_path = os.path.abspath(os.path.join(template_dir, f"item_{number:04d}.png"))
+        cv2.imwrite(template_path, render_template(name, font))
+        base_price = rnd.choice((100, 500, 1000, 5000, 20000, 100000)) * rnd.randint(1, 9)
+        catalog.append({"name": name, "base_price": base_price})
+        item_records.append({
+            "name": name,
+            "enabled": True,
+            "max_price": base_price,
+            "quantity": 1,
+            "bought_count": 0,
+            "template_path": template_path,
+        })
+    items_path = os.path.join(out_dir, "items.json")
+    with open(items_path, "w", encoding="utf-8") as f:
+        json.dump(item_records, f, ensure_ascii=False, indent=4)
+
+    area = {"left": 0, "top": 0, "width": width, "height": height}
+    with open(os.path.join(frames_dir, "frames.jsonl"), "w", encoding="utf-8") as index_file, \
+            open(os.path.join(frames_dir, "labels.jsonl"), "w", encoding="utf-8") as labels_file:
+        for number in range(frames):
+            frame, labels = render_screen(catalog, font, price_font, width, height, LAYOUTS[layout], rnd, noise)
+            file_name = f"{number:06d}.png"
+            cv2.imwrite(os.path.join(frames_dir, file_name), frame)
+            index_file.write(json.dumps({"file": file_name, "t": round(number / fps, 4), "area": area}) + "\n")
+            labels_file.write(json.dumps({"i": number, "items": labels}, ensure_ascii=False) + "\n")
+
+    logger.info(f"Синтетический набор '{out_dir}': {items} товаров, {frames} кадров {width}x{height} ({layout}).")
+    return {"items": items_path, "frames": frames_dir, "templates": template_dir}
+
+
+def _parse_area(text: str) -> tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def _plot(rows: list, path: str):
+    """Графики стоимости поиска и OCR на кадр от размера каталога (по одной линии на размер области)."""
+    try:
+        import matplotlib # Необязательная зависимость: pip install matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        logger.warning("matplotlib не установлен: графики не построены (таблица сохранена).")
+        return
+    figure, axes = plt.subplots(1, 2, figsize=(12, 4.5))
+    for area in sorted({row["area"] for row in rows}):
+        area_rows = sorted((row for row in rows if row["area"] == area), key=lambda row: row["items"])
+        sizes = [row["items"] for row in area_rows]
+        axes[0].plot(sizes, [row["match_ms_per_frame"] for row in area_rows], marker="o", label=area)
+        axes[1].plot(sizes, [row["ocr_ms_per_frame"] for row in area_rows], marker="o", label=area)
+    for axis, title in zip(axes, ("Поиск шаблонов, мс/кадр", "OCR, мс/кадр")):
+        axis.set_title(title)
+        axis.set_xlabel("Товаров в каталоге")
+        axis.set_xscale("log")
+        axis.grid(True, alpha=0.3)
+        axis.legend()
+    figure.tight_layout()
+    figure.savefig(path, dpi=120)
+    logger.info(f"Графики сохранены: '{path}'.")
+
+
+def run_scaling(sizes: list, areas: list, frames: int, layout: str, seed: int, work_dir: str) -> list:
+    """Прогон benchmark.run_benchmark по сетке (размер каталога, размер области)."""
+    import benchmark # Тяжелый импорт (движок, OCR) нужен только для прогона
+    import engine
+    import performance
+    from headless import load_items
+
+    profile = performance.get_profile(engine.PERFORMANCE_PROFILES, engine.PERFORMANCE_PROFILE)
+    performance.apply_environment(profile)
+    reader = engine.load_ocr_reader(profile)
+
+    rows = []
+    for width, height in areas:
+        for size in sizes:
+            out_dir = os.path.join(work_dir, f"{width}x{height}_{size}")
+            paths = generate_dataset(out_dir, size, frames, width, height, layout, seed)
+            report = benchmark.run_benchmark(
+                paths["frames"], load_items(paths["items"]),
+                benchmark.load_labels(os.path.join(paths["frames"], benchmark.LABELS_FILE)), reader,
+            )
+            stages = report["stages"]
+            accuracy = report["accuracy"] or {}
+            row = {
+                "area": f"{width}x{height}",
+                "items": size,
+                "frames": report["frames"],
+                "frames_per_second": report["frames_per_second"],
+                "match_calls_per_frame": report["match_calls_per_frame"],
+                "match_ms_per_frame": round(stages.get("match", {}).get("mean_ms", 0.0) * (report["match_calls_per_frame"] or 0), 3),
+                "ocr_calls_per_frame": report["ocr_calls_per_frame"],
+                "ocr_ms_per_frame": round(stages.get("ocr", {}).get("mean_ms", 0.0) * (report["ocr_calls_per_frame"] or 0), 3),
+                "frame_p50_ms": stages.get("frame", {}).get("p50_ms"),
+                "frame_p90_ms": stages.get("frame", {}).get("p90_ms"),
+                "detection_recall": accuracy.get("detection_recall"),
+                "price_accuracy": accuracy.get("price_accuracy"),
+            }
+            logger.info(
+                f"Прогон {width}x{height}, {size} товаров: {row['frames_per_second']} кадр/с, "
+                f"поиск {row['match_ms_per_frame']} мс/кадр, OCR {row['ocr_ms_per_frame']} мс/кадр."
+            )
+            rows.append(row)
+    return rows
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Синтетические экраны рынка и бенчмарк масштабирования.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Создать набор: шаблоны, items.json, кадры с разметкой")
+    generate.add_argument("--out", required=True)
+    generate.add_argument("--items", type=int, default=50)
+    generate.add_argument("--frames", type=int, default=30)
+    generate.add_argument("--area", default="1280x720", help="Размер кадра, ШxВ")
+    generate.add_argument("--layout", choices=sorted(LAYOUTS), default="list")
+    generate.add_argument("--noise", type=float, default=4.0, help="СКО шума яркости")
+    generate.add_argument("--cyrillic", type=float, default=0.5, help="Доля кириллических названий")
+    generate.add_argument("--font", help="Файл шрифта TrueType")
+    generate.add_argument("--font-size", type=int, default=18)
+    generate.add_argument("--seed", type=int, default=0)
+
+    scale = commands.add_parser("scale", help="Бенчмарк по размеру каталога и области")
+    scale.add_argument("--sizes", default="2,10,50,100,250,500")
+    scale.add_argument("--areas", default="1280x720,1920x1080")
+    scale.add_argument("--frames", type=int, default=20)
+    scale.add_argument("--layout", choices=sorted(LAYOUTS), default="list")
+    scale.add_argument("--seed", type=int, default=0)
+    scale.add_argument("--work-dir", help="Папка наборов (по умолчанию временная)")
+    scale.add_argument("--output", default="scaling.json", help="Таблица JSON (рядом - .csv и .png)")
+
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)-5.5s] %(message)s"))
+    root_logger = logging.getLogger("logic")
+    root_logger.addHandler(handler)
+    root_logger.setLevel(getattr(logging, args.log_level.upper(), logging.WARNING))
+
+    if args.command == "generate":
+        width, height = _parse_area(args.area)
+        generate_dataset(
+            args.out, args.items, args.frames, width, height, args.layout, args.seed,
+            args.noise, args.cyrillic, args.font_size, args.font,
+        )
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    areas = [_parse_area(area) for area in args.areas.split(",") if area]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="market_synth_")
+    rows = run_scaling(sizes, areas, args.frames, args.layout, args.seed, work_dir)
+
+    base_path = os.path.splitext(args.output)[0]
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+    if rows:
+        with open(base_path + ".csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        _plot(rows, base_path + ".png")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE market_synth.py ---
@@ -0,0 +1,244 @@
+# --- START OF FILE metrics_exporter.py ---
+
+# metrics_exporter.py
+"""
+Счетчики и гистограммы Worker'а в текстовом формате Prometheus (0.0.4)
+на локальном HTTP адресе (только stdlib):
+
+    curl http://127.0.0.1:9108/metrics
+
+WorkerMetrics подключается к движку как обработчик измерений (on_metric, см.
+engine.ScanEngine.METRICS) и событий (on_event), MetricsServer отдает его
+текущие значения по запросу. Обработчики вызываются в потоке движка, сервер
+читает значения в своем потоке - все обращения под одной блокировкой.
+"""
+import http.server
+import logging
+import threading
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.metrics_exporter")
+
+PREFIX = "market_helper_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Границы гистограммы времени этапов, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WORKER_STATES = ("running", "idle", "stopped")
+
+# Имя (без PREFIX) -> (тип, описание)
+METRIC_HELP = {
+    "frames_captured_total": ("counter", "Захваченные кадры"),
+    "frames_processed_total": ("counter", "Полностью обработанные кадры"),
+    "frames_skipped_total": ("counter", "Пропущенные кадры по причине"),
+    "item_checks_total": ("counter", "Проверки товара на кадре"),
+    "item_matches_total": ("counter", "Найденные совпадения шаблона товара"),
+    "ocr_calls_total": ("counter", "Вызовы OCR цены"),
+    "template_cache_lookups_total": ("counter", "Загрузки шаблонов через кэш шаблонов по источнику"),
+    "actions_total": ("counter", "Выполненные действия (покупки)"),
+    "refreshes_total": ("counter", "Клики по кнопке обновления списка"),
+    "errors_total": ("counter", "Ошибки Worker'а"),
+    "stage_overruns_total": ("counter", "Превышения лимита времени этапа"),
+    "stage_stalls_total": ("counter", "Зависания этапов, обнаруженные сторожем"),
+    "stage_duration_seconds": ("histogram", "Время этапов Worker'а"),
+    "action_latency_seconds": ("histogram", "Время от начала захвата кадра до клика по товару"),
+    "worker_state": ("gauge", "Состояние Worker'а (1 - текущее)"),
+}
+
+UNLABELED_COUNTERS = (
+    "frames_captured_total", "frames_processed_total", "ocr_calls_total",
+    "actions_total", "refreshes_total", "errors_total", "stage_stalls_total",
+)
+
+# Измерение stage_time этапа -> счетчик, который оно увеличивает
+STAGE_COUNTERS = {
+    "grab": "frames_captured_total",
+    "frame": "frames_processed_total",
+    "ocr": "ocr_calls_total",
+    "refresh": "refreshes_total",
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class WorkerMetrics:
+    """
+    Значения метрик Worker'а. Экземпляр передается движку как on_metric
+    и дополнительно получает события через on_event.
+    template_cache - TemplateCache, статистика которого отдается при каждом запросе.
+    """
+
+    def __init__(self, template_cache=None):
+        self.template_cache = template_cache
+        self.state = "stopped"
+        self.last_action_latency = None # Последнее время захват -> клик, секунды
+        # (имя, метки) -> значение; счетчики без меток видны с нуля, до первого события
+        self._counters = {(name, ()): 0 for name in UNLABELED_COUNTERS}
+        self._histograms = {} # (имя, метки) -> [счетчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def _inc(self, name: str, labels: tuple = (), value: float = 1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name: str, labels: tuple, value: float):
+        entry = self._histograms.get((name, labels))
+        if entry is None:
+            entry = self._histograms[(name, labels)] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                entry[i] += 1
+                break
+        entry[-2] += value
+        entry[-1] += 1
+
+    def __call__(self, name: str, *args):
+        """Обработчик измерений движка (on_metric)."""
+        with self._lock:
+            if name == "stage_time":
+                stage, seconds = args
+                self._observe("stage_duration_seconds", (("stage", stage),), seconds)
+                counter = STAGE_COUNTERS.get(stage)
+                if counter is not None:
+                    self._inc(counter)
+            elif name == "item_checked":
+                item_name, _score, found, _price = args
+                self._inc("item_checks_total", (("item", item_name),))
+                if found:
+                    self._inc("item_matches_total", (("item", item_name),))
+            elif name == "frame_skipped":
+                self._inc("frames_skipped_total", (("reason", args[0]),))
+            elif name == "worker_state":
+                self.state = args[0]
+            elif name == "action_latency":
+                self.last_action_latency = args[0]
+                self._observe("action_latency_seconds", (), args[0])
+
+    def on_event(self, event: str, *args):
+        """Обработчик событий движка (on_event)."""
+        with self._lock:
+            if event == "action_performed":
+                self._inc("actions_total")
+            elif event == "error":
+                self._inc("errors_total")
+            elif event == "stage_overrun":
+                self._inc("stage_overruns_total", (("stage", args[0]),))
+            elif event == "stage_stalled":
+                self._inc("stage_stalls_total")
+
+    def snapshot(self) -> dict:
+        """
+        Текущие значения для панели производительности (interface.py):
+        счетчики без меток, суммарное время этапов (секунды), состояние, последнее время захват -> клик
+        и загрузки шаблонов через кэш шаблонов по источнику.
+        """
+        template_stats = dict(self.template_cache.stats) if self.template_cache is not None else {}
+        with self._lock:
+            return {
+                "counters": {name: value for (name, labels), value in self._counters.items() if not labels},
+                "stage_seconds": {
+                    dict(labels)["stage"]: entry[-2]
+                    for (name, labels), entry in self._histograms.items() if name == "stage_duration_seconds"
+                },
+                "state": self.state,
+                "last_action_latency": self.last_action_latency,
+                "template_cache": template_stats,
+            }
+
+    def render(self) -> str:
+        """Текущие значения в текстовом формате Prometheus."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(entry) for key, entry in self._histograms.items()}
+            state = self.state
+        if self.template_cache is not None:
+            for source, value in dict(self.template_cache.stats).items():
+                counters[("template_cache_lookups_total", (("source", source),))] = value
+
+        lines = []
+        for name, (kind, help_text) in METRIC_HELP.items():
+            full_name = PREFIX + name
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if name == "worker_state":
+                for value in WORKER_STATES:
+                    lines.append(f'{full_name}{{state="{value}"}} {int(value == state)}')
+            elif kind == "histogram":
+                for (metric, labels), entry in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS, entry):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {entry[-1]}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(entry[-2])}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {entry[-1]}")
+            else:
+                samples = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+                for labels, value in samples:
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP сервер метрик (GET /metrics) в фоновом потоке. Ошибка запуска не мешает работе."""
+
+    def __init__(self, metrics: WorkerMetrics, port: int, host: str = "127.0.0.1"):
+        self.metrics = metrics
+        self.port = port
+        self.host = host
+        self._server = None
+        self._thread = None
+
+    def start(self) -> bool:
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Запрос метрик: {format % args}")
+
+        try:
+            self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.error(f"Не удалось открыть адрес метрик {self.host}:{self.port}: {e}. Метрики недоступны.")
+            self._server = None
+            return False
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logger.info(f"Метрики доступны: http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join(1.0)
+        self._server = None
+        logger.info("Сервер метрик остановлен.")
+
+# --- END OF FILE metrics_exporter.py ---
@@ -0,0 +1,212 @@
+# --- START OF FILE ocr_backends.py ---
+
+# ocr_backends.py
+"""
+Ускоренные CPU-бэкенды распознавания для EasyOCR.
+Worker продолжает вызывать reader.readtext(...): бэкенд подменяет только модель
+распознавания reader.recognizer (детектор текста не меняется).
+
+Бэкенды (константа OCR_BACKEND):
+  "torch" - исходная fp32 модель PyTorch;
+  "int8"  - динамическое квантование LSTM/Linear слоев в int8 (torch.quantization);
+  "onnx"  - модель, экспортированная в ONNX и выполняемая через onnxruntime
+            (нужен пакет onnxruntime, модель кэшируется в файл).
+После подмены выполняется проверка точности относительно fp32 модели на
+синтетических изображениях цен; при расхождении остается fp32 модель.
+"""
+import logging
+import os
+import time
+
+import numpy as np
+
+from lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+torch = lazy_import("torch")
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.ocr_backends")
+
+BACKEND_TORCH = "torch"
+BACKEND_INT8 = "int8"
+BACKEND_ONNX = "onnx"
+BACKENDS = (BACKEND_TORCH, BACKEND_INT8, BACKEND_ONNX)
+
+# Тексты синтетических изображений для проверки точности (типичные цены)
+ACCURACY_SAMPLE_TEXTS = (
+    "$1 250", "15 000$", "987", "$42 300", "3,500", "120 000 $",
+    "$7", "64 990$", "$250 000", "1 000 000", "$18,750", "5 555$",
+)
+
+
+def _make_price_image(text: str, scale: float = 0.7) -> np.ndarray:
+    """Рисует светлый текст цены на темном фоне (BGR), похоже на список рынка."""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    thickness = 2 if scale >= 0.7 else 1
+    (text_w, text_h), baseline = cv2.getTextSize(text, font, scale, thickness)
+    pad = 10
+    image = np.full((text_h + baseline + 2 * pad, text_w + 2 * pad, 3), 32, dtype=np.uint8)
+    cv2.putText(image, text, (pad, pad + text_h), font, scale, (235, 235, 235), thickness, cv2.LINE_AA)
+    return image
+
+
+def build_accuracy_samples(extra_image_paths: list | None = None) -> list:
+    """
+    Возвращает изображения для проверки точности: синтетические цены
+    в двух масштабах и (если есть) реальные изображения из extra_image_paths.
+    """
+    samples = []
+    for text in ACCURACY_SAMPLE_TEXTS:
+        samples.append(_make_price_image(text, 0.7))
+        samples.append(_make_price_image(text, 0.5))
+    for path in extra_image_paths or []:
+        if path and os.path.exists(path):
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is not None and image.size > 0:
+                samples.append(image)
+    return samples
+
+
+def _read_samples(reader, samples: list, allowlist: str) -> tuple[list, float]:
+    """Распознает все образцы. Возвращает (тексты, суммарное время)."""
+    results = []
+    start_time = time.perf_counter()
+    for image in samples:
+        texts = reader.readtext(image, allowlist=allowlist, detail=0)
+        # Сравниваем только цифры: остальное не влияет на распознанную цену
+        results.append("".join(ch for ch in " ".join(texts) if ch.isdigit()))
+    return results, time.perf_counter() - start_time
+
+
+def _make_onnx_module(session):
+    """
+    Создает torch.nn.Module, который EasyOCR вызывает как model(image, text),
+    а вычисления выполняет через onnxruntime.
+    """
+    input_names = [node.name for node in session.get_inputs()]
+
+    class _OnnxRecognizer(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.session = session
+
+        def forward(self, image, text=None):
+            feed = {input_names[0]: image.detach().cpu().numpy().astype(np.float32)}
+            if len(input_names) > 1 and text is not None:
+                feed[input_names[1]] = text.detach().cpu().numpy()
+            output = self.session.run(None, feed)[0]
+            return torch.from_numpy(output)
+
+    return _OnnxRecognizer()
+
+
+def _export_onnx(recognizer, path: str, image_height: int):
+    """Экспортирует модель распознавания EasyOCR в ONNX (динамические батч и ширина)."""
+    recognizer.eval()
+    dummy_image = torch.zeros((1, 1, image_height, 256), dtype=torch.float32)
+    dummy_text = torch.zeros((1, 1), dtype=torch.long)
+    temp_path = path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            recognizer, (dummy_image, dummy_text), temp_path,
+            input_names=["image", "text"], output_names=["preds"],
+            dynamic_axes={"image": {0: "batch", 3: "width"}, "text": {0: "batch"}, "preds": {0: "batch", 1: "steps"}},
+            opset_version=13,
+        )
+    os.replace(temp_path, path)
+
+
+def _to_int8(recognizer):
+    """Динамическое квантование LSTM и Linear слоев модели распознавания."""
+    recognizer.eval()
+    return torch.quantization.quantize_dynamic(
+        recognizer, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def _to_onnx(recognizer, onnx_path: str, image_height: int):
+    """Загружает (экспортируя при необходимости) ONNX модель и оборачивает ее в nn.Module."""
+    import onnxruntime # Необязательная зависимость: pip install onnxruntime
+
+    if not os.path.exists(onnx_path):
+        logger.info(f"Экспорт модели распознавания в ONNX: {onnx_path}")
+        _export_onnx(recognizer, onnx_path, image_height)
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+    return _make_onnx_module(session)
+
+
+def apply_ocr_backend(
+    reader,
+    backend: str,
+    onnx_path: str,
+    allowlist: str,
+    check_accuracy: bool = True,
+    min_agreement: float = 1.0,
+    extra_sample_paths: list | None = None,
+) -> str:
+    """
+    Подменяет модель распознавания reader на выбранный бэкенд.
+    Если check_accuracy, сравнивает результаты с fp32 моделью; при доле совпадений
+    ниже min_agreement возвращает fp32 модель. Возвращает фактический бэкенд.
+    """
+    if backend == BACKEND_TORCH:
+        return BACKEND_TORCH
+    if backend not in BACKENDS:
+        logger.warning(f"Неизвестный OCR бэкенд '{backend}'. Используется '{BACKEND_TORCH}'.")
+        return BACKEND_TORCH
+
+    original = reader.recognizer
+    samples = build_accuracy_samples(extra_sample_paths) if check_accuracy else []
+    if samples:
+        reference, reference_time = _read_samples(reader, samples, allowlist)
+
+    try:
+        if backend == BACKEND_INT8:
+            reader.recognizer = _to_int8(original)
+        else:
+            image_height = getattr(reader, "imgH", 64)
+            reader.recognizer = _to_onnx(original, onnx_path, image_height)
+    except ImportError as e:
+        logger.warning(f"OCR бэкенд '{backend}' недоступен ({e}). Используется '{BACKEND_TORCH}'.")
+        reader.recognizer = original
+        return BACKEND_TORCH
+    except Exception:
+        logger.exception(f"Ошибка подготовки OCR бэкенда '{backend}'. Используется '{BACKEND_TORCH}'.")
+        reader.recognizer = original
+        return BACKEND_TORCH
+
+    if not samples:
+        logger.info(f"OCR бэкенд '{backend}' включен без проверки точности.")
+        return backend
+
+    try:
+        candidate, candidate_time = _read_samples(reader, samples, allowlist)
+    except Exception:
+        logger.exception(f"Ошибка распознавания бэкендом '{backend}'. Используется '{BACKEND_TORCH}'.")
+        reader.recognizer = original
+        return BACKEND_TORCH
+
+    matches = sum(1 for ref, cand in zip(reference, candidate) if ref == cand)
+    agreement = matches / len(samples)
+    speedup = reference_time / candidate_time if candidate_time > 0 else 0.0
+    logger.info(
+        f"Проверка OCR бэкенда '{backend}': совпадений с fp32 {matches}/{len(samples)} "
+        f"({agreement:.0%}), время {candidate_time:.2f}с против {reference_time:.2f}с (x{speedup:.2f})."
+    )
+    for ref, cand in zip(reference, candidate):
+        if ref != cand:
+            logger.debug(f"  Расхождение: fp32='{ref}', {backend}='{cand}'")
+
+    if agreement < min_agreement:
+        logger.warning(
+            f"Точность бэкенда '{backend}' ниже порога ({agreement:.0%} < {min_agreement:.0%}). "
+            f"Используется '{BACKEND_TORCH}'."
+        )
+        reader.recognizer = original
+        return BACKEND_TORCH
+    return backend
+
+# --- END OF FILE ocr_backends.py ---
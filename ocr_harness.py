@@ -0,0 +1,146 @@
+# --- START OF FILE ocr_harness.py ---
+
+# ocr_harness.py
+"""
+Проверка бэкендов распознавания цены на корпусе областей цены (price_corpus.py):
+
+    python ocr_harness.py --corpus price_corpus --backend recorded --backend torch --backend int8
+
+Для каждого образца бэкенд распознает область, цена выбирается той же функцией,
+что и в Worker'е (engine.select_price_candidate), и сравнивается с разметкой "label".
+Отчет (JSON) по каждому бэкенду: точность, доля отказов (цена не выбрана), доля
+ошибочных цен, время одного распознавания (перцентили) и расхождения.
+
+Бэкенды:
+  recorded           - результаты OCR, сохраненные при сборе (проверка логики выбора цены);
+  torch / int8 / onnx - EasyOCR с бэкендом модели распознавания (см. ocr_backends.py);
+  модуль:функция     - свой бэкенд: функция без аргументов возвращает read(roi_bgr),
+                       которая возвращает результат в формате EasyOCR detail=1.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+
+import engine
+import ocr_backends
+import performance
+from benchmark import summarize_times
+from engine import load_ocr_reader, select_price_candidate
+from headless import _setup_logging, apply_config
+from lazy_import import lazy_import
+from price_corpus import load_corpus
+
+cv2 = lazy_import("cv2")
+
+logger = logging.getLogger("logic.ocr_harness")
+
+BACKEND_RECORDED = "recorded"
+
+
+def make_backend(name: str):
+    """Возвращает read(roi_bgr, sample) -> результаты OCR (EasyOCR detail=1)."""
+    if name == BACKEND_RECORDED:
+        return lambda roi_bgr, sample: sample["ocr"]
+
+    if name in ocr_backends.BACKENDS:
+        engine.OCR_BACKEND = name # load_ocr_reader подменяет модель по OCR_BACKEND
+        # Без встроенной проверки точности: иначе при расхождении молча остается fp32 модель
+        engine.OCR_BACKEND_ACCURACY_CHECK = False
+        profile = performance.get_profile(engine.PERFORMANCE_PROFILES, engine.PERFORMANCE_PROFILE)
+        reader = load_ocr_reader(profile)
+        return lambda roi_bgr, sample: reader.readtext(roi_bgr, allowlist=engine.OCR_PRICE_ALLOWLIST, detail=1)
+
+    if ":" in name:
+        module_name, function_name = name.split(":", 1)
+        read = getattr(importlib.import_module(module_name), function_name)()
+        return lambda roi_bgr, sample: read(roi_bgr)
+
+    raise ValueError(f"Неизвестный бэкенд '{name}'.")
+
+
+def evaluate(name: str, read, samples: list) -> dict:
+    """Прогоняет бэкенд по образцам и возвращает сводку."""
+    correct = rejected = wrong = false_reads = 0
+    times = []
+    mismatches = []
+    for sample in samples:
+        roi_bgr = cv2.imread(sample["path"], cv2.IMREAD_COLOR)
+        if roi_bgr is None:
+            logger.warning(f"Образец '{sample['path']}' не прочитан. Пропуск.")
+            continue
+        start_time = time.perf_counter()
+        ocr_results = read(roi_bgr, sample)
+        times.append(time.perf_counter() - start_time)
+
+        candidate, _ = select_price_candidate(ocr_results, (0, 0), tuple(sample["template_box"]))
+        price = int(candidate[0]) if candidate else None
+        label = sample.get("label")
+        if price == label:
+            correct += 1
+            continue
+        if label is None:
+            false_reads += 1 # Цены на области нет, а бэкенд ее "нашел"
+        elif price is None:
+            rejected += 1
+        else:
+            wrong += 1
+        if len(mismatches) < 50:
+            mismatches.append({"file": sample["file"], "label": label, "read": price,
+                               "texts": [text for _, text, _ in ocr_results]})
+
+    total = correct + rejected + wrong + false_reads
+    return {
+        "backend": name,
+        "samples": total,
+        "accuracy": round(correct / total, 4) if total else None,
+        "rejection_rate": round(rejected / total, 4) if total else None,
+        "wrong_price_rate": round(wrong / total, 4) if total else None,
+        "false_read_rate": round(false_reads / total, 4) if total else None,
+        "read_time": summarize_times(times),
+        "mismatches": mismatches,
+    }
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Точность и скорость распознавания цены на корпусе областей.")
+    parser.add_argument("--corpus", default=os.path.join(engine.BASE_DIR, engine.PRICE_CORPUS_FOLDER))
+    parser.add_argument("--backend", action="append", help="Бэкенд (можно несколько), по умолчанию recorded и OCR_BACKEND")
+    parser.add_argument("--verified-only", action="store_true", help="Только образцы с проверенной разметкой")
+    parser.add_argument("--config", help="JSON с переопределением констант движка")
+    parser.add_argument("--output", help="Файл отчета JSON (по умолчанию stdout)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    _setup_logging(None, args.log_level)
+    if args.config:
+        apply_config(args.config)
+    performance.apply_environment(performance.get_profile(engine.PERFORMANCE_PROFILES, engine.PERFORMANCE_PROFILE))
+
+    samples = load_corpus(args.corpus, args.verified_only)
+    if not samples:
+        logger.error(f"В корпусе '{args.corpus}' нет образцов.")
+        return 2
+
+    report = {"corpus": args.corpus, "samples": len(samples), "backends": []}
+    for name in args.backend or [BACKEND_RECORDED, engine.OCR_BACKEND]:
+        report["backends"].append(evaluate(name, make_backend(name), samples))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        temp_path = args.output + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        os.replace(temp_path, args.output)
+    else:
+        sys.stdout.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE ocr_harness.py ---
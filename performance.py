@@ -0,0 +1,122 @@
+# --- START OF FILE performance.py ---
+
+# performance.py
+"""
+Профиль производительности: количество потоков torch/OpenCV и привязка
+потока Worker'а к ядрам CPU (см. PERFORMANCE_PROFILES в constants.py).
+Нужен, чтобы несколько экземпляров приложения на одной машине не боролись
+за все ядра сразу.
+
+Применяется в три этапа:
+  apply_environment()  - переменные окружения OpenMP/MKL, до импорта torch;
+  apply_libraries()    - torch.set_num_threads и cv2.setNumThreads (фоновая загрузка);
+  apply_thread_affinity() - привязка текущего потока к ядрам (старт Worker'а).
+"""
+import ctypes
+import logging
+import os
+import sys
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.performance")
+
+# Переменные окружения пулов потоков, которые читаются при импорте torch/numpy
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def get_profile(profiles: dict, name: str) -> dict:
+    """Возвращает настройки профиля name (пустой профиль, если не найден)."""
+    profile = profiles.get(name)
+    if profile is None:
+        logger.warning(f"Профиль производительности '{name}' не найден. Настройки потоков не меняются.")
+        return {}
+    return profile
+
+
+def apply_environment(profile: dict):
+    """
+    Ограничивает пулы потоков OpenMP/MKL через переменные окружения.
+    Действует, только если вызвано до импорта torch. Заданные пользователем
+    переменные окружения не перезаписываются.
+    """
+    intra_threads = profile.get("torch_intra_op_threads")
+    if not intra_threads:
+        return
+    if "torch" in sys.modules:
+        logger.warning("torch уже импортирован: переменные окружения потоков не подействуют.")
+    for var in _THREAD_ENV_VARS:
+        if var not in os.environ:
+            os.environ[var] = str(intra_threads)
+
+
+def apply_libraries(profile: dict, torch_module=None, cv2_module=None):
+    """Устанавливает количество потоков torch и OpenCV. None в профиле - не менять."""
+    intra_threads = profile.get("torch_intra_op_threads")
+    inter_threads = profile.get("torch_inter_op_threads")
+    opencv_threads = profile.get("opencv_threads")
+
+    if torch_module is not None:
+        if intra_threads:
+            torch_module.set_num_threads(int(intra_threads))
+        if inter_threads:
+            try:
+                torch_module.set_num_interop_threads(int(inter_threads))
+            except RuntimeError as e:
+                # Можно вызвать только до первой параллельной операции torch
+                logger.warning(f"Не удалось установить inter-op потоки torch: {e}")
+
+    if cv2_module is not None and opencv_threads is not None:
+        # 0 - OpenCV работает без собственного пула потоков
+        cv2_module.setNumThreads(int(opencv_threads))
+
+
+def apply_thread_affinity(cpus) -> bool:
+    """
+    Привязывает ТЕКУЩИЙ поток к ядрам cpus (список номеров).
+    Потоки, созданные из него позже (например, пул OpenMP), наследуют привязку (Linux).
+    Возвращает True при успехе.
+    """
+    if not cpus:
+        return False
+    cpus = sorted({int(cpu) for cpu in cpus if int(cpu) >= 0})
+    try:
+        if sys.platform == "win32":
+            mask = 0
+            for cpu in cpus:
+                mask |= 1 << cpu
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentThread.restype = ctypes.c_void_p
+            kernel32.SetThreadAffinityMask.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+            kernel32.SetThreadAffinityMask.restype = ctypes.c_size_t
+            if not kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), mask):
+                raise OSError(f"SetThreadAffinityMask вернул 0 (маска {mask:#x})")
+        elif hasattr(os, "sched_setaffinity"):
+            # В Linux pid 0 означает вызывающий поток
+            os.sched_setaffinity(0, cpus)
+        else:
+            logger.warning("Привязка потоков к ядрам не поддерживается на этой платформе.")
+            return False
+    except Exception as e:
+        logger.warning(f"Не удалось привязать поток к ядрам {cpus}: {e}")
+        return False
+    return True
+
+
+def describe_effective(torch_module=None, cv2_module=None) -> str:
+    """Возвращает строку с фактическими настройками потоков (для лога)."""
+    parts = [f"ядер CPU: {os.cpu_count()}"]
+    if torch_module is not None:
+        parts.append(
+            f"torch intra-op: {torch_module.get_num_threads()}, "
+            f"inter-op: {torch_module.get_num_interop_threads()}"
+        )
+    if cv2_module is not None:
+        parts.append(f"OpenCV: {cv2_module.getNumThreads()}")
+    if hasattr(os, "sched_getaffinity"):
+        parts.append(f"ядра текущего потока: {sorted(os.sched_getaffinity(0))}")
+    env = {var: os.environ[var] for var in _THREAD_ENV_VARS if var in os.environ}
+    if env:
+        parts.append(f"окружение: {env}")
+    return ", ".join(parts)
+
+# --- END OF FILE performance.py ---
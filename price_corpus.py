@@ -0,0 +1,115 @@
+# --- START OF FILE price_corpus.py ---
+
+# price_corpus.py
+"""
+Корпус областей цены (ROI) для настройки и проверки распознавания цены.
+Worker (при PRICE_CORPUS_ENABLED) сохраняет каждую область, на которой выполнялся
+OCR, вместе с результатом OCR и разобранной ценой. ocr_harness.py прогоняет
+по корпусу любой бэкенд распознавания и сравнивает результат с разметкой.
+
+Папка корпуса:
+  roi_NNNNNN.png - область OCR (BGR, как ее видел Worker);
+  corpus.jsonl   - строка на образец:
+    {"file", "item", "time", "template_box" [x, y, w, h] (название относительно области),
+     "ocr" [[bbox, текст, уверенность], ...], "parsed" (цена или null), "rejected" {причина: блоков},
+     "label" (верная цена или null - цены на области нет), "verified" (разметка проверена)}.
+Поле "label" сначала заполняется разобранной ценой ("verified": false); ошибки
+исправляются вручную в corpus.jsonl с установкой "verified": true.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.price_corpus")
+
+INDEX_FILE = "corpus.jsonl"
+
+
+def _plain_ocr_results(ocr_results: list) -> list:
+    """Результаты EasyOCR (с числами numpy) -> списки JSON."""
+    return [
+        [[[int(x), int(y)] for x, y in bbox], str(text), round(float(confidence), 4)]
+        for bbox, text, confidence in ocr_results
+    ]
+
+
+class PriceCorpusWriter:
+    """
+    Добавляет образцы в корпус folder (не больше max_samples вместе с уже собранными).
+    Запись маленького PNG занимает доли миллисекунды на фоне OCR, поэтому выполняется сразу.
+    """
+
+    def __init__(self, folder: str, max_samples: int = 5000):
+        self.folder = folder
+        self.max_samples = max_samples
+        self.count = None # Образцов в корпусе (None - папка еще не открыта)
+        self._lock = threading.Lock()
+
+    def _open(self):
+        os.makedirs(self.folder, exist_ok=True)
+        index_path = os.path.join(self.folder, INDEX_FILE)
+        self.count = 0
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                self.count = sum(1 for line in f if line.strip())
+        logger.info(f"Корпус областей цены '{self.folder}': {self.count} образцов.")
+
+    @property
+    def full(self) -> bool:
+        return self.count is not None and self.count >= self.max_samples
+
+    def add(self, roi_bgr, template_box: tuple, ocr_results: list, item_name: str, parsed: int | None, rejected: dict) -> bool:
+        """Сохраняет образец. Возвращает False, если корпус заполнен или запись не удалась."""
+        with self._lock:
+            try:
+                if self.count is None:
+                    self._open()
+                if self.full:
+                    return False
+                file_name = f"roi_{self.count + 1:06d}.png"
+                if not cv2.imwrite(os.path.join(self.folder, file_name), roi_bgr):
+                    raise OSError(f"cv2.imwrite не записал '{file_name}'")
+                record = {
+                    "file": file_name,
+                    "item": item_name,
+                    "time": round(time.time(), 3),
+                    "template_box": [int(value) for value in template_box],
+                    "ocr": _plain_ocr_results(ocr_results),
+                    "parsed": parsed,
+                    "rejected": rejected,
+                    "label": parsed,
+                    "verified": False,
+                }
+                with open(os.path.join(self.folder, INDEX_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.count += 1
+                if self.full:
+                    logger.info(f"Корпус областей цены заполнен ({self.max_samples} образцов). Сбор остановлен.")
+                return True
+            except Exception as e:
+                logger.error(f"Не удалось сохранить образец в корпус областей цены: {e}")
+                return False
+
+
+def load_corpus(folder: str, verified_only: bool = False) -> list:
+    """Образцы корпуса (записи corpus.jsonl с полным путем "path")."""
+    samples = []
+    with open(os.path.join(folder, INDEX_FILE), "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if verified_only and not record.get("verified"):
+                continue
+            record["path"] = os.path.join(folder, record["file"])
+            samples.append(record)
+    return samples
+
+# --- END OF FILE price_corpus.py ---
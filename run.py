@@ -17,6 +17,10 @@ except Exception:
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
+# Профилировщик запуска включается до импорта main, чтобы замерить все импорты
+import startup_profiler
+startup_profiler.enable_from_argv()
+
 # Теперь можно безопасно импортировать main
 try:
     import main
@@ -29,28 +33,7 @@ except ImportError as e:
 
 # Запуск основного скрипта
 if __name__ == "__main__":
-    # main.py содержит блок if __name__ == '__main__':
-    # который инициализирует QApplication и запускает основной цикл.
-    # Просто делегируем выполнение туда.
-    main # Выполнение кода модуля main происходит при импорте.
-    # Чтобы запустить блок if __name__ == '__main__': в main.py,
-    # нужно убедиться, что main.__name__ == '__main__'.
-    # В обычном импорте __name__ модуля становится именем модуля ('main').
-    # Для запуска как основного скрипта, можно сделать так:
-
-    # Сохраняем оригинальное значение __name__ текущего модуля
-    original_name = __name__
-
-    # Временно меняем __name__ модуля main на '__main__', чтобы его блок выполнился
-    if hasattr(main, '__name__'):
-        main.__name__ = '__main__'
-
-    # Запускаем main.py. Код внутри его if __name__ == '__main__': выполнится.
-    # Не вызываем main.main() или что-то подобное, просто позволяем скрипту исполниться.
-
-    # После того как main.py завершится (например, sys.exit), этот скрипт тоже завершится.
-    # Если main.py не завершается явно, а просто выходит из своего __main__ блока,
-    # то выполнение продолжится здесь. Но в нашем случае main.py вызывает sys.exit().
-
-    # Можно добавить print для отладки последовательности выполнения
-    # print("run.py завершает работу (после выполнения main.py).", file=sys.stderr
\ No newline at end of file
+    # Код модуля main выполняется при импорте (BASE_DIR, импорты, обработчик исключений),
+    # а приложение запускается функцией main.main(). Флаг --profile-startup
+    # обрабатывается в main.py (профилировщик включен выше, до импорта main).
+    sys.exit(main.main())
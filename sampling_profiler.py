@@ -0,0 +1,146 @@
+# --- START OF FILE sampling_profiler.py ---
+
+# sampling_profiler.py
+"""
+Выборочный профилировщик потоков внутри процесса (без перезапуска под профилировщиком).
+Фоновый поток каждые interval секунд снимает стеки выбранных потоков
+(sys._current_frames) и считает одинаковые стеки. Накладные расходы почти
+не зависят от кода профилируемого потока, поэтому профилировщик можно включать
+на работающем сеансе.
+
+Результат (save):
+  <base>.collapsed - стеки в формате "поток;функция;...;функция количество"
+                     (flamegraph.pl, https://www.speedscope.app, inferno);
+  <base>.txt       - функции с наибольшей долей выборок: собственная (функция
+                     на вершине стека) и полная (функция где-либо в стеке).
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.sampling_profiler")
+
+
+def _code_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    thread_filter(имя потока) -> bool выбирает профилируемые потоки; потоки
+    проверяются заново каждые полсекунды, поэтому перезапущенный Worker
+    попадает в профиль без перезапуска профилировщика.
+    """
+
+    THREADS_REFRESH_INTERVAL = 0.5
+
+    def __init__(self, thread_filter, interval: float = 0.005):
+        self.thread_filter = thread_filter
+        self.interval = interval
+        self.samples = 0
+        self._stacks = {} # (группа потока, код корня, ..., код вершины) -> выборок
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self._duration = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self.samples = 0
+        self._stacks = {}
+        self._stop_event.clear()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Профилировщик запущен (интервал {self.interval * 1000:.1f} мс).")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(1.0)
+        self._thread = None
+        self._duration = time.monotonic() - self._started_at
+        logger.info(f"Профилировщик остановлен: {self.samples} выборок за {self._duration:.1f}с.")
+
+    def _loop(self):
+        own_ident = threading.get_ident()
+        targets = {} # ident -> группа потока (имя без номера экземпляра)
+        next_refresh = 0.0
+        while not self._stop_event.wait(self.interval):
+            now = time.monotonic()
+            if now >= next_refresh:
+                targets = {
+                    thread.ident: thread.name.split("_", 1)[0]
+                    for thread in threading.enumerate()
+                    if thread.ident != own_ident and self.thread_filter(thread.name)
+                }
+                next_refresh = now + self.THREADS_REFRESH_INTERVAL
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for ident, group in targets.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                key = (group, *reversed(codes))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+            del frames # Не держим кадры потоков между выборками
+
+    def save(self, base_path: str, top: int = 40) -> tuple[str, str]:
+        """Сохраняет стеки (.collapsed) и сводку (.txt). Возвращает пути файлов."""
+        stacks = dict(self._stacks)
+        collapsed = {}
+        self_counts = {}
+        total_counts = {}
+        for (group, *codes), count in stacks.items():
+            labels = [_code_label(code) for code in codes]
+            line = ";".join([group] + labels)
+            collapsed[line] = collapsed.get(line, 0) + count
+            if labels:
+                self_counts[labels[-1]] = self_counts.get(labels[-1], 0) + count
+            for label in set(labels):
+                total_counts[label] = total_counts.get(label, 0) + count
+
+        os.makedirs(os.path.dirname(os.path.abspath(base_path)), exist_ok=True)
+        collapsed_path = base_path + ".collapsed"
+        summary_path = base_path + ".txt"
+        temp_path = collapsed_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for line, count in sorted(collapsed.items()):
+                f.write(f"{line} {count}\n")
+        os.replace(temp_path, collapsed_path)
+
+        stack_samples = sum(collapsed.values()) or 1
+        lines = [
+            f"Выборок: {self.samples} за {self._duration:.1f}с (интервал {self.interval * 1000:.1f} мс), "
+            f"стеков потоков: {stack_samples}",
+            "",
+            f"{'собств.%':>9} {'полное%':>9}  функция",
+        ]
+        for label, count in sorted(self_counts.items(), key=lambda item: item[1], reverse=True)[:top]:
+            lines.append(f"{count / stack_samples:9.1%} {total_counts[label] / stack_samples:9.1%}  {label}")
+        lines += ["", f"{'полное%':>9}  функция (по полной доле)"]
+        for label, count in sorted(total_counts.items(), key=lambda item: item[1], reverse=True)[:top]:
+            lines.append(f"{count / stack_samples:9.1%}  {label}")
+        temp_path = summary_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, summary_path)
+        logger.info(f"Профиль сохранен: '{collapsed_path}', '{summary_path}'.")
+        return collapsed_path, summary_path
+
+# --- END OF FILE sampling_profiler.py ---
@@ -0,0 +1,126 @@
+# --- START OF FILE stage_watchdog.py ---
+
+# stage_watchdog.py
+"""
+Сторожевой поток этапов Worker'а.
+Этап (захват экрана, поиск шаблона, OCR, клик) отмечается контекстным менеджером
+track(); отдельный поток периодически проверяет, сколько длится каждый активный
+этап, и при превышении лимита (WATCHDOG_STAGE_DEADLINES) один раз сообщает
+о зависании событием со стеком зависшего потока.
+Модуль не зависит от PyQt.
+"""
+import logging
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.stage_watchdog")
+
+
+class StageWatchdog:
+    """
+    Сторож этапов. on_stall(event) вызывается в потоке сторожа; event - словарь:
+    "stage", "elapsed", "deadline", "thread", "stack" (текст), "time" (time.time()).
+    Этапы без лимита в deadlines не проверяются.
+    """
+
+    def __init__(self, deadlines: dict, check_interval: float = 0.5, on_stall=None, name: str = "StageWatchdog"):
+        self.deadlines = dict(deadlines)
+        self.check_interval = check_interval
+        self.on_stall = on_stall
+        self.name = name
+        self.stalls = {} # этап -> количество зависаний
+        self._active = {} # id потока -> список активных этапов потока (вложенные этапы)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # --- Отметка этапов ---
+
+    @contextmanager
+    def track(self, stage: str):
+        """Отмечает выполнение этапа stage текущим потоком."""
+        thread = threading.current_thread()
+        entry = {"stage": stage, "start": time.monotonic(), "thread": thread.name, "reported": False}
+        with self._lock:
+            self._active.setdefault(thread.ident, []).append(entry)
+        try:
+            yield
+        finally:
+            with self._lock:
+                entries = self._active.get(thread.ident, [])
+                if entry in entries:
+                    entries.remove(entry)
+                if not entries:
+                    self._active.pop(thread.ident, None)
+            if entry["reported"]:
+                logger.warning(
+                    f"[{self.name}] Этап '{stage}' ({entry['thread']}) завершился "
+                    f"после зависания через {time.monotonic() - entry['start']:.2f}с."
+                )
+
+    # --- Поток сторожа ---
+
+    def start(self):
+        """Запускает поток сторожа (повторный вызов ничего не делает)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток сторожа."""
+        self._stop_event.set()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception(f"[{self.name}] Ошибка проверки этапов:")
+
+    def check(self) -> list:
+        """Проверяет активные этапы. Возвращает список новых событий зависания."""
+        now = time.monotonic()
+        stalled = []
+        with self._lock:
+            for thread_ident, entries in self._active.items():
+                for entry in entries:
+                    deadline = self.deadlines.get(entry["stage"])
+                    if deadline is None or entry["reported"] or now - entry["start"] < deadline:
+                        continue
+                    entry["reported"] = True
+                    stalled.append((thread_ident, entry, deadline))
+
+        events = []
+        frames = sys._current_frames() if stalled else {}
+        for thread_ident, entry, deadline in stalled:
+            frame = frames.get(thread_ident)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(стек недоступен)"
+            event = {
+                "stage": entry["stage"],
+                "elapsed": now - entry["start"],
+                "deadline": deadline,
+                "thread": entry["thread"],
+                "stack": stack,
+                "time": time.time(),
+            }
+            self.stalls[entry["stage"]] = self.stalls.get(entry["stage"], 0) + 1
+            logger.error(
+                f"[{self.name}] Зависание этапа '{event['stage']}' в потоке {event['thread']}: "
+                f"{event['elapsed']:.2f}с (лимит {deadline:.2f}с). Стек:\n{stack}"
+            )
+            events.append(event)
+            if self.on_stall is not None:
+                try:
+                    self.on_stall(event)
+                except Exception:
+                    logger.exception(f"[{self.name}] Ошибка обработчика зависания:")
+        return events
+
+# --- END OF FILE stage_watchdog.py ---
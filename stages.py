@@ -0,0 +1,178 @@
+# --- START OF FILE stages.py ---
+
+# stages.py
+"""
+Этапы обработки кадра с ограничением времени и отменой.
+Вызов reader.readtext или cv2.matchTemplate нельзя прервать изнутри, поэтому
+этап выполняется в отдельном потоке-исполнителе, а вызывающий поток (Worker)
+ждет результат короткими интервалами, проверяя флаг остановки.
+При остановке или превышении срока Worker сразу продолжает работу (StageCancelled /
+StageDeadlineExceeded), а брошенный этап дорабатывает в исполнителе, и его
+результат отбрасывается. Исполнитель один: этапы с общим ресурсом (модель OCR)
+не выполняются параллельно. Модуль не зависит от PyQt.
+"""
+import logging
+import queue
+import threading
+import time
+
+import performance
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.stages")
+
+
+class StageCancelled(Exception):
+    """Этап прерван запросом остановки."""
+
+
+class StageDeadlineExceeded(Exception):
+    """Этап не уложился в отведенное время."""
+
+    def __init__(self, stage: str, deadline: float, elapsed: float):
+        super().__init__(f"Этап '{stage}' превысил лимит {deadline:.2f}с ({elapsed:.2f}с)")
+        self.stage = stage
+        self.deadline = deadline
+        self.elapsed = elapsed
+
+
+class _Job:
+    """Задание исполнителя: функция, ее результат и событие завершения."""
+
+    def __init__(self, stage: str, func, args, kwargs):
+        self.stage = stage
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.started_at = None # time.monotonic() начала выполнения
+
+
+class StageRunner:
+    """
+    Исполнитель этапов с ограничением времени.
+    stop_event - событие остановки вызывающего потока (threading.Event);
+    on_overrun(stage, elapsed) - вызывается в вызывающем потоке при превышении срока;
+    watchdog - сторож (stage_watchdog.StageWatchdog), следящий за самими вызовами;
+    cpus - ядра CPU для потока-исполнителя (в Windows новый поток не наследует
+    привязку создавшего его потока, поэтому она применяется в самом исполнителе).
+    """
+
+    def __init__(self, name: str, stop_event: threading.Event, poll_interval: float = 0.05, on_overrun=None, watchdog=None, cpus=None):
+        self.name = name
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.on_overrun = on_overrun
+        self.watchdog = watchdog # StageWatchdog: этапы отмечаются в потоке-исполнителе
+        self.cpus = cpus
+        self.overruns = {} # этап -> количество превышений срока
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._current = None # Выполняемое (возможно, брошенное) задание
+        self._lock = threading.Lock()
+
+    # --- Поток-исполнитель ---
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # daemon: зависший этап не должен мешать завершению процесса
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        if self.cpus and performance.apply_thread_affinity(self.cpus):
+            logger.info(f"[{self.name}] Поток этапов привязан к ядрам CPU: {self.cpus}.")
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            with self._lock:
+                self._current = job
+            job.started_at = time.monotonic()
+            try:
+                if self.watchdog is not None:
+                    with self.watchdog.track(job.stage):
+                        job.result = job.func(*job.args, **job.kwargs)
+                else:
+                    job.result = job.func(*job.args, **job.kwargs)
+            except BaseException as e:
+                job.error = e
+            finally:
+                with self._lock:
+                    self._current = None
+                job.done.set()
+
+    @property
+    def busy(self) -> bool:
+        """True, если исполнитель выполняет этап (в том числе брошенный)."""
+        with self._lock:
+            return self._current is not None
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Ждет завершения текущего этапа не дольше timeout. Возвращает True, если исполнитель свободен."""
+        end_time = time.monotonic() + max(0.0, timeout)
+        while self.busy:
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+        return True
+
+    def shutdown(self):
+        """Завершает поток-исполнитель после текущего этапа (не ждет его)."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._jobs.put(None)
+
+    # --- Выполнение этапа ---
+
+    def run(self, stage: str, deadline: float, func, *args, **kwargs):
+        """
+        Выполняет func(*args, **kwargs) в исполнителе и возвращает результат.
+        Бросает StageCancelled при установке stop_event и StageDeadlineExceeded,
+        если этап (вместе с ожиданием брошенного ранее этапа) дольше deadline.
+        Исключение func пробрасывается вызывающему.
+        """
+        start_time = time.monotonic()
+        end_time = start_time + deadline
+
+        # Брошенный ранее этап еще выполняется - ждем его в пределах того же срока
+        while self.busy:
+            self._check(stage, deadline, start_time, end_time)
+            time.sleep(self.poll_interval)
+
+        job = _Job(stage, func, args, kwargs)
+        self._ensure_thread()
+        self._jobs.put(job)
+        while not job.done.wait(self.poll_interval):
+            self._check(stage, deadline, start_time, end_time)
+
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _check(self, stage: str, deadline: float, start_time: float, end_time: float):
+        """Проверка остановки и срока во время ожидания этапа."""
+        if self.stop_event.is_set():
+            raise StageCancelled(stage)
+        now = time.monotonic()
+        if now >= end_time:
+            elapsed = now - start_time
+            self.overruns[stage] = self.overruns.get(stage, 0) + 1
+            logger.warning(
+                f"[{self.name}] Этап '{stage}' превысил лимит {deadline:.2f}с "
+                f"(превышений: {self.overruns[stage]}). Результат будет отброшен."
+            )
+            if self.on_overrun is not None:
+                try:
+                    self.on_overrun(stage, elapsed)
+                except Exception:
+                    logger.exception(f"[{self.name}] Ошибка обработчика превышения срока:")
+            raise StageDeadlineExceeded(stage, deadline, elapsed)
+
+# --- END OF FILE stages.py ---
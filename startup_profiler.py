@@ -0,0 +1,159 @@
+# --- START OF FILE startup_profiler.py ---
+
+# startup_profiler.py
+"""
+Профилировщик запуска приложения. Включается флагом командной строки
+--profile-startup (main.py / run.py).
+Замеряет время импорта каждого модуля (полное - вместе с вложенными импортами,
+и собственное) и время именованных этапов инициализации (section()).
+Модуль не зависит от PyQt и сторонних библиотек.
+"""
+import importlib.abc
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_FLAG = "--profile-startup"
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.startup_profiler")
+
+_enabled = False
+_start_time = None # time.perf_counter() момента включения профилировщика
+_lock = threading.Lock()
+_thread_state = threading.local() # Стек вложенных импортов потока и защита от рекурсии
+_imports = {} # имя модуля -> [полное время, собственное время, поток]
+_sections = [] # [(название, начало от старта, длительность, поток)]
+
+
+def _import_stack() -> list:
+    stack = getattr(_thread_state, "stack", None)
+    if stack is None:
+        stack = _thread_state.stack = []
+    return stack
+
+
+class _TimingLoader(importlib.abc.Loader):
+    """Обертка загрузчика: замеряет выполнение кода модуля."""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Модуль должен видеть настоящий загрузчик (importlib.resources и т.п.)
+        module.__loader__ = self._loader
+        if getattr(module, "__spec__", None) is not None:
+            module.__spec__.loader = self._loader
+
+        stack = _import_stack()
+        stack.append(0.0) # Время вложенных импортов
+        start_time = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with _lock:
+                _imports[module.__name__] = [elapsed, elapsed - children, threading.current_thread().name]
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Поисковик модулей, оборачивающий найденный загрузчик в _TimingLoader."""
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(_thread_state, "finding", False):
+            return None
+        _thread_state.finding = True
+        try:
+            spec = None
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            _thread_state.finding = False
+
+        if spec is None or spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _TimingLoader(spec.loader)
+        return spec
+
+
+def is_enabled() -> bool:
+    """True, если профилировщик включен."""
+    return _enabled
+
+
+def enable_from_argv(argv: list | None = None) -> bool:
+    """Включает профилировщик, если в argv есть PROFILE_FLAG. Возвращает is_enabled()."""
+    if PROFILE_FLAG in (sys.argv if argv is None else argv):
+        enable()
+    return _enabled
+
+
+def enable():
+    """Включает замер импортов. Вызывать как можно раньше при запуске."""
+    global _enabled, _start_time
+    if _enabled:
+        return
+    _enabled = True
+    _start_time = time.perf_counter()
+    sys.meta_path.insert(0, _TimingFinder())
+
+
+@contextmanager
+def section(name: str):
+    """Замеряет этап инициализации. Ничего не делает, если профилировщик выключен."""
+    if not _enabled:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        with _lock:
+            _sections.append((name, start_time - _start_time, elapsed, threading.current_thread().name))
+
+
+def report(title: str, top_n: int = 30) -> str:
+    """
+    Формирует отчет: этапы инициализации и top_n самых долгих импортов
+    (по полному времени). Отчет пишется в лог и возвращается строкой.
+    """
+    if not _enabled:
+        return ""
+    with _lock:
+        imports = sorted(_imports.items(), key=lambda kv: kv[1][0], reverse=True)
+        sections = list(_sections)
+    # Суммарное время импорта - сумма собственного времени всех модулей
+    total_import_time = sum(v[1] for _, v in imports)
+
+    lines = [
+        f"=== Профиль запуска: {title} ({time.perf_counter() - _start_time:.2f}с от старта) ===",
+        f"Импортировано модулей: {len(imports)}, суммарное время импорта: {total_import_time:.2f}с",
+        "Этапы инициализации:",
+    ]
+    for name, started_at, elapsed, thread_name in sections:
+        lines.append(f"  {elapsed:8.3f}с  (с {started_at:7.3f}с)  {name}  [{thread_name}]")
+    lines.append(f"Самые долгие импорты (полное / собственное время), топ {top_n}:")
+    for name, (cumulative, own, thread_name) in imports[:top_n]:
+        lines.append(f"  {cumulative:8.3f}с / {own:7.3f}с  {name}  [{thread_name}]")
+
+    text = "\n".join(lines)
+    logger.info(text)
+    return text
+
+# --- END OF FILE startup_profiler.py ---
@@ -0,0 +1,257 @@
+# --- START OF FILE template_cache.py ---
+
+# template_cache.py
+"""
+Кэш подготовленных шаблонов товаров.
+Хранит серые изображения шаблонов (и, при необходимости, уровни пирамиды)
+в одном файле .npy, который открывается через memory-map, и индекс .json
+рядом с ним. Запись индекса привязана к пути файла шаблона и проверяется
+по времени изменения и размеру файла, а при их несовпадении - по SHA-1
+содержимого. Неизмененные шаблоны загружаются без декодирования PNG.
+Дополнительно кэш держит готовые массивы в памяти процесса, поэтому
+повторный запуск поиска вообще не обращается к диску (кроме os.stat).
+Кэш используется потоком Worker'а и основным потоком, поэтому методы
+get/flush/drop выполняются под общей блокировкой.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from lazy_import import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.template_cache")
+
+
+class TemplateCache:
+    """
+    Кэш шаблонов. Запись (словарь) содержит:
+    "gray" - серое изображение (np.uint8), "mean"/"std" - статистика яркости,
+    "pyramid" - список уменьшенных копий (cv2.pyrDown), "mtime_ns", "size", "sha1".
+    """
+
+    VERSION = 1
+
+    def __init__(self, bundle_path: str, pyramid_levels: int = 0):
+        self.bundle_path = bundle_path # Файл .npy с массивами всех шаблонов
+        self.index_path = os.path.splitext(bundle_path)[0] + ".json"
+        self.pyramid_levels = max(0, int(pyramid_levels))
+        self._memory = {} # путь -> запись с массивами (в памяти процесса)
+        self._index = None # путь -> метаданные записи в файле (None - индекс не прочитан)
+        self._bundle = None # Массив файла .npy (memory-map)
+        self._dirty = False # Есть изменения, которые нужно сохранить
+        self.stats = {"memory": 0, "disk": 0, "rebuilt": 0}
+        self._lock = threading.RLock()
+
+    # --- Чтение ---
+
+    def get(self, path: str) -> dict | None:
+        """
+        Возвращает запись шаблона по пути к файлу или None,
+        если файл не найден или не является изображением.
+        """
+        with self._lock:
+            return self._get(path)
+
+    def _get(self, path: str) -> dict | None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        entry = self._memory.get(path)
+        if entry is not None and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            self.stats["memory"] += 1
+            return entry
+
+        self._open()
+        meta = self._index.get(path)
+        if meta is not None and meta["mtime_ns"] == st.st_mtime_ns and meta["size"] == st.st_size:
+            entry = self._entry_from_bundle(meta)
+            if entry is not None:
+                self._memory[path] = entry
+                self.stats["disk"] += 1
+                return entry
+
+        # Время изменения или размер не совпали - сверяем содержимое
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        sha1 = hashlib.sha1(data).hexdigest()
+
+        entry = None
+        if meta is not None and meta.get("sha1") == sha1:
+            # Файл "тронут" (копирование, восстановление), но содержимое то же
+            entry = self._entry_from_bundle(meta)
+        if entry is None:
+            entry = self._build_entry(data)
+            if entry is None:
+                return None
+            self.stats["rebuilt"] += 1
+        else:
+            self.stats["disk"] += 1
+
+        entry.update({"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": sha1})
+        self._memory[path] = entry
+        self._dirty = True
+        return entry
+
+    def _open(self):
+        """Читает индекс и открывает файл массивов (один раз)."""
+        if self._index is not None:
+            return
+        self._index = {}
+        if not (os.path.exists(self.index_path) and os.path.exists(self.bundle_path)):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") != self.VERSION or index.get("pyramid_levels") != self.pyramid_levels:
+                logger.info("Кэш шаблонов устарел (версия/параметры). Будет пересобран.")
+                return
+            bundle = np.load(self.bundle_path, mmap_mode="r")
+            if bundle.dtype != np.uint8 or bundle.ndim != 1 or bundle.size != index.get("bundle_bytes"):
+                logger.warning("Файл кэша шаблонов не соответствует индексу. Будет пересобран.")
+                return
+            self._bundle = bundle
+            self._index = index.get("entries", {})
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш шаблонов '{self.bundle_path}': {e}. Будет пересобран.")
+            self._index = {}
+            self._bundle = None
+
+    def _entry_from_bundle(self, meta: dict) -> dict | None:
+        """Копирует массивы записи из memory-map файла."""
+        if self._bundle is None:
+            return None
+        try:
+            arrays = [
+                np.array(self._bundle[offset:offset + h * w].reshape(h, w))
+                for offset, h, w in meta["arrays"]
+            ]
+        except Exception:
+            return None
+        return {
+            "gray": arrays[0],
+            "pyramid": arrays[1:],
+            "mean": meta["mean"],
+            "std": meta["std"],
+            "mtime_ns": meta["mtime_ns"],
+            "size": meta["size"],
+            "sha1": meta["sha1"],
+        }
+
+    def _build_entry(self, data: bytes) -> dict | None:
+        """Декодирует изображение и вычисляет статистику и пирамиду."""
+        # imdecode вместо imread: работает и с не-ASCII путями в Windows
+        gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None or gray.size == 0:
+            return None
+        gray = np.ascontiguousarray(gray)
+        pyramid = []
+        level = gray
+        for _ in range(self.pyramid_levels):
+            if min(level.shape[:2]) < 6:
+                break
+            level = cv2.pyrDown(level)
+            pyramid.append(level)
+        mean, std = cv2.meanStdDev(gray)
+        return {"gray": gray, "pyramid": pyramid, "mean": float(mean[0][0]), "std": float(std[0][0])}
+
+    # --- Сохранение ---
+
+    def flush(self) -> bool:
+        """
+        Сохраняет кэш, если были изменения. Записи, не запрошенные в этом запуске,
+        сохраняются, пока существуют их файлы шаблонов. Возвращает True при записи.
+        """
+        with self._lock:
+            return self._flush()
+
+    def _flush(self) -> bool:
+        if not self._dirty:
+            return False
+        self._open()
+
+        entries = dict(self._memory)
+        for path, meta in self._index.items():
+            if path not in entries and os.path.exists(path):
+                entry = self._entry_from_bundle(meta)
+                if entry is not None:
+                    entries[path] = entry
+
+        chunks = []
+        index_entries = {}
+        offset = 0
+        for path, entry in entries.items():
+            arrays_meta = []
+            for array in [entry["gray"]] + list(entry["pyramid"]):
+                h, w = array.shape[:2]
+                arrays_meta.append([offset, h, w])
+                chunks.append(array.reshape(-1))
+                offset += h * w
+            index_entries[path] = {
+                "mtime_ns": entry["mtime_ns"],
+                "size": entry["size"],
+                "sha1": entry["sha1"],
+                "mean": entry["mean"],
+                "std": entry["std"],
+                "arrays": arrays_meta,
+            }
+        bundle = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8)
+        index = {
+            "version": self.VERSION,
+            "pyramid_levels": self.pyramid_levels,
+            "bundle_bytes": int(bundle.size),
+            "entries": index_entries,
+        }
+
+        bundle_tmp = self.bundle_path + ".tmp"
+        index_tmp = self.index_path + ".tmp"
+        try:
+            with open(bundle_tmp, "wb") as f:
+                np.save(f, bundle)
+            with open(index_tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+            # memory-map нужно закрыть до замены файла (иначе Windows не даст заменить)
+            self._bundle = None
+            os.replace(bundle_tmp, self.bundle_path)
+            os.replace(index_tmp, self.index_path)
+        except Exception:
+            logger.exception(f"Ошибка сохранения кэша шаблонов '{self.bundle_path}':")
+            return False
+        finally:
+            for temp_path in (bundle_tmp, index_tmp):
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+
+        # Следующее чтение с диска откроет новый файл
+        self._index = None
+        self._dirty = False
+        logger.info(f"Кэш шаблонов сохранен: {len(index_entries)} шаблонов, {bundle.size / 1024:.0f} КБ.")
+        return True
+
+    def drop(self, path: str):
+        """Забывает шаблон (например, при удалении товара)."""
+        with self._lock:
+            self._drop(path)
+
+    def _drop(self, path: str):
+        removed = self._memory.pop(path, None) is not None
+        if self._index is not None:
+            removed = self._index.pop(path, None) is not None or removed
+        if removed:
+            self._dirty = True
+
+# --- END OF FILE template_cache.py ---
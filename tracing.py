@@ -0,0 +1,91 @@
+# --- START OF FILE tracing.py ---
+
+# tracing.py
+"""
+Трассировка итераций Worker'а в формате Chrome trace event (JSON):
+файл открывается в chrome://tracing или https://ui.perfetto.dev.
+
+TraceBuffer хранит последние capacity отрезков (кольцевой буфер), поэтому
+может работать постоянно: при всплеске задержки буфер сохраняется (dump) и
+показывает, на что ушло время в последних итерациях. Отрезок - этап движка
+(захват, конвертация, поиск шаблона, OCR, действие, пауза) с началом,
+длительностью, потоком и аргументами (например, товар).
+"""
+import collections
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Дочерний логгер "logic": сообщения попадают в общий лог-файл приложения.
+logger = logging.getLogger("logic.tracing")
+
+
+class TraceBuffer:
+    """Кольцевой буфер отрезков. add() вызывается из любого потока."""
+
+    def __init__(self, capacity: int = 50000):
+        self.capacity = capacity
+        # (имя, начало perf_counter, длительность, поток, аргументы); deque.append атомарен
+        self._spans = collections.deque(maxlen=capacity)
+        self._thread_names = {} # ident потока -> имя (для подписей дорожек)
+
+    def add(self, name: str, start: float, duration: float, args: dict | None = None):
+        """Добавляет отрезок: start - time.perf_counter() начала, duration - секунды."""
+        thread = threading.current_thread()
+        self._thread_names[thread.ident] = thread.name
+        self._spans.append((name, start, duration, thread.ident, args))
+
+    @contextlib.contextmanager
+    def span(self, name: str, args: dict | None = None):
+        """Контекст отрезка."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - start, args)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def events(self) -> list:
+        """Отрезки буфера в формате Chrome trace event (ph "X", время в микросекундах)."""
+        spans = self._spans.copy() # Копия без блокировки: add() продолжает работать
+        pid = os.getpid()
+        # Отрезок добавляется по окончании: внешний отрезок (кадр) идет после вложенных,
+        # поэтому самый ранний старт ищется по всему буферу
+        origin = min(start for _, start, *_ in spans) if spans else 0.0
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": ident, "args": {"name": name}}
+            for ident, name in list(self._thread_names.items())
+        ]
+        for name, start, duration, ident, args in spans:
+            event = {
+                "name": name,
+                "cat": "worker",
+                "ph": "X",
+                "ts": round((start - origin) * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "pid": pid,
+                "tid": ident,
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+        return events
+
+    def dump(self, path: str) -> int:
+        """Сохраняет буфер в файл Chrome trace (атомарно). Возвращает число отрезков."""
+        events = self.events()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        spans = sum(1 for event in events if event["ph"] == "X")
+        logger.info(f"Трассировка сохранена: '{path}' ({spans} отрезков).")
+        return spans
+
+# --- END OF FILE tracing.py ---